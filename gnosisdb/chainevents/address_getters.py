@@ -1,6 +1,179 @@
-from relationaldb.models import Contract, Market, Event, OutcomeToken, CentralizedOracle
-from django.core.exceptions import ObjectDoesNotExist
+from relationaldb.models import (
+    Contract, Market, Event, ScalarEvent, CategoricalEvent, OutcomeToken, Oracle, CentralizedOracle
+)
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django_eth_events.chainevents import AbstractAddressesGetter
+from threading import Lock, local
+
+# Concrete models whose addresses are cached, signals are only connected for them
+CONTRACT_MODELS = (Market, Event, ScalarEvent, CategoricalEvent, OutcomeToken, Oracle, CentralizedOracle)
+
+
+class PendingAddress(object):
+    """
+    on_commit callback adding the address of a contract created by the transaction, see AddressCache.add
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.discarded = False
+
+    def __call__(self):
+        if not self.discarded:
+            AddressCache.add_committed(self.instance)
+
+
+class PendingInvalidation(object):
+    """
+    on_commit callback marking the models whose contracts were deleted by the transaction, see AddressCache.invalidate
+    """
+
+    def __init__(self, instance=None):
+        self.instance = instance
+
+    def __call__(self):
+        AddressCache.invalidate(self.instance)
+
+
+class PendingChanges(object):
+    """
+    Index of the PendingAddress and PendingInvalidation callbacks of a transaction, see AddressCache.get_pending
+    """
+
+    def __init__(self, run_on_commit):
+        self.run_on_commit = run_on_commit
+        self.scanned = 0
+        self.addresses = {}  # address -> PendingAddress
+        self.invalidations = []
+
+    def update(self):
+        for _, callback in self.run_on_commit[self.scanned:]:
+            if isinstance(callback, PendingAddress):
+                self.addresses[callback.instance.address] = callback
+            elif isinstance(callback, PendingInvalidation):
+                self.invalidations.append(callback)
+        self.scanned = len(self.run_on_commit)
+
+    def get_address(self, model, address):
+        callback = self.addresses.get(address)
+        return callback is not None and not callback.discarded and isinstance(callback.instance, model)
+
+    def get_addresses(self, model):
+        return frozenset(
+            address for address, callback in self.addresses.items()
+            if not callback.discarded and isinstance(callback.instance, model)
+        )
+
+    def is_invalidated(self, model):
+        return any(callback.instance is None or isinstance(callback.instance, model)
+                   for callback in self.invalidations)
+
+
+class AddressCache(object):
+    """
+    In-process cache of the contract addresses stored for each model, kept as frozensets so readers never see a
+    partially updated set.
+    Created contracts are added incrementally once their transaction commits, deleted ones (e.g. rollbacks) invalidate
+    the cache of their model, which is reloaded on the next read. Until then, only the transaction itself sees the
+    changes: Django keeps the on_commit callbacks of the open transaction, and discards them on rollback.
+    """
+    _addresses = {}  # model -> frozenset
+    _lock = Lock()
+    _local = local()
+
+    @classmethod
+    def get_pending(cls):
+        """
+        Returns the PendingChanges of the open transaction of this thread. Django replaces its list of on_commit
+        callbacks when the transaction ends or a savepoint rolls back, the index is rebuilt then. Otherwise only the
+        callbacks registered since the previous call are scanned.
+        """
+        run_on_commit = transaction.get_connection().run_on_commit
+        pending = getattr(cls._local, 'pending', None)
+        if pending is None or pending.run_on_commit is not run_on_commit:
+            pending = cls._local.pending = PendingChanges(run_on_commit)
+        pending.update()
+        return pending
+
+    @classmethod
+    def get_committed(cls, model, pending):
+        addresses = cls._addresses.get(model)
+        if addresses is None:
+            with cls._lock:
+                addresses = frozenset(model.objects.values_list('address', flat=True)) - frozenset(pending.addresses)
+                # Contracts deleted by the open transaction would be missing if it rolls back
+                if not pending.is_invalidated(model):
+                    cls._addresses[model] = addresses
+        return addresses
+
+    @classmethod
+    def get(cls, model):
+        pending = cls.get_pending()
+        return cls.get_committed(model, pending) | pending.get_addresses(model)
+
+    @classmethod
+    def contains(cls, model, address):
+        pending = cls.get_pending()
+        return pending.get_address(model, address) or address in cls.get_committed(model, pending)
+
+    @classmethod
+    def add(cls, instance):
+        """
+        Adds the address of a created contract once the transaction commits, right away outside of transactions
+        """
+        transaction.on_commit(PendingAddress(instance))
+
+    @classmethod
+    def add_committed(cls, instance):
+        with cls._lock:
+            for model, addresses in cls._addresses.items():
+                if isinstance(instance, model):
+                    cls._addresses[model] = addresses | frozenset([instance.address])
+
+    @classmethod
+    def clear(cls):
+        """
+        Drops every cached address, e.g. after the tables were emptied without delete signals
+        """
+        with cls._lock:
+            cls._addresses.clear()
+
+    @classmethod
+    def invalidate(cls, instance=None):
+        """
+        Drops the cached addresses of the given instance models, all of them if instance is None, again once the
+        transaction commits
+        """
+        pending = cls.get_pending()
+        if instance is None:
+            for callback in pending.addresses.values():
+                callback.discarded = True
+        elif instance.address in pending.addresses:
+            pending.addresses[instance.address].discarded = True
+        with cls._lock:
+            for model in list(cls._addresses.keys()):
+                if instance is None or isinstance(instance, model):
+                    del cls._addresses[model]
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(PendingInvalidation(instance))
+
+
+def update_address_cache(sender, instance, created=False, **kwargs):
+    if created:
+        AddressCache.add(instance)
+
+
+def invalidate_address_cache(sender, instance, **kwargs):
+    AddressCache.invalidate(instance)
+
+
+for contract_model in CONTRACT_MODELS:
+    post_save.connect(update_address_cache, sender=contract_model,
+                      dispatch_uid='chainevents.address_getters.update_address_cache.{}'.format(contract_model.__name__))
+    post_delete.connect(invalidate_address_cache, sender=contract_model,
+                        dispatch_uid='chainevents.address_getters.invalidate_address_cache.{}'.format(
+                            contract_model.__name__))
 
 
 class ContractAddressGetter(AbstractAddressesGetter):
@@ -15,7 +188,7 @@ class ContractAddressGetter(AbstractAddressesGetter):
         Returns list of ethereum addresses
         :return: [address]
         """
-        return list(self.Meta.model.objects.values_list('address', flat=True))
+        return sorted(AddressCache.get(self.Meta.model))
 
     def __contains__(self, address):
         """
@@ -23,11 +196,7 @@ class ContractAddressGetter(AbstractAddressesGetter):
         :param address: ethereum address string
         :return: Boolean
         """
-        try:
-            self.Meta.model.objects.get(address=address)
-            return True
-        except ObjectDoesNotExist:
-            return False
+        return AddressCache.contains(self.Meta.model, address)
 
 
 class MarketAddressGetter(ContractAddressGetter):
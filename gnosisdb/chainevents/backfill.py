@@ -0,0 +1,90 @@
+"""
+Indexes old blocks through the BulkEventProcessor instead of the event listener, see the backfill management command.
+
+Every block is handled as the listener does: the logs of its transactions are filtered by the contract addresses of
+each ETH_EVENTS entry, in order, decoded and saved. The addresses of an entry are read after the previous entries of
+the block were saved, so contracts created by the block get their own events indexed.
+
+The event descriptions referenced by a batch are resolved concurrently beforehand, see fetch(). The event listener
+saves events one by one and requests them serially.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django_eth_events.decoder import Decoder
+from django_eth_events.web3_service import Web3Service
+from ipfs.ipfs import Ipfs
+
+
+def normalize_address(address):
+    address = address.lower()
+    return address[2:] if address.startswith('0x') else address
+
+
+def get_watched_addresses(contract):
+    if contract.get('ADDRESSES'):
+        return set(normalize_address(address) for address in contract['ADDRESSES'])
+    return set(import_string(contract['ADDRESSES_GETTER'])().get_addresses())
+
+
+class BlockBackfiller(object):
+
+    def __init__(self, processor, web3=None, decoder=None, contracts=None):
+        """
+        :param processor: BulkEventProcessor saving the events
+        :param contracts: ETH_EVENTS by default
+        """
+        self.processor = processor
+        self.web3 = web3 or Web3Service().web3
+        self.decoder = decoder or Decoder()
+        self.contracts = contracts if contracts is not None else settings.ETH_EVENTS
+        self.blocks = {}  # block number -> (logs, block) read by fetch()
+        for contract in self.contracts:
+            self.decoder.add_abi(contract['EVENT_ABI'])
+
+    def get_logs(self, block_number):
+        """
+        :return: (logs of the block in chain order, block)
+        """
+        block = self.web3.eth.getBlock(block_number)
+        logs = []
+        for tx_hash in block['transactions']:
+            receipt = self.web3.eth.getTransactionReceipt(tx_hash)
+            logs.extend(receipt.get('logs') or [])
+        return logs, block
+
+    def decode_logs(self, logs, addresses):
+        return self.decoder.decode_logs([log for log in logs if normalize_address(log['address']) in addresses])
+
+    def fetch(self, block_numbers):
+        """
+        Reads the logs of the blocks and resolves the event descriptions of their oracle creations concurrently, to be
+        called before the transaction of the batch. Oracle factories have fixed addresses, their logs can be decoded
+        before the blocks are saved.
+        :return: number of resolved event descriptions
+        """
+        self.blocks = dict((block_number, self.get_logs(block_number)) for block_number in block_numbers)
+        decoded_events = []
+        for contract in self.contracts:
+            if contract.get('ADDRESSES'):
+                addresses = get_watched_addresses(contract)
+                for logs, _ in self.blocks.values():
+                    decoded_events.extend(self.decode_logs(logs, addresses))
+        return Ipfs().prefetch(self.processor.get_ipfs_hashes([
+            (None, decoded_event, None) for decoded_event in decoded_events
+        ]))
+
+    def save_block(self, block_number):
+        """
+        Saves the events of the block, must run in the transaction of its batch
+        :return: number of saved events, invalid ones included
+        """
+        logs, block = self.blocks.pop(block_number, None) or self.get_logs(block_number)
+        block_info = {'number': block['number'], 'timestamp': block['timestamp']}
+        n_events = 0
+        for contract in self.contracts:
+            decoded_events = self.decode_logs(logs, get_watched_addresses(contract))
+            if decoded_events:
+                receiver = import_string(contract['EVENT_DATA_RECEIVER'])()
+                self.processor.save([(receiver, decoded_event, block_info) for decoded_event in decoded_events])
+                n_events += len(decoded_events)
+        return n_events
@@ -0,0 +1,574 @@
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.transaction import TransactionManagementError
+from rest_framework.serializers import ValidationError
+from relationaldb import models
+from relationaldb.bulk import bulk_update, bulk_create_inherited, copy_create
+from relationaldb.journal import journal_block, is_enabled as journal_enabled
+from chainevents.address_getters import AddressCache
+from chainevents.event_logs import block_summary, count_event
+from chainevents.event_receivers import MarketInstanceReceiver, EventInstanceReceiver, OutcomeTokenInstanceReceiver
+from gnosisdb.metrics import RunMeasurement, get_backend as get_metrics_backend
+from gnosisdb.utils import calc_lmsr_marginal_prices
+from ipfs.ipfs import Ipfs
+from restapi.cache import invalidate_markets
+from celery.utils.log import get_task_logger
+from datetime import datetime
+from decimal import Decimal
+from multiprocessing import Pool, current_process
+
+logger = get_task_logger(__name__)
+
+
+class BulkEventProcessor(object):
+    """
+    Applies the decoded events of a block or block range in bulk.
+
+    Events are processed in chain order. Every run of consecutive trade/balance events (see Meta.events) prefetches the
+    referenced Market, OutcomeToken and OutcomeTokenBalance rows with a few IN queries, applies the state changes in
+    memory and flushes them with bulk inserts and updates. Any other event goes through its receiver's save(), after
+    flushing the pending changes, so the serializers always see a consistent database.
+    Everything happens inside one transaction.
+
+    In backfill mode new rows are flushed with COPY instead of INSERT, for reindexing long block ranges. State changes
+    are still applied in memory in chain order, so balances and net outcome tokens sold don't depend on the mode.
+    Otherwise changes are written to the rollback journal (relationaldb.journal), runs are then flushed block by
+    block. Backfilled blocks are too old to be reorganized and aren't journaled unless asked, COPY fires the journal
+    triggers as well.
+
+    With several workers, the events of long runs are partitioned by the event contract their market or outcome token
+    belongs to, these never share any state, and applied by a pool of processes, each partition in chain order. The
+    main process still prefetches and flushes, so every run is committed atomically through one connection.
+    The pool is only started by start(), from the backfill management command: see start().
+    """
+    class Meta:
+        events = {
+            MarketInstanceReceiver: {
+                'OutcomeTokenPurchase': 'apply_purchase',
+                'OutcomeTokenSale': 'apply_sale'
+            },
+            EventInstanceReceiver: {
+                'OutcomeTokenCreation': 'apply_outcome_token_creation'
+            },
+            OutcomeTokenInstanceReceiver: {
+                'Issuance': 'apply_issuance',
+                'Revocation': 'apply_revocation',
+                'Transfer': 'apply_transfer'
+            }
+        }
+
+    def __init__(self, backfill=False, workers=None, parallel_min_events=None, journaled=None):
+        """
+        :param journaled: write the changes to the rollback journal, by default if ROLLBACK_JOURNAL is set and not in
+        backfill mode
+        :param workers: processes applying the partitioned runs once started, BULK_WORKERS by default, 1 applies them
+        in this one
+        :param parallel_min_events: shorter runs are applied in this process, BULK_PARALLEL_MIN_EVENTS by default
+        """
+        self.backfill = backfill
+        if journaled is None:
+            journaled = not backfill
+        self.journaled = journaled and journal_enabled()
+        self.workers = workers or getattr(settings, 'BULK_WORKERS', 1)
+        if parallel_min_events is None:
+            parallel_min_events = getattr(settings, 'BULK_PARALLEL_MIN_EVENTS', 1000)
+        self.parallel_min_events = parallel_min_events
+        self.pool = None
+        self.reset()
+
+    def __getstate__(self):
+        # Partitions are sent to the workers without the pool
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def start(self):
+        """
+        Starts the worker processes, runs are applied in this process until then. Must be called outside of any
+        transaction, from a management command: Celery prefork workers are daemonic and can't have children, and the
+        workers must not inherit an open database connection.
+        """
+        if self.workers < 2 or self.pool is not None:
+            return
+        if current_process().daemon:
+            raise RuntimeError('BulkEventProcessor workers can\'t be started from a daemonic process')
+        if connection.in_atomic_block:
+            raise TransactionManagementError('BulkEventProcessor workers can\'t be started inside a transaction')
+        # Nothing to inherit, workers open their own connections if they ever need one
+        connections.close_all()
+        self.pool = Pool(self.workers, initializer=close_connections)
+
+    def close(self):
+        """
+        Stops the worker processes, if any were started
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def reset(self):
+        self.markets = {}  # address -> Market
+        self.outcome_tokens = {}  # address -> OutcomeToken
+        self.event_outcome_tokens = {}  # (event address, index) -> OutcomeToken
+        self.balances = {}  # (owner, outcome token address) -> OutcomeTokenBalance
+        self.events = set()  # addresses of the events getting outcome tokens
+        self.dirty_markets = {}
+        self.dirty_outcome_tokens = {}
+        self.dirty_balances = {}
+        self.new_balances = []
+        self.new_outcome_tokens = {}  # address -> OutcomeToken
+        self.new_orders = {models.BuyOrder: [], models.SellOrder: []}
+        self.orders = []  # chain order, for the price candles
+
+    def get_handler(self, receiver, decoded_event):
+        """
+        Returns the name of the method applying the event, None if it has to be saved by the receiver
+        """
+        for receiver_class, handlers in self.Meta.events.items():
+            if isinstance(receiver, receiver_class):
+                return handlers.get(decoded_event.get('name'))
+        return None
+
+    def save(self, events):
+        """
+        Saves a list of decoded events
+        :param events: list of (receiver, decoded_event, block_info) tuples, in chain order
+        :return: list with the saved instance of every event, None for invalid events
+        """
+        # Resolve every event description of the range concurrently, before the transaction starts, so the oracle
+        # serializers find them in the cache
+        Ipfs().prefetch(self.get_ipfs_hashes(events))
+
+        results = []
+        with transaction.atomic():
+            run = []
+            for receiver, decoded_event, block_info in events:
+                if run and self.journaled and run[-1][3].get('number') != block_info.get('number'):
+                    # Journaled changes belong to one block
+                    results.extend(self.save_run(run))
+                    run = []
+                handler = self.get_handler(receiver, decoded_event)
+                if handler:
+                    run.append((handler, receiver, decoded_event, block_info))
+                else:
+                    results.extend(self.save_run(run))
+                    run = []
+                    results.append(receiver.save(decoded_event, block_info, journaled=self.journaled))
+            results.extend(self.save_run(run))
+        # The range is done, its last block won't get any other event
+        block_summary.flush()
+        return results
+
+    def save_run(self, run):
+        if not run:
+            return []
+
+        self.reset()
+        # Receivers are only named in the logs, the items are sent to the workers as they are
+        items = [
+            (handler, receiver.__class__.__name__, decoded_event, block_info)
+            for handler, receiver, decoded_event, block_info in run
+        ]
+        metrics_backend = get_metrics_backend()
+        if metrics_backend.enabled:
+            with RunMeasurement(metrics_backend, [
+                (receiver_name, decoded_event.get('name')) for _, receiver_name, decoded_event, _ in items
+            ]) as measurement:
+                results = self.apply_run(items)
+                measurement.statuses = ['invalid' if result is None else 'saved' for result in results]
+        else:
+            results = self.apply_run(items)
+        for (_, receiver_name, decoded_event, block_info), result in zip(items, results):
+            count_event(receiver_name, decoded_event, block_info, 'invalid' if result is None else 'saved')
+        logger.info('Bulk Event Receiver added {} events'.format(len(run)))
+        return results
+
+    def apply_run(self, items):
+        """
+        Applies and flushes the events of a run, in the journal of its block if journaled
+        :return: list with the result of every event, None for invalid events
+        """
+        with journal_block(items[0][3].get('number') if self.journaled else None):
+            self.prefetch([self.get_data(decoded_event) for _, _, decoded_event, _ in items])
+            results = None
+            if self.pool is not None and len(items) >= self.parallel_min_events:
+                results = self.apply_parallel(items)
+            if results is None:
+                results = self.apply_events(items)
+            self.flush()
+        return results
+
+    def apply_events(self, items):
+        """
+        Applies the events in memory, in order
+        :param items: list of (handler name, receiver name, decoded_event, block_info)
+        :return: list with the result of every event, None for invalid events
+        """
+        results = []
+        for handler, receiver_name, decoded_event, block_info in items:
+            try:
+                result = getattr(self, handler)(self.get_data(decoded_event), block_info)
+            except ValidationError as e:
+                logger.warning('INVALID Data for Bulk Event Receiver {} save: {}'.format(receiver_name, decoded_event))
+                logger.warning(e.detail)
+                result = None
+            results.append(result)
+        return results
+
+    def get_ipfs_hashes(self, events):
+        """
+        Returns the event description hashes of the CentralizedOracleCreation events
+        """
+        return [
+            param[u'value']
+            for _, decoded_event, _ in events
+            if decoded_event.get('name') == 'CentralizedOracleCreation'
+            for param in decoded_event.get('params')
+            if param[u'name'] == 'ipfsHash'
+        ]
+
+    def get_data(self, decoded_event):
+        """
+        Moves the event params to the root object, as the serializers do
+        """
+        data = {'address': decoded_event.get('address')}
+        for param in decoded_event.get('params'):
+            data[param[u'name']] = param[u'value']
+        return data
+
+    def get_int(self, data, key, min_value=None):
+        try:
+            value = int(data[key])
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({key: 'A valid integer is required.'})
+        if min_value is not None and value < min_value:
+            raise ValidationError({key: 'Ensure this value is greater than or equal to {}.'.format(min_value)})
+        return value
+
+    def get_address(self, data, key):
+        if not data.get(key):
+            raise ValidationError({key: 'This field is required.'})
+        return data[key]
+
+    # ========================================================
+    #                 Partitioned runs
+    # ========================================================
+
+    def get_partition_key(self, data, new_outcome_tokens):
+        """
+        Returns the address of the event contract the market or outcome token of the event belongs to
+        :param new_outcome_tokens: outcome token address -> event address, of the tokens created by the run
+        """
+        if 'outcomeTokenIndex' in data:
+            market = self.markets.get(data['address'])
+            return market.event_id if market else data['address']
+        elif 'outcomeToken' in data:
+            return data['address']
+        outcome_token = self.outcome_tokens.get(data['address'])
+        return outcome_token.event_id if outcome_token else new_outcome_tokens.get(data['address'], data['address'])
+
+    def partition(self, items):
+        """
+        Splits the items and the prefetched rows by event contract
+        :return: list of (processor holding the rows of the partition, [(index in items, item)])
+        """
+        new_outcome_tokens = dict(
+            (data['outcomeToken'], data['address'])
+            for data in (self.get_data(decoded_event) for _, _, decoded_event, _ in items)
+            if 'outcomeToken' in data
+        )
+        partitions = {}
+        for index, item in enumerate(items):
+            key = self.get_partition_key(self.get_data(item[2]), new_outcome_tokens)
+            if key not in partitions:
+                partitions[key] = (BulkEventProcessor(backfill=self.backfill, workers=1), [])
+            partitions[key][1].append((index, item))
+
+        for address, market in self.markets.items():
+            if market.event_id in partitions:
+                partitions[market.event_id][0].markets[address] = market
+        for address, outcome_token in self.outcome_tokens.items():
+            if outcome_token.event_id in partitions:
+                processor = partitions[outcome_token.event_id][0]
+                processor.outcome_tokens[address] = outcome_token
+                processor.event_outcome_tokens[(outcome_token.event_id, outcome_token.index)] = outcome_token
+        for key, balance in self.balances.items():
+            if balance.outcome_token.event_id in partitions:
+                partitions[balance.outcome_token.event_id][0].balances[key] = balance
+        for event_address in self.events:
+            if event_address in partitions:
+                partitions[event_address][0].events.add(event_address)
+        return list(partitions.values())
+
+    def apply_parallel(self, items):
+        """
+        Applies the partitions of the items in the worker processes, then takes over their changes
+        :return: list with the result of every event, None if the run has to be applied in this process
+        """
+        partitions = self.partition(items)
+        if len(partitions) < 2:
+            return None
+        outputs = self.pool.map(apply_partition, [
+            (processor, [item for _, item in indexed_items]) for processor, indexed_items in partitions
+        ])
+        if any(output is None for output in outputs):
+            # The run is applied again here, raising the same error
+            return None
+
+        results = [None] * len(items)
+        for (_, indexed_items), (processor, partition_results) in zip(partitions, outputs):
+            for (index, _), result in zip(indexed_items, partition_results):
+                results[index] = result
+            self.dirty_markets.update(processor.dirty_markets)
+            self.dirty_outcome_tokens.update(processor.dirty_outcome_tokens)
+            self.dirty_balances.update(processor.dirty_balances)
+            self.new_balances.extend(processor.new_balances)
+            self.new_outcome_tokens.update(processor.new_outcome_tokens)
+        # Orders are only created by the trades, they are inserted in chain order
+        for result in results:
+            if isinstance(result, models.Order):
+                self.new_orders[type(result)].append(result)
+                self.orders.append(result)
+        return results
+
+    # ========================================================
+    #                 Prefetch and flush
+    # ========================================================
+
+    def prefetch(self, data_list):
+        market_addresses = set()
+        token_addresses = set()
+        event_addresses = set()
+        owners = set()
+        for data in data_list:
+            if 'outcomeTokenIndex' in data:
+                market_addresses.add(data['address'])
+            elif 'outcomeToken' in data:
+                event_addresses.add(data['address'])
+            else:
+                token_addresses.add(data['address'])
+                owners.update(data.get(key) for key in ('owner', 'from', 'to') if data.get(key))
+
+        for market in models.Market.objects.filter(address__in=market_addresses):
+            self.markets[market.address] = market
+
+        if event_addresses:
+            self.events = set(models.Event.objects.filter(address__in=event_addresses).values_list('address', flat=True))
+
+        market_event_addresses = [market.event_id for market in self.markets.values()]
+        outcome_tokens = models.OutcomeToken.objects.filter(event_id__in=market_event_addresses) | \
+            models.OutcomeToken.objects.filter(address__in=token_addresses)
+        for outcome_token in outcome_tokens:
+            self.outcome_tokens[outcome_token.address] = outcome_token
+            self.event_outcome_tokens[(outcome_token.event_id, outcome_token.index)] = outcome_token
+
+        if owners:
+            balances = models.OutcomeTokenBalance.objects.filter(
+                owner__in=owners,
+                outcome_token_id__in=token_addresses
+            )
+            for balance in balances:
+                balance.outcome_token = self.outcome_tokens[balance.outcome_token_id]
+                self.balances[(balance.owner, balance.outcome_token_id)] = balance
+
+    def flush(self):
+        if self.backfill:
+            copy_create(models.OutcomeToken, self.new_outcome_tokens.values())
+            for model, orders in self.new_orders.items():
+                copy_create(model, orders)
+            copy_create(models.OutcomeTokenBalance, self.new_balances)
+        else:
+            models.OutcomeToken.objects.bulk_create(self.new_outcome_tokens.values())
+            for model, orders in self.new_orders.items():
+                bulk_create_inherited(model, orders)
+            models.OutcomeTokenBalance.objects.bulk_create(self.new_balances)
+        # Bulk inserts don't send post_save, the listener has to filter the logs of the new tokens
+        for outcome_token in self.new_outcome_tokens.values():
+            AddressCache.add(outcome_token)
+        models.MarketPriceCandle.objects.add_orders(self.orders)
+        bulk_update(models.OutcomeTokenBalance, self.dirty_balances.values(), ['balance'])
+        bulk_update(models.OutcomeToken, self.dirty_outcome_tokens.values(), ['total_supply'])
+        bulk_update(models.Market, self.dirty_markets.values(),
+                    ['net_outcome_tokens_sold', 'collected_fees', 'trading_volume', 'marginal_prices'])
+        # Bulk updates don't send post_save
+        invalidate_markets(self.dirty_markets.keys())
+        self.reset()
+
+    # ========================================================
+    #                 In memory state changes
+    # ========================================================
+
+    def get_market(self, address):
+        try:
+            return self.markets[address]
+        except KeyError:
+            raise models.Market.DoesNotExist('Market with address {} does not exist.'.format(address))
+
+    def get_outcome_token(self, address):
+        try:
+            return self.outcome_tokens[address]
+        except KeyError:
+            raise models.OutcomeToken.DoesNotExist('OutcomeToken with address {} does not exist.'.format(address))
+
+    def get_balance(self, owner, outcome_token_address):
+        return self.balances.get((owner, outcome_token_address))
+
+    def add_balance(self, owner, outcome_token, balance=0):
+        outcome_token_balance = models.OutcomeTokenBalance(owner=owner, outcome_token=outcome_token, balance=balance)
+        self.balances[(owner, outcome_token.address)] = outcome_token_balance
+        self.new_balances.append(outcome_token_balance)
+        return outcome_token_balance
+
+    def mark_balance(self, outcome_token_balance):
+        # New balances get inserted with their final values
+        if outcome_token_balance.pk is not None:
+            self.dirty_balances[outcome_token_balance.pk] = outcome_token_balance
+
+    def mark_outcome_token(self, outcome_token):
+        # New outcome tokens get inserted with their final values
+        if outcome_token.pk not in self.new_outcome_tokens:
+            self.dirty_outcome_tokens[outcome_token.pk] = outcome_token
+
+    def apply_order(self, order, market, token_index, token_count, sender, block_info):
+        try:
+            outcome_token = self.event_outcome_tokens[(market.event_id, token_index)]
+        except KeyError:
+            raise models.OutcomeToken.DoesNotExist('OutcomeToken with index {} does not exist.'.format(token_index))
+
+        order.creation_date_time = datetime.fromtimestamp(block_info.get('timestamp'))
+        order.creation_block = block_info.get('number')
+        order.market = market
+        order.sender = sender
+        order.outcome_token = outcome_token
+        order.outcome_token_count = token_count
+        # bulk inserts don't go through save()
+        order.set_order_type()
+        # Copy, the market array keeps changing in memory until flush
+        order.net_outcome_tokens_sold = list(market.net_outcome_tokens_sold)
+        order.marginal_prices = [
+            Decimal(price) for price in calc_lmsr_marginal_prices(market.net_outcome_tokens_sold, market.funding)
+        ]
+        market.marginal_prices = order.marginal_prices
+        self.dirty_markets[market.pk] = market
+        self.new_orders[type(order)].append(order)
+        self.orders.append(order)
+        return order
+
+    def apply_outcome_token_creation(self, data, block_info):
+        event_address = self.get_address(data, 'address')
+        address = self.get_address(data, 'outcomeToken')
+        index = self.get_int(data, 'index', min_value=0)
+        if event_address not in self.events:
+            raise ValidationError({'address': 'Event with address {} does not exist.'.format(event_address)})
+
+        outcome_token = models.OutcomeToken(address=address, event_id=event_address, index=index, total_supply=0)
+        self.outcome_tokens[address] = outcome_token
+        self.event_outcome_tokens[(event_address, index)] = outcome_token
+        self.new_outcome_tokens[address] = outcome_token
+        return outcome_token
+
+    def apply_purchase(self, data, block_info):
+        buyer = self.get_address(data, 'buyer')
+        token_index = self.get_int(data, 'outcomeTokenIndex')
+        token_count = self.get_int(data, 'outcomeTokenCount')
+        outcome_token_cost = self.get_int(data, 'outcomeTokenCost')
+        market_fees = self.get_int(data, 'marketFees')
+
+        market = self.get_market(data['address'])
+        market.net_outcome_tokens_sold[token_index] += token_count
+        market.collected_fees += market_fees
+
+        order = models.BuyOrder()
+        order.cost = outcome_token_cost + market_fees
+        order.outcome_token_cost = outcome_token_cost
+        order.fees = market_fees
+        self.apply_order(order, market, token_index, token_count, buyer, block_info)
+        market.trading_volume += order.cost
+        return order
+
+    def apply_sale(self, data, block_info):
+        seller = self.get_address(data, 'seller')
+        token_index = self.get_int(data, 'outcomeTokenIndex')
+        token_count = self.get_int(data, 'outcomeTokenCount')
+        outcome_token_profit = self.get_int(data, 'outcomeTokenProfit')
+        market_fees = self.get_int(data, 'marketFees')
+
+        market = self.get_market(data['address'])
+        market.net_outcome_tokens_sold[token_index] -= token_count
+        market.collected_fees += market_fees
+
+        order = models.SellOrder()
+        order.profit = outcome_token_profit - market_fees
+        order.outcome_token_profit = outcome_token_profit
+        order.fees = market_fees
+        return self.apply_order(order, market, token_index, token_count, seller, block_info)
+
+    def apply_issuance(self, data, block_info):
+        owner = self.get_address(data, 'owner')
+        amount = self.get_int(data, 'amount')
+        outcome_token_balance = self.get_balance(owner, data['address'])
+        if outcome_token_balance:
+            outcome_token_balance.balance += amount
+            self.mark_balance(outcome_token_balance)
+            outcome_token = outcome_token_balance.outcome_token
+        else:
+            outcome_token = self.get_outcome_token(data['address'])
+            self.add_balance(owner, outcome_token, amount)
+
+        outcome_token.total_supply += amount
+        self.mark_outcome_token(outcome_token)
+        return outcome_token
+
+    def apply_revocation(self, data, block_info):
+        owner = self.get_address(data, 'owner')
+        amount = self.get_int(data, 'amount')
+        outcome_token_balance = self.get_balance(owner, data['address'])
+        if not outcome_token_balance:
+            raise ValidationError('OutcomeTokenBalance {} for owner {} doesn\'t exist'.format(data['address'], owner))
+
+        outcome_token_balance.balance -= amount
+        self.mark_balance(outcome_token_balance)
+        outcome_token = outcome_token_balance.outcome_token
+        outcome_token.total_supply -= amount
+        self.mark_outcome_token(outcome_token)
+        return outcome_token
+
+    def apply_transfer(self, data, block_info):
+        from_address = self.get_address(data, 'from')
+        to = self.get_address(data, 'to')
+        value = self.get_int(data, 'value', min_value=0)
+
+        from_balance = self.get_balance(from_address, data['address'])
+        if not from_balance:
+            raise models.OutcomeTokenBalance.DoesNotExist(
+                'OutcomeTokenBalance {} for owner {} doesn\'t exist'.format(data['address'], from_address))
+        from_balance.balance -= value
+        self.mark_balance(from_balance)
+
+        to_balance = self.get_balance(to, data['address'])
+        if not to_balance:
+            to_balance = self.add_balance(to, from_balance.outcome_token)
+        to_balance.balance += value
+        self.mark_balance(to_balance)
+        return to_balance
+
+
+def close_connections():
+    """
+    Worker initializer, see BulkEventProcessor.start
+    """
+    connections.close_all()
+
+
+def apply_partition(args):
+    """
+    Applies the events of a partition in a worker process, see BulkEventProcessor.apply_parallel
+    :return: (processor with the changes, results), None if an event raised an error
+    """
+    processor, items = args
+    try:
+        return processor, processor.apply_events(items)
+    except Exception as e:
+        logger.warning('Bulk Event Receiver partition failed: {}'.format(e))
+        return None
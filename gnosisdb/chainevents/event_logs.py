@@ -0,0 +1,111 @@
+"""
+Event receiver logging.
+
+Saved events are logged lazily, the event is only serialized to JSON if the record is emitted, and sampled at
+EVENT_LOG_SAMPLE_RATE. Invalid events are always logged in full. If EVENT_LOG_BLOCK_SUMMARY is set, the events of each
+block are also counted per receiver, event name and status (saved, invalid or ignored), and logged as one record at
+the end of the block: when the event listener saves the daemon with the block number, or the bulk processor is done.
+Records carry their fields as extra attributes (receiver, event_name, block_number, counts) for structured handlers.
+"""
+from django.conf import settings
+from django.db.models.signals import post_save
+from django_eth_events.models import Daemon
+from celery.utils.log import get_task_logger
+from json import dumps
+import logging
+import random
+
+logger = get_task_logger(__name__)
+
+
+class LazyJson(object):
+    """
+    Log argument serializing obj to JSON when the record is formatted
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return dumps(self.obj)
+
+
+class BlockSummary(object):
+    """
+    Counts the events of the current block, see flush()
+    """
+
+    def __init__(self):
+        self.block_number = None
+        self.counts = {}  # (receiver, event name, status) -> events
+
+    def add(self, block_number, receiver, event_name, status):
+        if block_number != self.block_number:
+            self.flush()
+            self.block_number = block_number
+        key = (receiver, event_name, status)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def flush(self):
+        """
+        Logs the counts of the current block, if any
+        """
+        if self.counts:
+            counts = dict(('{} {} {}'.format(*key), count) for key, count in self.counts.items())
+            logger.info('Block %s events: %s', self.block_number, LazyJson(counts),
+                        extra={'block_number': self.block_number, 'counts': counts})
+        self.counts = {}
+
+
+block_summary = BlockSummary()
+
+
+def flush_block_summary(sender, instance, **kwargs):
+    """
+    Daemon post_save receiver, the listener saves the daemon once it processed a block
+    """
+    if block_summary.block_number is not None and instance.block_number >= block_summary.block_number:
+        block_summary.flush()
+
+
+post_save.connect(flush_block_summary, sender=Daemon, dispatch_uid='chainevents.event_logs.flush_block_summary')
+
+
+def get_block_number(block_info):
+    return block_info.get('number') if block_info else None
+
+
+def count_event(receiver, decoded_event, block_info, status):
+    if getattr(settings, 'EVENT_LOG_BLOCK_SUMMARY', True):
+        block_summary.add(get_block_number(block_info), receiver, decoded_event.get('name'), status)
+
+
+def is_sampled():
+    rate = getattr(settings, 'EVENT_LOG_SAMPLE_RATE', 1.0)
+    return rate >= 1 or random.random() < rate
+
+
+def log_saved(event_logger, receiver, decoded_event, block_info):
+    """
+    Logs a saved event, if sampled
+    """
+    count_event(receiver, decoded_event, block_info, 'saved')
+    if event_logger.isEnabledFor(logging.INFO) and is_sampled():
+        event_logger.info('Event Receiver %s added: %s', receiver, LazyJson(decoded_event),
+                          extra={'receiver': receiver, 'event_name': decoded_event.get('name'),
+                                 'block_number': get_block_number(block_info)})
+
+
+def log_invalid(event_logger, receiver, action, decoded_event, errors, block_info):
+    """
+    Logs an invalid event and its errors, always
+    :param action: 'save' or 'rollback'
+    """
+    if action == 'save':
+        count_event(receiver, decoded_event, block_info, 'invalid')
+    extra = {'receiver': receiver, 'event_name': decoded_event.get('name'),
+             'block_number': get_block_number(block_info)}
+    event_logger.warning('INVALID Data for Event Receiver %s %s: %s', receiver, action, LazyJson(decoded_event),
+                         extra=extra)
+    event_logger.warning(errors, extra=extra)
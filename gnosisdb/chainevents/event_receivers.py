@@ -9,22 +9,66 @@ from relationaldb.serializers import (
     MarketFundingSerializer, MarketClosingSerializer, FeeWithdrawalSerializer
 )
 from relationaldb.models import (
-    CentralizedOracle, Market
+    CentralizedOracle, Event, Market, Oracle
 )
+from relationaldb.journal import is_journaled, journal_block, undo_block
+from restapi.cache import invalidate_events, invalidate_markets, invalidate_oracles
+from chainevents.address_getters import AddressCache
+from chainevents.event_logs import LazyJson, count_event, log_invalid, log_saved
+from gnosisdb.metrics import EventMeasurement, get_backend as get_metrics_backend
 
 from celery.utils.log import get_task_logger
-from json import dumps
 
 logger = get_task_logger(__name__)
 
 
+def rollback_journaled_block(block_number):
+    """
+    Reverts the block from the rollback journal, the receivers only revert the events of blocks indexed without it.
+    Every event of the block is rolled back by the first rollback call, the calls for the other events find the block
+    already reverted.
+    :return: True if the block was journaled
+    """
+    if not is_journaled(block_number):
+        return False
+    changes = undo_block(block_number)
+    if changes:
+        # Contracts may have been deleted, responses embed any of the changed rows
+        AddressCache.invalidate()
+        invalidate_markets(changes.get(Market, []))
+        invalidate_events(changes.get(Event, []))
+        invalidate_oracles(changes.get(Oracle, []))
+        logger.info('Block {} reverted from the rollback journal: {} rows'.format(
+            block_number, sum(len(pks) for pks in changes.values())))
+    return True
+
+
 class SerializerEventReceiver(AbstractEventReceiver):
 
     class Meta:
         events = {}
         primary_key_name = 'address'
 
-    def save(self, decoded_event, block_info=None):
+    def save(self, decoded_event, block_info=None, journaled=True):
+        """
+        :param journaled: False skips the rollback journal, for blocks too old to be reorganized
+        """
+        metrics_backend = get_metrics_backend()
+        if not metrics_backend.enabled:
+            return self.save_journaled(decoded_event, block_info, journaled)
+        # The journal queries are measured too
+        with EventMeasurement(metrics_backend, self.__class__.__name__, decoded_event.get('name')) as measurement:
+            instance = self.save_journaled(decoded_event, block_info, journaled)
+            if instance is None:
+                measurement.status = 'invalid' if self.Meta.events.get(decoded_event.get('name')) else 'ignored'
+            return instance
+
+    def save_journaled(self, decoded_event, block_info, journaled):
+        # Changes are journaled, so a reorganization of the block can replay them backwards
+        with journal_block(block_info.get('number') if block_info and journaled else None):
+            return self.save_event(decoded_event, block_info)
+
+    def save_event(self, decoded_event, block_info):
         # Get serializer based on Event Name and saved serializers in Meta.events dictionary
         if self.Meta.events.get(decoded_event.get('name')):
             # Block info is optional, only models that inherit from ContractCreatedByFactory need it
@@ -36,15 +80,17 @@ class SerializerEventReceiver(AbstractEventReceiver):
             # Only valid data goes forward, non valid data is logged
             if serializer.is_valid():
                 instance = serializer.save()
-                logger.info('Event Receiver {} added: {}'.format(self.__class__.__name__, dumps(decoded_event)))
+                log_saved(logger, self.__class__.__name__, decoded_event, block_info)
                 # serializer model instance is returned in order to django-eth-events know it was a valid event
                 return instance
             else:
-                logger.warning('INVALID Data for Event Receiver {} save: {}'.format(self.__class__.__name__,
-                                                                                        dumps(decoded_event)))
-                logger.warning(serializer.errors)
+                log_invalid(logger, self.__class__.__name__, 'save', decoded_event, serializer.errors, block_info)
+        else:
+            count_event(self.__class__.__name__, decoded_event, block_info, 'ignored')
 
     def rollback(self, decoded_event, block_info):
+        if rollback_journaled_block(block_info['number']):
+            return
         serializer_class = self.Meta.events.get(decoded_event.get('name'))
         # Get primary key name from Meta.primary_key_name, it can be the same for all Events (string) or different for
         # each one (dictionary)
@@ -62,10 +108,9 @@ class SerializerEventReceiver(AbstractEventReceiver):
         serializer = serializer_class(instance, data=decoded_event, block=block_info)
         if serializer.is_valid():
             serializer.rollback()
-            logger.info('Event Receiver {} reverted: {}'.format(self.__class__.__name__, dumps(decoded_event)))
+            logger.info('Event Receiver %s reverted: %s', self.__class__.__name__, LazyJson(decoded_event))
         else:
-            logger.warning('INVALID Data for Event Receiver {} rollback: {}'.format(self.__class__.__name__, dumps(decoded_event)))
-            logger.warning(serializer.errors)
+            log_invalid(logger, self.__class__.__name__, 'rollback', decoded_event, serializer.errors, block_info)
 
 
 class CentralizedOracleFactoryReceiver(SerializerEventReceiver):
@@ -114,6 +159,8 @@ class BaseInstanceEventReceiver(SerializerEventReceiver):
         primary_key_name = {}
 
     def rollback(self, decoded_event, block_info):
+        if rollback_journaled_block(block_info['number']):
+            return
         serializer_class = self.Meta.events.get(decoded_event.get('name'))
 
         primary_key_name = self.Meta.primary_key_name.get(decoded_event.get('name'))
@@ -136,12 +183,9 @@ class BaseInstanceEventReceiver(SerializerEventReceiver):
         serializer = serializer_class(instance, data=decoded_event, block=block_info)
         if serializer.is_valid():
             serializer.rollback()
-            logger.info('Event Receiver {} reverted: {}'.format(self.__class__.__name__, dumps(decoded_event)))
+            logger.info('Event Receiver %s reverted: %s', self.__class__.__name__, LazyJson(decoded_event))
         else:
-            logger.warning(
-                'INVALID Data for Event Receiver {} rollback: {}'.format(self.__class__.__name__, dumps(decoded_event))
-            )
-            logger.warning(serializer.errors)
+            log_invalid(logger, self.__class__.__name__, 'rollback', decoded_event, serializer.errors, block_info)
 
 
 class MarketInstanceReceiver(BaseInstanceEventReceiver):
@@ -217,6 +261,7 @@ class OutcomeTokenInstanceReceiver(BaseInstanceEventReceiver):
         primary_key_name = {
             'Issuance': 'address',
             'Revocation': 'address',
+            # Sender balance, looked up through the (owner, outcome_token) unique index
             'Transfer': {
                 'owner': 'from',
                 'outcome_token': 'address'
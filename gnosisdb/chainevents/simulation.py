@@ -0,0 +1,324 @@
+"""
+Synthetic chains for reorganization tests and benchmarks.
+
+ChainGenerator deterministically generates the decoded events of a chain creating oracles, events and markets, then
+trading, transferring, issuing and revoking their outcome tokens, and forks it at any depth. The blocks are applied
+and rolled back through the event receivers, in the order the django-eth-events listener uses.
+"""
+from copy import deepcopy
+from django.conf import settings
+from django.db.models import AutoField
+from django.utils import timezone
+from datetime import datetime
+from chainevents.event_receivers import (
+    CentralizedOracleFactoryReceiver, EventFactoryReceiver, MarketFactoryReceiver,
+    EventInstanceReceiver, MarketInstanceReceiver, OutcomeTokenInstanceReceiver
+)
+from relationaldb.journal import get_journaled_models
+from relationaldb.models import CategoricalEventDescription
+from timeit import default_timer
+import random
+
+
+class ChainGenerator(object):
+    """
+    Generates blocks of (receiver, decoded_event, block_info) tuples from a seed.
+    Only valid events are generated: the generator keeps the markets and balances of its chain, and restores them when
+    blocks are forked away.
+    """
+    oracle_factory = '{:040x}'.format(0xf1)
+    event_factory = '{:040x}'.format(0xf2)
+    market_factory = '{:040x}'.format(0xf3)
+    outcome_counts = (2, 3)  # one genesis event description per outcome count
+    genesis_timestamp = 1500000000  # blocks are 15 seconds apart from there
+    # Relative frequency of the generated actions, once there is a market
+    actions = (
+        ('create_market', 1),
+        ('purchase', 10),
+        ('sale', 4),
+        ('transfer', 4),
+        ('issuance', 2),
+        ('revocation', 2),
+    )
+
+    def __init__(self, seed=0, events_per_block=10, n_accounts=20, max_depth=10):
+        """
+        :param events_per_block: mean number of actions per block, most actions are two events
+        :param max_depth: deepest fork the generator can restore its state for
+        """
+        self.random = random.Random(seed)
+        self.events_per_block = events_per_block
+        self.accounts = ['{:040x}'.format(0xacc00000 + index) for index in range(0, n_accounts)]
+        self.max_depth = max_depth
+        self.blocks = []
+        self.block_info = None
+        self.events = []  # events of the block being generated
+        self.states = []  # state before each of the last max_depth blocks
+        self.state = {
+            'contracts': 0,  # contracts created, for the next address
+            'markets': [],  # [(market address, [outcome token addresses])]
+            'balances': {},  # (owner, outcome token address) -> balance
+        }
+        self.receivers = {
+            CentralizedOracleFactoryReceiver: CentralizedOracleFactoryReceiver(),
+            EventFactoryReceiver: EventFactoryReceiver(),
+            MarketFactoryReceiver: MarketFactoryReceiver(),
+            EventInstanceReceiver: EventInstanceReceiver(),
+            MarketInstanceReceiver: MarketInstanceReceiver(),
+            OutcomeTokenInstanceReceiver: OutcomeTokenInstanceReceiver()
+        }
+
+    def get_ipfs_hash(self, n_outcomes):
+        return 'Qm{:044d}'.format(n_outcomes)
+
+    def create_genesis(self):
+        """
+        Creates the event descriptions the oracles refer to, so they are found without requesting IPFS
+        """
+        for n_outcomes in self.outcome_counts:
+            CategoricalEventDescription.objects.get_or_create(ipfs_hash=self.get_ipfs_hash(n_outcomes), defaults={
+                'title': 'Simulated event with {} outcomes'.format(n_outcomes),
+                'description': 'Generated by chainevents.simulation',
+                # Fixed, the states of a reorganized and a replayed chain must be equal
+                'resolution_date': datetime.fromtimestamp(self.genesis_timestamp, timezone.utc),
+                'outcomes': ['Outcome {}'.format(index) for index in range(0, n_outcomes)]
+            })
+
+    # ========================================================
+    #                 Blocks and forks
+    # ========================================================
+
+    def next_block(self):
+        """
+        Generates and appends the next block of the chain
+        :return: list of (receiver, decoded_event, block_info)
+        """
+        self.states.append(deepcopy(self.state))
+        del self.states[:-self.max_depth]
+
+        number = len(self.blocks) + 1
+        self.block_info = {'number': number, 'timestamp': self.genesis_timestamp + number * 15}
+        self.events = []
+        for _ in range(0, self.random.randint(1, 2 * self.events_per_block - 1)):
+            if self.state['markets']:
+                action = self.choose_action()
+            else:
+                action = 'create_market'
+            getattr(self, action)()
+        self.blocks.append(self.events)
+        return self.events
+
+    def fork(self, depth):
+        """
+        Removes the last depth blocks, the following blocks are generated from the state before them
+        :return: the removed blocks, newest first
+        """
+        if depth > len(self.states):
+            raise ValueError('Forks are limited to the last {} blocks'.format(len(self.states)))
+        self.state = self.states[-depth]
+        del self.states[-depth:]
+        removed = self.blocks[-depth:]
+        del self.blocks[-depth:]
+        return list(reversed(removed))
+
+    # ========================================================
+    #                 Actions
+    # ========================================================
+
+    def choose_action(self):
+        value = self.random.uniform(0, sum(weight for _, weight in self.actions))
+        for action, weight in self.actions:
+            value -= weight
+            if value <= 0:
+                return action
+        return self.actions[-1][0]
+
+    def add_event(self, receiver_class, name, address, **params):
+        self.events.append((self.receivers[receiver_class], {
+            'name': name,
+            'address': address,
+            'params': [{'name': key, 'value': value} for key, value in sorted(params.items())]
+        }, self.block_info))
+
+    def new_address(self):
+        self.state['contracts'] += 1
+        return '{:040x}'.format(0xc0000000 + self.state['contracts'])
+
+    def get_holdings(self):
+        return sorted(key for key, balance in self.state['balances'].items() if balance > 0)
+
+    def add_balance(self, owner, outcome_token, amount):
+        key = (owner, outcome_token)
+        self.state['balances'][key] = self.state['balances'].get(key, 0) + amount
+
+    def get_token_market(self, outcome_token):
+        for market, outcome_tokens in self.state['markets']:
+            if outcome_token in outcome_tokens:
+                return market, outcome_tokens.index(outcome_token)
+
+    def create_market(self):
+        """
+        Creates and funds a market, with its oracle, event and outcome tokens, in one block
+        """
+        creator = self.random.choice(self.accounts)
+        n_outcomes = self.random.choice(self.outcome_counts)
+        oracle = self.new_address()
+        event = self.new_address()
+        market = self.new_address()
+        outcome_tokens = [self.new_address() for _ in range(0, n_outcomes)]
+
+        self.add_event(CentralizedOracleFactoryReceiver, 'CentralizedOracleCreation', self.oracle_factory,
+                       creator=creator, centralizedOracle=oracle, ipfsHash=self.get_ipfs_hash(n_outcomes))
+        self.add_event(EventFactoryReceiver, 'CategoricalEventCreation', self.event_factory,
+                       creator=creator, collateralToken='{:040x}'.format(0xe7), oracle=oracle,
+                       outcomeCount=n_outcomes, categoricalEvent=event)
+        for index, outcome_token in enumerate(outcome_tokens):
+            self.add_event(EventInstanceReceiver, 'OutcomeTokenCreation', event, outcomeToken=outcome_token,
+                           index=index)
+        self.add_event(MarketFactoryReceiver, 'StandardMarketCreation', self.market_factory,
+                       creator=creator, eventContract=event, marketMaker=settings.LMSR_MARKET_MAKER,
+                       fee=self.random.randint(0, 10000), market=market)
+        self.add_event(MarketInstanceReceiver, 'MarketFunding', market,
+                       funding=self.random.randint(1, 100) * 10 ** 18)
+        self.state['markets'].append((market, outcome_tokens))
+
+    def purchase(self):
+        market, outcome_tokens = self.random.choice(self.state['markets'])
+        buyer = self.random.choice(self.accounts)
+        index = self.random.randint(0, len(outcome_tokens) - 1)
+        count = self.random.randint(1, 100) * 10 ** 16
+        self.add_event(MarketInstanceReceiver, 'OutcomeTokenPurchase', market, buyer=buyer, outcomeTokenIndex=index,
+                       outcomeTokenCount=count, outcomeTokenCost=count // 2, marketFees=count // 100)
+        self.add_event(OutcomeTokenInstanceReceiver, 'Issuance', outcome_tokens[index], owner=buyer, amount=count)
+        self.add_balance(buyer, outcome_tokens[index], count)
+
+    def sale(self):
+        holdings = self.get_holdings()
+        if not holdings:
+            return self.purchase()
+        seller, outcome_token = self.random.choice(holdings)
+        market, index = self.get_token_market(outcome_token)
+        count = self.random.randint(1, self.state['balances'][(seller, outcome_token)])
+        self.add_event(MarketInstanceReceiver, 'OutcomeTokenSale', market, seller=seller, outcomeTokenIndex=index,
+                       outcomeTokenCount=count, outcomeTokenProfit=count // 2, marketFees=count // 100)
+        self.add_event(OutcomeTokenInstanceReceiver, 'Revocation', outcome_token, owner=seller, amount=count)
+        self.add_balance(seller, outcome_token, -count)
+
+    def transfer(self):
+        holdings = self.get_holdings()
+        if not holdings:
+            return self.purchase()
+        sender, outcome_token = self.random.choice(holdings)
+        to = self.random.choice([account for account in self.accounts if account != sender])
+        value = self.random.randint(1, self.state['balances'][(sender, outcome_token)])
+        self.add_event(OutcomeTokenInstanceReceiver, 'Transfer', outcome_token, value=value, to=to,
+                       **{'from': sender})
+        self.add_balance(sender, outcome_token, -value)
+        self.add_balance(to, outcome_token, value)
+
+    def issuance(self):
+        _, outcome_tokens = self.random.choice(self.state['markets'])
+        outcome_token = self.random.choice(outcome_tokens)
+        owner = self.random.choice(self.accounts)
+        amount = self.random.randint(1, 100) * 10 ** 16
+        self.add_event(OutcomeTokenInstanceReceiver, 'Issuance', outcome_token, owner=owner, amount=amount)
+        self.add_balance(owner, outcome_token, amount)
+
+    def revocation(self):
+        holdings = self.get_holdings()
+        if not holdings:
+            return self.issuance()
+        owner, outcome_token = self.random.choice(holdings)
+        amount = self.random.randint(1, self.state['balances'][(owner, outcome_token)])
+        self.add_event(OutcomeTokenInstanceReceiver, 'Revocation', outcome_token, owner=owner, amount=amount)
+        self.add_balance(owner, outcome_token, -amount)
+
+
+# ========================================================
+#                 Driving the receivers
+# ========================================================
+
+def save_block(block):
+    for receiver, decoded_event, block_info in block:
+        receiver.save(decoded_event, block_info)
+
+
+def rollback_block(block):
+    """
+    Rolls back the events of a block, last event first
+    """
+    for receiver, decoded_event, block_info in reversed(block):
+        receiver.rollback(decoded_event, block_info)
+
+
+def new_stats():
+    return {
+        'blocks': 0,
+        'events': 0,
+        'seconds': 0.0,  # spent saving blocks
+        'rollbacks': {},  # depth -> [seconds spent rolling back the forked blocks]
+    }
+
+
+def replay(blocks):
+    """
+    Saves the blocks, as an indexer starting from scratch
+    """
+    stats = new_stats()
+    for block in blocks:
+        start = default_timer()
+        save_block(block)
+        stats['seconds'] += default_timer() - start
+        stats['blocks'] += 1
+        stats['events'] += len(block)
+    return stats
+
+
+def simulate(generator, n_blocks, n_reorgs, seed=0):
+    """
+    Generates and saves a chain of n_blocks, reorganized n_reorgs times at random heights and depths of up to
+    generator.max_depth blocks. generator.blocks is the final chain.
+    :return: statistics, with the rollback times of every reorganization by depth
+    """
+    schedule = random.Random(seed)
+    heights = set(schedule.sample(range(generator.max_depth + 1, n_blocks + 1),
+                                  min(n_reorgs, max(n_blocks - generator.max_depth, 0))))
+    stats = new_stats()
+    while len(generator.blocks) < n_blocks:
+        block = generator.next_block()
+        start = default_timer()
+        save_block(block)
+        stats['seconds'] += default_timer() - start
+        stats['blocks'] += 1
+        stats['events'] += len(block)
+
+        height = len(generator.blocks)
+        if height in heights:
+            # Every height reorganizes once, the replacing blocks are saved on the next iterations
+            heights.remove(height)
+            depth = schedule.randint(1, generator.max_depth)
+            start = default_timer()
+            for removed_block in generator.fork(depth):
+                rollback_block(removed_block)
+            stats['rollbacks'].setdefault(depth, []).append(default_timer() - start)
+    return stats
+
+
+def is_surrogate(field):
+    """
+    Auto primary keys, and references to them, differ between two indexings of the same chain
+    """
+    if field.is_relation:
+        field = field.target_field
+    return isinstance(field, AutoField)
+
+
+def get_state():
+    """
+    Returns {table: sorted rows} of every indexed table, without surrogate keys, to compare two indexings
+    """
+    state = {}
+    for table, model in get_journaled_models().items():
+        fields = [field.name for field in model._meta.local_concrete_fields if not is_surrogate(field)]
+        state[table] = sorted(model._default_manager.values_list(*fields), key=repr)
+    return state
@@ -1,9 +1,18 @@
+from django.db import connection, transaction
 from django.test import TestCase
-from chainevents.address_getters import MarketAddressGetter, EventAddressGetter
-from relationaldb.tests.factories import MarketFactory, EventFactory
+from chainevents.address_getters import MarketAddressGetter, EventAddressGetter, AddressCache
+from relationaldb.tests.factories import MarketFactory, EventFactory, CategoricalEventFactory
+
+
+class Rollback(Exception):
+    pass
 
 
 class TestAddressGetters(TestCase):
+    def setUp(self):
+        # Transaction test cases empty the tables without delete signals
+        AddressCache.clear()
+
     def test_market_address_getter(self):
         getter = MarketAddressGetter()
         self.assertListEqual([], getter.get_addresses())
@@ -22,4 +31,46 @@ class TestAddressGetters(TestCase):
         self.assertTrue(getter.__contains__(event.address))
         self.assertListEqual([event.address], getter.get_addresses())
         event2 = EventFactory.create()
-        self.assertListEqual([event.address, event2.address], getter.get_addresses())
\ No newline at end of file
+        self.assertListEqual([event.address, event2.address], getter.get_addresses())
+
+    def test_address_getter_cache(self):
+        getter = EventAddressGetter()
+        event = CategoricalEventFactory.create()
+        # Loads the cache
+        self.assertTrue(event.address in getter)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(event.address in getter)
+            self.assertFalse('{:040d}'.format(999999) in getter)
+
+        # Child models are added to the parent model addresses
+        event2 = CategoricalEventFactory.create()
+        with self.assertNumQueries(0):
+            self.assertTrue(event2.address in getter)
+
+        # Deleting (rollback) invalidates the cache
+        event2.delete()
+        self.assertFalse(event2.address in getter)
+        self.assertListEqual([event.address], getter.get_addresses())
+
+    def test_address_cache_transactions(self):
+        getter = EventAddressGetter()
+        event = CategoricalEventFactory.create()
+        self.assertTrue(event.address in getter)
+        try:
+            with transaction.atomic():
+                event2 = CategoricalEventFactory.create()
+                self.assertTrue(event2.address in getter)
+                raise Rollback()
+        except Rollback:
+            pass
+        # Never added, the rollback discarded it
+        self.assertFalse(event2.address in getter)
+
+        # Only added to the shared addresses on commit, the test transaction never commits
+        self.assertEquals(AddressCache._addresses[getter.Meta.model], frozenset())
+        callbacks = connection.run_on_commit
+        connection.run_on_commit = []
+        for _, callback in callbacks:
+            callback()
+        self.assertEquals(AddressCache._addresses[getter.Meta.model], frozenset([event.address]))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.test import TestCase
+from chainevents.backfill import BlockBackfiller
+from chainevents.bulk import BulkEventProcessor
+from chainevents.address_getters import AddressCache
+from relationaldb.models import OutcomeToken, OutcomeTokenBalance
+from relationaldb.tests.factories import CategoricalEventFactory
+
+
+class ChainDouble(object):
+    """
+    web3.eth and decoder of a single block, every log carries its decoded event
+    """
+
+    def __init__(self, block, receipts):
+        self.eth = self
+        self.block = block
+        self.receipts = receipts
+
+    def getBlock(self, block_number):
+        return self.block
+
+    def getTransactionReceipt(self, tx_hash):
+        return self.receipts[tx_hash]
+
+    def add_abi(self, abi):
+        pass
+
+    def decode_logs(self, logs):
+        return [log['decoded'] for log in logs]
+
+
+class TestBlockBackfiller(TestCase):
+
+    def test_save_block(self):
+        AddressCache.clear()
+        event = CategoricalEventFactory()
+        token_address = '{:040d}'.format(400)
+        owner = '{:040d}'.format(100)
+        creation = {
+            'name': 'OutcomeTokenCreation',
+            'address': event.address,
+            'params': [
+                {'name': 'outcomeToken', 'value': token_address},
+                {'name': 'index', 'value': 0},
+            ]
+        }
+        issuance = {
+            'name': 'Issuance',
+            'address': token_address,
+            'params': [
+                {'name': 'owner', 'value': owner},
+                {'name': 'amount', 'value': 10},
+            ]
+        }
+        # The issuance comes first in the block, the token is only watched once its event contract logs are saved
+        chain = ChainDouble({'number': 1, 'timestamp': 1500000000, 'transactions': ['tx1', 'tx2']}, {
+            'tx1': {'logs': [{'address': '0x' + token_address, 'decoded': issuance}]},
+            'tx2': {'logs': [
+                {'address': '0x' + event.address.upper(), 'decoded': creation},
+                # Not watched
+                {'address': '0x' + '{:040d}'.format(500), 'decoded': issuance},
+            ]},
+        })
+        contracts = [
+            {
+                'ADDRESSES_GETTER': 'chainevents.address_getters.EventAddressGetter',
+                'EVENT_ABI': [],
+                'EVENT_DATA_RECEIVER': 'chainevents.event_receivers.EventInstanceReceiver',
+            },
+            {
+                'ADDRESSES_GETTER': 'chainevents.address_getters.OutcomeTokenGetter',
+                'EVENT_ABI': [],
+                'EVENT_DATA_RECEIVER': 'chainevents.event_receivers.OutcomeTokenInstanceReceiver',
+            },
+        ]
+
+        backfiller = BlockBackfiller(BulkEventProcessor(backfill=True), web3=chain, decoder=chain, contracts=contracts)
+        self.assertEquals(backfiller.save_block(1), 2)
+        outcome_token = OutcomeToken.objects.get(address=token_address)
+        self.assertEquals(outcome_token.total_supply, 10)
+        self.assertEquals(OutcomeTokenBalance.objects.get(owner=owner, outcome_token=outcome_token).balance, 10)
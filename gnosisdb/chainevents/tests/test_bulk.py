@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import transaction
+from django.db.transaction import TransactionManagementError
+from django.test import TestCase, TransactionTestCase
+from chainevents.bulk import BulkEventProcessor
+from chainevents.address_getters import AddressCache, OutcomeTokenGetter
+from chainevents.simulation import get_state
+from chainevents.event_receivers import MarketInstanceReceiver, EventInstanceReceiver, OutcomeTokenInstanceReceiver
+from relationaldb.bulk import deferred_indexes
+from relationaldb.journal import prune
+from relationaldb.models import BuyOrder, SellOrder, Market, Order, OutcomeToken, OutcomeTokenBalance
+from relationaldb.tests.factories import MarketFactory, OutcomeTokenFactory, CategoricalEventFactory
+from gnosisdb.utils import calc_lmsr_marginal_prices
+from datetime import datetime
+from time import mktime
+from decimal import Decimal
+
+
+class Rollback(Exception):
+    pass
+
+
+class BulkEventsMixin(object):
+
+    def setUp(self):
+        self.event = CategoricalEventFactory()
+        self.outcome_token = OutcomeTokenFactory(event=self.event, index=0, total_supply=0)
+        self.outcome_token2 = OutcomeTokenFactory(event=self.event, index=1, total_supply=0)
+        self.market = MarketFactory(event=self.event, funding=1e18, net_outcome_tokens_sold=[0, 0])
+        self.block = {
+            'number': 1,
+            'timestamp': mktime(datetime.now().timetuple())
+        }
+        self.buyer = '{:040d}'.format(100)
+        self.receiver = '{:040d}'.format(200)
+
+    def token_event(self, name, params):
+        return OutcomeTokenInstanceReceiver(), {
+            'name': name,
+            'address': self.outcome_token.address,
+            'params': params
+        }, self.block
+
+    def market_event(self, name, params):
+        return MarketInstanceReceiver(), {
+            'name': name,
+            'address': self.market.address,
+            'params': params
+        }, self.block
+
+
+class TestBulkEventProcessor(BulkEventsMixin, TestCase):
+
+    def test_bulk_save(self):
+        events = [
+            self.market_event('OutcomeTokenPurchase', [
+                {'name': 'outcomeTokenCost', 'value': 100},
+                {'name': 'marketFees', 'value': 10},
+                {'name': 'buyer', 'value': self.buyer},
+                {'name': 'outcomeTokenIndex', 'value': 0},
+                {'name': 'outcomeTokenCount', 'value': 10 ** 18},
+            ]),
+            self.token_event('Issuance', [
+                {'name': 'owner', 'value': self.buyer},
+                {'name': 'amount', 'value': 10 ** 18},
+            ]),
+            self.token_event('Transfer', [
+                {'name': 'from', 'value': self.buyer},
+                {'name': 'to', 'value': self.receiver},
+                {'name': 'value', 'value': 4 * 10 ** 17},
+            ]),
+            self.token_event('Revocation', [
+                {'name': 'owner', 'value': self.receiver},
+                {'name': 'amount', 'value': 10 ** 17},
+            ]),
+            self.market_event('OutcomeTokenSale', [
+                {'name': 'outcomeTokenProfit', 'value': 50},
+                {'name': 'marketFees', 'value': 5},
+                {'name': 'seller', 'value': self.receiver},
+                {'name': 'outcomeTokenIndex', 'value': 0},
+                {'name': 'outcomeTokenCount', 'value': 10 ** 17},
+            ]),
+            # Invalid, unknown balance
+            self.token_event('Revocation', [
+                {'name': 'owner', 'value': '{:040d}'.format(300)},
+                {'name': 'amount', 'value': 1},
+            ]),
+        ]
+
+        results = BulkEventProcessor().save(events)
+        self.assertEqual(len(results), len(events))
+        self.assertIsNone(results[-1])
+
+        self.assertEqual(BuyOrder.objects.count(), 1)
+        self.assertEqual(SellOrder.objects.count(), 1)
+        buy_order = BuyOrder.objects.get()
+        self.assertEqual(buy_order.cost, 110)
+        self.assertListEqual(buy_order.net_outcome_tokens_sold, [10 ** 18, 0])
+
+        market = Market.objects.get(address=self.market.address)
+        self.assertListEqual(market.net_outcome_tokens_sold, [9 * 10 ** 17, 0])
+        self.assertEqual(market.collected_fees, 15)
+        self.assertEqual(market.trading_volume, 110)
+        expected_prices = [
+            Decimal(price).quantize(Decimal('0.0001'))
+            for price in calc_lmsr_marginal_prices([9 * 10 ** 17, 0], 10 ** 18)
+        ]
+        self.assertListEqual(market.marginal_prices, expected_prices)
+
+        self.assertEqual(OutcomeToken.objects.get(address=self.outcome_token.address).total_supply, 9 * 10 ** 17)
+        self.assertEqual(
+            OutcomeTokenBalance.objects.get(owner=self.buyer, outcome_token=self.outcome_token).balance,
+            6 * 10 ** 17
+        )
+        self.assertEqual(
+            OutcomeTokenBalance.objects.get(owner=self.receiver, outcome_token=self.outcome_token).balance,
+            3 * 10 ** 17
+        )
+
+    def test_bulk_save_queries(self):
+        events = [
+            self.token_event('Issuance', [
+                {'name': 'owner', 'value': '{:040d}'.format(owner)},
+                {'name': 'amount', 'value': 10},
+            ])
+            for owner in range(0, 50)
+        ]
+
+        # The journal is pruned once per block and process
+        prune(self.block['number'])
+        # savepoint, journal savepoint and block, prefetch tokens and balances, insert balances, update total supply,
+        # reset the journal block, release both savepoints
+        with self.assertNumQueries(10):
+            BulkEventProcessor().save(events)
+
+        self.assertEqual(OutcomeTokenBalance.objects.count(), 50)
+        self.assertEqual(OutcomeToken.objects.get(address=self.outcome_token.address).total_supply, 500)
+
+    def test_parallel_start(self):
+        processor = BulkEventProcessor(workers=2)
+        # TestCase runs every test in a transaction
+        with self.assertRaises(TransactionManagementError):
+            processor.start()
+        self.assertIsNone(processor.pool)
+
+
+class TestParallelBulkEventProcessor(BulkEventsMixin, TransactionTestCase):
+
+    def test_backfill_save(self):
+        # Indexes can't be dropped inside the transaction of a TestCase, the deferred constraint checks are pending
+        AddressCache.clear()
+        event = CategoricalEventFactory()
+        token_address = '{:040d}'.format(400)
+        events = [
+            (EventInstanceReceiver(), {
+                'name': 'OutcomeTokenCreation',
+                'address': event.address,
+                'params': [
+                    {'name': 'outcomeToken', 'value': token_address},
+                    {'name': 'index', 'value': 0},
+                ]
+            }, self.block),
+            (OutcomeTokenInstanceReceiver(), {
+                'name': 'Issuance',
+                'address': token_address,
+                'params': [
+                    {'name': 'owner', 'value': self.buyer},
+                    {'name': 'amount', 'value': 10},
+                ]
+            }, self.block),
+        ] + [
+            self.market_event('OutcomeTokenPurchase', [
+                {'name': 'outcomeTokenCost', 'value': 100},
+                {'name': 'marketFees', 'value': 0},
+                {'name': 'buyer', 'value': self.buyer},
+                {'name': 'outcomeTokenIndex', 'value': 1},
+                {'name': 'outcomeTokenCount', 'value': 10 ** 17},
+            ])
+            for x in range(0, 3)
+        ]
+
+        with deferred_indexes(Order, OutcomeTokenBalance):
+            results = BulkEventProcessor(backfill=True).save(events)
+        self.assertTrue(all(results))
+
+        outcome_token = OutcomeToken.objects.get(address=token_address)
+        self.assertEqual(outcome_token.total_supply, 10)
+        self.assertTrue(token_address in OutcomeTokenGetter())
+        self.assertEqual(OutcomeTokenBalance.objects.get(owner=self.buyer, outcome_token=outcome_token).balance, 10)
+
+        # Reserved primary keys link the order rows to their child rows
+        orders = list(BuyOrder.objects.order_by('pk'))
+        self.assertListEqual([order.pk for order in orders], [result.pk for result in results[2:]])
+        self.assertListEqual([order.net_outcome_tokens_sold for order in orders],
+                             [[0, 10 ** 17], [0, 2 * 10 ** 17], [0, 3 * 10 ** 17]])
+        self.assertEqual(orders[0].order_type, 'BUY')
+        self.assertEqual(Market.objects.get(address=self.market.address).net_outcome_tokens_sold, [0, 3 * 10 ** 17])
+
+    def test_parallel_save(self):
+        event2 = CategoricalEventFactory()
+        outcome_tokens2 = [OutcomeTokenFactory(event=event2, index=index, total_supply=0) for index in range(0, 2)]
+        market2 = MarketFactory(event=event2, funding=1e18, net_outcome_tokens_sold=[0, 0])
+        markets = [(self.market, [self.outcome_token, self.outcome_token2]), (market2, outcome_tokens2)]
+        events = []
+        for x in range(0, 20):
+            market, outcome_tokens = markets[x % 2]
+            buyer = '{:040d}'.format(100 + x % 3)
+            events.append((MarketInstanceReceiver(), {
+                'name': 'OutcomeTokenPurchase',
+                'address': market.address,
+                'params': [
+                    {'name': 'outcomeTokenCost', 'value': 100},
+                    {'name': 'marketFees', 'value': x},
+                    {'name': 'buyer', 'value': buyer},
+                    {'name': 'outcomeTokenIndex', 'value': x % 2},
+                    {'name': 'outcomeTokenCount', 'value': (x + 1) * 10 ** 16},
+                ]
+            }, self.block))
+            events.append((OutcomeTokenInstanceReceiver(), {
+                'name': 'Issuance',
+                'address': outcome_tokens[x % 2].address,
+                'params': [
+                    {'name': 'owner', 'value': buyer},
+                    {'name': 'amount', 'value': (x + 1) * 10 ** 16},
+                ]
+            }, self.block))
+            events.append((OutcomeTokenInstanceReceiver(), {
+                'name': 'Transfer',
+                'address': outcome_tokens[x % 2].address,
+                'params': [
+                    {'name': 'from', 'value': buyer},
+                    {'name': 'to', 'value': self.receiver},
+                    {'name': 'value', 'value': 10 ** 16},
+                ]
+            }, self.block))
+
+        def save(workers):
+            processor = BulkEventProcessor(workers=workers, parallel_min_events=0)
+            processor.start()
+            try:
+                with transaction.atomic():
+                    results = processor.save(events)
+                    state = get_state()
+                    raise Rollback()
+            except Rollback:
+                pass
+            finally:
+                parallel = processor.pool is not None
+                processor.close()
+            return results, state, parallel
+
+        sequential_results, sequential_state, parallel = save(1)
+        self.assertFalse(parallel)
+        results, state, parallel = save(2)
+        self.assertTrue(parallel)
+        self.assertTrue(all(results))
+        self.assertListEqual([type(result) for result in results], [type(result) for result in sequential_results])
+        # Orders are inserted in chain order
+        self.assertListEqual([result.fees for result in results if isinstance(result, BuyOrder)], list(range(0, 20)))
+        for table in sequential_state:
+            self.assertListEqual(state[table], sequential_state[table], table)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.test import TestCase
+from django_eth_events.models import Daemon
+from chainevents.event_logs import LazyJson, block_summary, logger as summary_logger
+from chainevents.event_receivers import OutcomeTokenInstanceReceiver, logger as receiver_logger
+from relationaldb.tests.factories import OutcomeTokenFactory
+import logging
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class NotSerializable(object):
+    pass
+
+
+class TestEventLogs(TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        for logger in (receiver_logger, summary_logger):
+            logger.addHandler(self.handler)
+            self.addCleanup(logger.removeHandler, self.handler)
+            self.addCleanup(logger.setLevel, logger.level)
+            logger.setLevel(logging.INFO)
+        block_summary.flush()
+        self.handler.records = []
+        self.outcome_token = OutcomeTokenFactory()
+        self.receiver = OutcomeTokenInstanceReceiver()
+
+    def issuance(self, amount):
+        return {
+            'name': 'Issuance',
+            'address': self.outcome_token.address,
+            'params': [
+                {'name': 'owner', 'value': '{:040d}'.format(100)},
+                {'name': 'amount', 'value': amount}
+            ]
+        }
+
+    def test_lazy_formatting(self):
+        receiver_logger.setLevel(logging.WARNING)
+        # Never formatted, it would raise otherwise
+        receiver_logger.info('Event %s', LazyJson(NotSerializable()))
+        self.assertEquals(self.handler.records, [])
+        self.assertEquals(str(LazyJson({'name': 'Issuance'})), '{"name": "Issuance"}')
+
+    def test_sampled_logs(self):
+        with self.settings(EVENT_LOG_SAMPLE_RATE=0):
+            for block_number in (1, 1, 2):
+                self.receiver.save(self.issuance(10), {'number': block_number, 'timestamp': 1500000000})
+            self.receiver.save(self.issuance('ten'), {'number': 2, 'timestamp': 1500000000})
+        block_summary.flush()
+
+        messages = [record.getMessage() for record in self.handler.records]
+        self.assertFalse(any('added' in message for message in messages))
+        # Invalid events are always logged in full
+        invalid = [record for record in self.handler.records if record.levelno == logging.WARNING]
+        self.assertIn('"ten"', invalid[0].getMessage())
+        self.assertEquals(invalid[0].block_number, 2)
+        # One summary per block
+        summaries = [record for record in self.handler.records if hasattr(record, 'counts')]
+        self.assertListEqual([record.block_number for record in summaries], [1, 2])
+        self.assertDictEqual(summaries[0].counts, {'OutcomeTokenInstanceReceiver Issuance saved': 2})
+        self.assertDictEqual(summaries[1].counts, {'OutcomeTokenInstanceReceiver Issuance saved': 1,
+                                                   'OutcomeTokenInstanceReceiver Issuance invalid': 1})
+
+        self.handler.records = []
+        self.receiver.save(self.issuance(10), {'number': 3, 'timestamp': 1500000000})
+        self.assertEquals(self.handler.records[0].getMessage().count('Issuance'), 1)
+        self.assertEquals(self.handler.records[0].event_name, 'Issuance')
+
+    def test_block_summary_on_daemon_save(self):
+        block = {'number': 5, 'timestamp': 1500000000}
+        self.receiver.save(self.issuance(10), block)
+        self.receiver.save({'name': 'Approval', 'address': self.outcome_token.address, 'params': []}, block)
+        self.assertFalse(any(hasattr(record, 'counts') for record in self.handler.records))
+
+        # The listener saves the daemon once the block is processed
+        daemon = Daemon.get_solo()
+        daemon.block_number = 5
+        daemon.save()
+        summaries = [record for record in self.handler.records if hasattr(record, 'counts')]
+        self.assertEquals(len(summaries), 1)
+        self.assertEquals(summaries[0].block_number, 5)
+        self.assertDictEqual(summaries[0].counts, {'OutcomeTokenInstanceReceiver Issuance saved': 1,
+                                                   'OutcomeTokenInstanceReceiver Approval ignored': 1})
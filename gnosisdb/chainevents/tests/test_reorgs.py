@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import transaction
+from django.test import TestCase
+from chainevents.simulation import ChainGenerator, get_state, replay, simulate
+from relationaldb.models import Market, Order, OutcomeTokenBalance
+
+
+class Rollback(Exception):
+    pass
+
+
+class TestReorgs(TestCase):
+
+    def index(self, seed, n_blocks, n_reorgs):
+        """
+        Indexes a generated chain reorganized n_reorgs times, then the final chain from scratch
+        :return: (reorganized state, replayed state, reorganization stats)
+        """
+        try:
+            with transaction.atomic():
+                generator = ChainGenerator(seed=seed, events_per_block=4, n_accounts=5, max_depth=5)
+                generator.create_genesis()
+                stats = simulate(generator, n_blocks, n_reorgs, seed=seed)
+                blocks = list(generator.blocks)
+                reorganized_state = get_state()
+                # Sanity check, the chain trades
+                self.assertTrue(Market.objects.exists())
+                self.assertTrue(Order.objects.exists())
+                self.assertTrue(OutcomeTokenBalance.objects.exists())
+                raise Rollback()
+        except Rollback:
+            pass
+
+        try:
+            with transaction.atomic():
+                ChainGenerator(seed=seed).create_genesis()
+                replay(blocks)
+                replayed_state = get_state()
+                raise Rollback()
+        except Rollback:
+            pass
+        return reorganized_state, replayed_state, stats
+
+    def test_reorgs_equal_replay(self):
+        for seed in range(0, 3):
+            reorganized_state, replayed_state, stats = self.index(seed, n_blocks=25, n_reorgs=4)
+            self.assertEquals(sum(len(times) for times in stats['rollbacks'].values()), 4)
+            for table in replayed_state:
+                self.assertListEqual(reorganized_state[table], replayed_state[table],
+                                     'seed {}, table {}'.format(seed, table))
+
+    def test_generator(self):
+        generator = ChainGenerator(seed=1, max_depth=3)
+        blocks = [generator.next_block() for _ in range(0, 5)]
+        self.assertEquals(blocks[0][0][1]['name'], 'CentralizedOracleCreation')
+        self.assertTrue(all(block_info['number'] == number + 1
+                            for number, block in enumerate(blocks) for _, _, block_info in block))
+
+        # Deterministic
+        other = ChainGenerator(seed=1, max_depth=3)
+        self.assertListEqual([[event for _, event, _ in other.next_block()] for _ in range(0, 5)],
+                             [[event for _, event, _ in block] for block in blocks])
+
+        # Forks restore the chain state, the replacing blocks differ
+        self.assertListEqual(generator.fork(2), [blocks[4], blocks[3]])
+        self.assertEquals(len(generator.blocks), 3)
+        self.assertNotEqual([event for _, event, _ in generator.next_block()],
+                            [event for _, event, _ in blocks[3]])
+        self.assertRaises(ValueError, generator.fork, 4)
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.conf import settings
 from chainevents.event_receivers import (
     CentralizedOracleFactoryReceiver, EventFactoryReceiver, MarketFactoryReceiver,
@@ -10,7 +10,7 @@ from chainevents.event_receivers import (
 
 from relationaldb.models import (
     CentralizedOracle, ScalarEvent, CategoricalEvent, Market, OutcomeToken,
-    OutcomeTokenBalance, BuyOrder, SellOrder
+    OutcomeTokenBalance, BuyOrder, SellOrder, MarketPriceCandle, JournalEntry
 )
 
 from relationaldb.tests.factories import (
@@ -78,8 +78,11 @@ class TestRollabck(TestCase):
         with self.assertRaises(CentralizedOracle.DoesNotExist):
             CentralizedOracle.objects.get(address=oracle_address)
 
-        # Rollback over nonexistent centralized oracle should fail
-        self.assertRaises(Exception, CentralizedOracleFactoryReceiver().rollback, oracle_event, block)
+        # The block was reverted from the rollback journal, rolling back its other events does nothing
+        CentralizedOracleFactoryReceiver().rollback(oracle_event, block)
+        # Without the journal, rollback over nonexistent centralized oracle should fail
+        with self.settings(ROLLBACK_JOURNAL=False):
+            self.assertRaises(Exception, CentralizedOracleFactoryReceiver().rollback, oracle_event, block)
 
     def test_oracle_owner_replacement_rollback(self):
         # Create the oracle
@@ -189,8 +192,9 @@ class TestRollabck(TestCase):
         with self.assertRaises(ScalarEvent.DoesNotExist):
             ScalarEvent.objects.get(address=event_address)
 
-        # Rollback over an nonexistent event should fail
-        self.assertRaises(Exception, EventFactoryReceiver().rollback, scalar_event, block)
+        # Without the journal, rollback over an nonexistent event should fail
+        with self.settings(ROLLBACK_JOURNAL=False):
+            self.assertRaises(Exception, EventFactoryReceiver().rollback, scalar_event, block)
 
     def test_categorical_event_factory_rollback(self):
         event = CategoricalEventFactory()
@@ -236,8 +240,9 @@ class TestRollabck(TestCase):
         with self.assertRaises(CategoricalEvent.DoesNotExist):
             CategoricalEvent.objects.get(address=event_address)
 
-        # Rollback over an nonexistent event shoul fail
-        self.assertRaises(Exception, EventFactoryReceiver().rollback, categorical_event, block)
+        # Without the journal, rollback over an nonexistent event shoul fail
+        with self.settings(ROLLBACK_JOURNAL=False):
+            self.assertRaises(Exception, EventFactoryReceiver().rollback, categorical_event, block)
 
     def test_market_factory_rollback(self):
         oracle = CentralizedOracleFactory()
@@ -322,6 +327,8 @@ class TestRollabck(TestCase):
             market=market_without_rollback
         )
         self.assertEquals(len(orders_before_rollback), 1)
+        # one candle per resolution
+        self.assertEquals(MarketPriceCandle.objects.filter(market=market_without_rollback, orders=1).count(), 3)
 
         # Outcome token purchase rollback
         MarketInstanceReceiver().rollback(outcome_token_purchase_event, block)
@@ -332,8 +339,11 @@ class TestRollabck(TestCase):
             market=market_with_rollback
         )
         self.assertEquals(len(orders_after_rollback), 0)
+        self.assertEquals(MarketPriceCandle.objects.filter(market=market_with_rollback).count(), 0)
 
+    @override_settings(ROLLBACK_JOURNAL=False)
     def test_market_outcome_token_sale_rollback(self):
+        # Rolls back a single event of the block, as the serializers do for blocks indexed without the journal
         categorical_event = CategoricalEventFactory()
         outcome_token = OutcomeTokenFactory(event=categorical_event, index=0)
         market = MarketFactory(event=categorical_event)
@@ -362,6 +372,16 @@ class TestRollabck(TestCase):
         )
         self.assertEquals(len(orders_before_rollback), 1)
 
+        # A second sale in the same block shares the candles
+        second_sell_event = dict(outcome_token_sell_event, params=[
+            param if param['name'] != 'seller' else {'name': 'seller', 'value': '{:040d}'.format(101)}
+            for param in outcome_token_sell_event['params']
+        ])
+        MarketInstanceReceiver().save(second_sell_event, block)
+        candle = MarketPriceCandle.objects.get(market=market, resolution=60)
+        self.assertEquals(candle.orders, 2)
+        self.assertEquals(candle.volumes, [20, 0])
+
         # Outcome token sell rollback
         MarketInstanceReceiver().rollback(outcome_token_sell_event, block)
         orders_before_rollback = SellOrder.objects.filter(
@@ -369,6 +389,10 @@ class TestRollabck(TestCase):
             sender=seller_address
         )
         self.assertEquals(len(orders_before_rollback), 0)
+        # The candles are rebuilt from the remaining sale
+        candle = MarketPriceCandle.objects.get(market=market, resolution=60)
+        self.assertEquals(candle.orders, 1)
+        self.assertEquals(candle.volumes, [10, 0])
 
     def test_market_outcome_token_shortsale_rollback(self):
         pass
@@ -535,4 +559,73 @@ class TestRollabck(TestCase):
         event_after_rollback = CategoricalEvent.objects.get(address=event_factory.address)
         self.assertEquals(event_after_rollback.redeemed_winnings, event_factory.redeemed_winnings)
 
+    def test_journaled_block_rollback(self):
+        event = CategoricalEventFactory()
+        outcome_tokens = [OutcomeTokenFactory(event=event, index=index) for index in range(0, 2)]
+        market = MarketFactory(event=event, funding=10 ** 18)
+        buyer_address = '{:040d}'.format(100)
+        receiver_address = '{:040d}'.format(101)
+        OutcomeTokenInstanceReceiver().save({
+            'name': 'Issuance',
+            'address': outcome_tokens[1].address,
+            'params': [{'name': 'owner', 'value': buyer_address}, {'name': 'amount', 'value': 5}]
+        }, {'number': 1, 'timestamp': self.to_timestamp(datetime.now())})
+        market_before = Market.objects.get(address=market.address)
 
+        block = {
+            'number': 2,
+            'timestamp': self.to_timestamp(datetime.now())
+        }
+        # The same buyer trades twice in the block
+        events = []
+        for count in (10, 20):
+            events.append((MarketInstanceReceiver(), {
+                'name': 'OutcomeTokenPurchase',
+                'address': market.address,
+                'params': [
+                    {'name': 'outcomeTokenCost', 'value': count * 2},
+                    {'name': 'marketFees', 'value': 1},
+                    {'name': 'buyer', 'value': buyer_address},
+                    {'name': 'outcomeTokenIndex', 'value': 0},
+                    {'name': 'outcomeTokenCount', 'value': count},
+                ]
+            }))
+            events.append((OutcomeTokenInstanceReceiver(), {
+                'name': 'Issuance',
+                'address': outcome_tokens[0].address,
+                'params': [{'name': 'owner', 'value': buyer_address}, {'name': 'amount', 'value': count}]
+            }))
+        events.append((OutcomeTokenInstanceReceiver(), {
+            'name': 'Transfer',
+            'address': outcome_tokens[1].address,
+            'params': [
+                {'name': 'from', 'value': buyer_address},
+                {'name': 'to', 'value': receiver_address},
+                {'name': 'value', 'value': 5}
+            ]
+        }))
+        for receiver, decoded_event in events:
+            receiver.save(decoded_event, block)
+        self.assertEquals(BuyOrder.objects.filter(market=market, sender=buyer_address).count(), 2)
+        self.assertEquals(Market.objects.get(address=market.address).net_outcome_tokens_sold, [30, 0])
+
+        # Events are rolled back last first, the first call reverts the whole block
+        for receiver, decoded_event in reversed(events):
+            receiver.rollback(decoded_event, block)
+
+        market_after = Market.objects.get(address=market.address)
+        self.assertEquals(market_after.net_outcome_tokens_sold, market_before.net_outcome_tokens_sold)
+        self.assertEquals(market_after.marginal_prices, market_before.marginal_prices)
+        self.assertEquals(market_after.collected_fees, market_before.collected_fees)
+        self.assertEquals(market_after.trading_volume, market_before.trading_volume)
+        self.assertEquals(BuyOrder.objects.filter(market=market).count(), 0)
+        self.assertEquals(MarketPriceCandle.objects.filter(market=market).count(), 0)
+        self.assertEquals(OutcomeToken.objects.get(address=outcome_tokens[0].address).total_supply,
+                          outcome_tokens[0].total_supply)
+        self.assertFalse(OutcomeTokenBalance.objects.filter(outcome_token=outcome_tokens[0]).exists())
+        self.assertEquals(OutcomeTokenBalance.objects.get(owner=buyer_address,
+                                                          outcome_token=outcome_tokens[1]).balance, 5)
+        self.assertFalse(OutcomeTokenBalance.objects.filter(owner=receiver_address).exists())
+
+        # The previous block is still journaled
+        self.assertEquals(JournalEntry.objects.filter(block_number=1, undone=False).count(), 2)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from collections import OrderedDict
+from threading import Lock
+import json
+import os
+import re
+import time
+
+
+class LRUCache(object):
+    """
+    Thread safe, size bounded, least recently used cache
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return default
+            self._items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DiskCache(object):
+    """
+    Stores JSON objects on disk, one file per IPFS hash. IPFS objects are immutable so entries never expire.
+    """
+    hash_regex = re.compile(r'^[A-Za-z0-9]{1,128}$')
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def get_path(self, ipfs_hash):
+        # Hashes come from the blockchain, never let them escape the cache directory
+        if not self.hash_regex.match(ipfs_hash):
+            return None
+        return os.path.join(self.path, '{}.json'.format(ipfs_hash))
+
+    def get(self, ipfs_hash):
+        path = self.get_path(ipfs_hash)
+        if not path:
+            return None
+        try:
+            with open(path, 'r') as fd:
+                return json.load(fd)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, ipfs_hash, json_obj):
+        path = self.get_path(ipfs_hash)
+        if not path:
+            return
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as fd:
+            json.dump(json_obj, fd)
+        # atomic on POSIX, readers never see half written files
+        os.rename(tmp_path, path)
+
+    def keys(self):
+        return [filename[:-len('.json')] for filename in os.listdir(self.path) if filename.endswith('.json')]
+
+
+class NegativeCache(object):
+    """
+    Remembers the errors of IPFS hashes that failed to resolve during timeout seconds
+    """
+    def __init__(self, max_size, timeout):
+        self.timeout = timeout
+        self._errors = LRUCache(max_size)
+
+    def get(self, ipfs_hash):
+        entry = self._errors.get(ipfs_hash)
+        if entry is None:
+            return None
+        error, expires_at = entry
+        if expires_at < time.time():
+            self._errors.delete(ipfs_hash)
+            return None
+        return error
+
+    def set(self, ipfs_hash, error):
+        self._errors.set(ipfs_hash, (error, time.time() + self.timeout))
+
+    def clear(self):
+        self._errors.clear()
@@ -2,13 +2,71 @@
 from __future__ import unicode_literals
 from django.conf import settings
 from utils import singleton
+from .cache import LRUCache, DiskCache, NegativeCache
+from ipfsapi.exceptions import ErrorResponse, ConnectionError as IpfsConnectionError, TimeoutError as IpfsTimeoutError
+from celery.utils.log import get_task_logger
+from copy import deepcopy
+from gnosisdb.metrics import add_ipfs_time
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer
 import ipfsapi
+import time
+
+logger = get_task_logger(__name__)
+
 
 @singleton
 class Ipfs(object):
+    """
+    IPFS client. Objects are cached in a memory LRU and, if IPFS_CACHE_DIR is set, on disk.
+    Hashes that fail to resolve are remembered for IPFS_NEGATIVE_CACHE_TIMEOUT seconds.
+    """
 
     def __init__(self):
         self.api = ipfsapi.connect(settings.IPFS_HOST, settings.IPFS_PORT)
+        self.retries = getattr(settings, 'IPFS_RETRIES', 3)
+        self.prefetch_workers = getattr(settings, 'IPFS_PREFETCH_WORKERS', 8)
+        self.memory_cache = LRUCache(getattr(settings, 'IPFS_CACHE_SIZE', 1000))
+        self.negative_cache = NegativeCache(getattr(settings, 'IPFS_CACHE_SIZE', 1000),
+                                            getattr(settings, 'IPFS_NEGATIVE_CACHE_TIMEOUT', 300))
+        cache_dir = getattr(settings, 'IPFS_CACHE_DIR', None)
+        self.disk_cache = DiskCache(cache_dir) if cache_dir else None
+
+    def get_cached(self, ipfs_hash):
+        """Returns the cached json object of ipfs_hash, None if not cached
+        :param ipfs_hash:
+        :return: json object
+        :raise ErrorResponse if ipfs_hash is known not to resolve
+        """
+        json_obj = self.memory_cache.get(ipfs_hash)
+        if json_obj is None and self.disk_cache:
+            json_obj = self.disk_cache.get(ipfs_hash)
+            if json_obj is not None:
+                self.memory_cache.set(ipfs_hash, json_obj)
+
+        if json_obj is not None:
+            # Callers are free to modify the returned object
+            return deepcopy(json_obj)
+
+        error = self.negative_cache.get(ipfs_hash)
+        if error is not None:
+            raise error
+        return None
+
+    def fetch(self, ipfs_hash):
+        """Gets ipfs_hash's json object from the IPFS daemon, retrying on connection errors
+        :param ipfs_hash:
+        :return: json object
+        :raise ErrorResponse
+        """
+        for retry in range(0, self.retries + 1):
+            try:
+                return self.api.get_json(ipfs_hash)
+            except (IpfsConnectionError, IpfsTimeoutError) as e:
+                if retry == self.retries:
+                    raise
+                logger.warning('IPFS error getting {}, retrying: {}'.format(ipfs_hash, e))
+                time.sleep(0.5 * 2 ** retry)
 
     def get(self, ipfs_hash):
         """Returns ipfs_hash's json related object
@@ -16,7 +74,48 @@ class Ipfs(object):
         :return: json object
         :raise AttributeError
         """
-        return self.api.get_json(ipfs_hash)
+        json_obj = self.get_cached(ipfs_hash)
+        if json_obj is not None:
+            return json_obj
+
+        start = default_timer()
+        try:
+            json_obj = self.fetch(ipfs_hash)
+        except ErrorResponse as e:
+            self.negative_cache.set(ipfs_hash, e)
+            raise
+        finally:
+            add_ipfs_time(default_timer() - start)
+
+        self.memory_cache.set(ipfs_hash, json_obj)
+        if self.disk_cache:
+            self.disk_cache.set(ipfs_hash, json_obj)
+        return deepcopy(json_obj)
+
+    def prefetch_one(self, ipfs_hash):
+        try:
+            self.get(ipfs_hash)
+            return True
+        except Exception as e:
+            logger.warning('IPFS prefetch of {} failed: {}'.format(ipfs_hash, e))
+            return False
+
+    def prefetch(self, ipfs_hashes, workers=None):
+        """Loads the given hashes into the cache concurrently, e.g. every hash seen in a block range
+        :param ipfs_hashes: iterable of ipfs hashes
+        :param workers: max number of concurrent requests, IPFS_PREFETCH_WORKERS by default
+        :return: number of hashes that could be resolved
+        """
+        ipfs_hashes = list(set(ipfs_hashes))
+        if not ipfs_hashes:
+            return 0
+
+        pool = ThreadPool(min(workers or self.prefetch_workers, len(ipfs_hashes)))
+        try:
+            return sum(pool.map(self.prefetch_one, ipfs_hashes))
+        finally:
+            pool.close()
+            pool.join()
 
     def post(self, python_object):
         """Creates an ipfs object
@@ -29,4 +128,3 @@ class Ipfs(object):
             ipfs_hash = self.api.add_json(python_object)
 
         return ipfs_hash
-
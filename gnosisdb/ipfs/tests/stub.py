@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlparse, parse_qs
+from threading import Thread
+import json
+import time
+
+
+class StubIpfsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves the subset of the IPFS HTTP API used by ipfsapi's version() and get_json()
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/version'):
+            self.send_json(200, {'Version': '0.4.10', 'Commit': '', 'Repo': '5', 'System': 'stub', 'Golang': ''})
+            return
+
+        if url.path.endswith('/cat'):
+            ipfs_hash = parse_qs(url.query).get('arg', [None])[0]
+            self.server.requests.append(ipfs_hash)
+            time.sleep(self.server.latency)
+            if ipfs_hash in self.server.objects:
+                self.send_json(200, self.server.objects[ipfs_hash])
+            else:
+                self.send_json(500, {'Message': 'invalid ipfs ref path', 'Code': 0, 'Type': 'error'})
+            return
+
+        self.send_json(404, {'Message': 'not found', 'Code': 0, 'Type': 'error'})
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+
+class StubIpfsServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Local IPFS daemon stand-in, answers every cat request after latency seconds.
+    Usage:
+        server = StubIpfsServer({'QmHash': {...}}, latency=0.1).start()
+        ipfsapi.connect('http://127.0.0.1', server.port)
+        server.stop()
+    """
+    daemon_threads = True
+
+    def __init__(self, objects, latency=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StubIpfsHandler)
+        self.objects = objects
+        self.latency = latency
+        self.requests = []
+        self.port = self.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
@@ -2,7 +2,13 @@
 from __future__ import unicode_literals
 from django.test import TestCase
 from ipfs.ipfs import Ipfs
+from ipfs.cache import LRUCache, DiskCache, NegativeCache
+from ipfs.tests.stub import StubIpfsServer
 from ipfsapi.exceptions import ErrorResponse
+from timeit import default_timer
+import ipfsapi
+import shutil
+import tempfile
 
 
 class TestIpfs(TestCase):
@@ -18,3 +24,96 @@ class TestIpfs(TestCase):
 
         with self.assertRaises(ErrorResponse):
             ipfs.get("invalidhash")
+
+    def test_ipfs_cache(self):
+        json_data = {"name": "denis"}
+        ipfs = Ipfs()
+        ipfs_hash = ipfs.post(json_data)
+        self.assertIsNone(ipfs.get_cached(ipfs_hash))
+        self.assertEqual(ipfs.prefetch([ipfs_hash, ipfs_hash]), 1)
+
+        cached = ipfs.get_cached(ipfs_hash)
+        self.assertEqual(cached.get("name"), "denis")
+        # Modifying the returned object doesn't modify the cache
+        cached["name"] = "stefan"
+        self.assertEqual(ipfs.get(ipfs_hash).get("name"), "denis")
+
+        # Unresolvable hashes are cached too
+        with self.assertRaises(ErrorResponse):
+            ipfs.get("invalidhash")
+        self.assertIsNotNone(ipfs.negative_cache.get("invalidhash"))
+        with self.assertRaises(ErrorResponse):
+            ipfs.get_cached("invalidhash")
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        # b is the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_disk_cache(self):
+        path = tempfile.mkdtemp()
+        try:
+            cache = DiskCache(path)
+            self.assertIsNone(cache.get('QmHash'))
+            cache.set('QmHash', {'title': 'title'})
+            self.assertEqual(DiskCache(path).get('QmHash'), {'title': 'title'})
+            self.assertListEqual(cache.keys(), ['QmHash'])
+            # Invalid hashes are never stored
+            cache.set('../QmHash', {'title': 'title'})
+            self.assertIsNone(cache.get('../QmHash'))
+        finally:
+            shutil.rmtree(path)
+
+    def test_negative_cache(self):
+        cache = NegativeCache(10, 300)
+        error = ValueError('invalid')
+        cache.set('QmHash', error)
+        self.assertIs(cache.get('QmHash'), error)
+
+        expired_cache = NegativeCache(10, -1)
+        expired_cache.set('QmHash', error)
+        self.assertIsNone(expired_cache.get('QmHash'))
+
+
+class TestIpfsPrefetch(TestCase):
+    latency = 0.2
+    n_hashes = 8
+
+    def setUp(self):
+        self.objects = dict(
+            ('QmHash{}'.format(index), {'title': 'title {}'.format(index)}) for index in range(0, self.n_hashes)
+        )
+        self.server = StubIpfsServer(self.objects, latency=self.latency).start()
+        self.ipfs = Ipfs()
+        self.api = self.ipfs.api
+        self.ipfs.api = ipfsapi.connect('http://127.0.0.1', self.server.port)
+        self.ipfs.memory_cache.clear()
+        self.ipfs.negative_cache.clear()
+
+    def tearDown(self):
+        self.ipfs.api = self.api
+        self.ipfs.memory_cache.clear()
+        self.ipfs.negative_cache.clear()
+        self.server.stop()
+
+    def test_prefetch_concurrency(self):
+        start = default_timer()
+        resolved = self.ipfs.prefetch(list(self.objects.keys()) + ['QmUnknown'], workers=self.n_hashes + 1)
+        elapsed = default_timer() - start
+        self.assertEqual(resolved, self.n_hashes)
+        # Sequential fetching would take (n_hashes + 1) * latency
+        self.assertLess(elapsed, self.n_hashes * self.latency / 2)
+
+        # Served from the cache afterwards
+        n_requests = len(self.server.requests)
+        self.assertEqual(self.ipfs.get('QmHash0'), {'title': 'title 0'})
+        with self.assertRaises(ErrorResponse):
+            self.ipfs.get('QmUnknown')
+        self.assertEqual(len(self.server.requests), n_requests)
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django_eth_events.models import Daemon
+from chainevents.backfill import BlockBackfiller
+from chainevents.bulk import BulkEventProcessor
+from relationaldb.bulk import deferred_indexes
+from relationaldb.models import Order, OutcomeTokenBalance
+from timeit import default_timer
+
+
+class Command(BaseCommand):
+    help = 'Indexes the blocks after the event listener one up to --to-block with the bulk event processor, the ' \
+           'listener resumes from there. Holds the listener lock meanwhile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to-block', type=int, required=True, help='Last block to index')
+        parser.add_argument('--batch', type=int, default=100, help='Blocks committed per transaction')
+        parser.add_argument('--workers', type=int, default=None, help='Processes applying the trades, see BULK_WORKERS')
+        parser.add_argument('--insert', action='store_true', default=False,
+                            help='Write journaled INSERTs instead of COPY, the blocks can be rolled back then')
+        parser.add_argument('--defer-indexes', action='store_true', default=False,
+                            help='Drop the non unique order and balance indexes until the end of the backfill, the '
+                                 'API must not be serving meanwhile')
+
+    def handle(self, *args, **options):
+        backfill = not options['insert']
+        processor = BulkEventProcessor(backfill=backfill, workers=options['workers'])
+        backfiller = BlockBackfiller(processor)
+        to_block = options['to_block']
+        if backfill:
+            # COPY skips the rollback journal, the backfilled blocks must be too old to be reorganized
+            last_block = backfiller.web3.eth.blockNumber - getattr(settings, 'ROLLBACK_JOURNAL_DEPTH', 100)
+            if to_block > last_block:
+                raise CommandError('Blocks after {} may still be reorganized, backfill them with --insert'.format(
+                    last_block))
+
+        if not Daemon.objects.filter(listener_lock=False).update(listener_lock=True):
+            raise CommandError('The event listener is running')
+        try:
+            if options['defer_indexes']:
+                with deferred_indexes(Order, OutcomeTokenBalance):
+                    self.backfill(processor, backfiller, to_block, options)
+            else:
+                self.backfill(processor, backfiller, to_block, options)
+        finally:
+            Daemon.objects.update(listener_lock=False)
+
+    def backfill(self, processor, backfiller, to_block, options):
+        # Workers are started outside of the transactions
+        processor.start()
+        try:
+            block_number = Daemon.get_solo().block_number + 1
+            start = default_timer()
+            n_events = 0
+            while block_number <= to_block:
+                last_batch_block = min(block_number + options['batch'] - 1, to_block)
+                # IPFS is requested before the transaction starts
+                backfiller.fetch(range(block_number, last_batch_block + 1))
+                with transaction.atomic():
+                    for batch_block_number in range(block_number, last_batch_block + 1):
+                        n_events += backfiller.save_block(batch_block_number)
+                    Daemon.objects.update(block_number=last_batch_block)
+                self.stdout.write('Block {}: {} events, {:.1f} events/s'.format(
+                    last_batch_block, n_events, n_events / (default_timer() - start)))
+                block_number = last_batch_block + 1
+        finally:
+            processor.close()
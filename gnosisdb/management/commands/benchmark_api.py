@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from relationaldb.models import Event, EventSummary, Market
+from restapi.renderers import JSONRenderer
+from restapi.serializers import MarketSerializer
+from timeit import default_timer
+
+
+class Command(BaseCommand):
+    help = 'Times the serialization and rendering of a market list page, built in memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--markets', type=int, default=200, help='Number of markets in the page')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs')
+
+    def time_it(self, func, repeat):
+        best = None
+        for _ in range(0, repeat):
+            start = default_timer()
+            func()
+            elapsed = default_timer() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def get_markets(self, n_markets):
+        now = timezone.now()
+        markets = []
+        for index in range(0, n_markets):
+            contract = {
+                'factory': '{:040d}'.format(1),
+                'creator': '{:040d}'.format(2),
+                'creation_date_time': now,
+                'creation_block': index
+            }
+            event = Event(address='{:040x}'.format(2 * index), oracle_id='{:040x}'.format(2 * index + 1),
+                          collateral_token='{:040d}'.format(3), **contract)
+            # Sets event.summary, as views select it
+            EventSummary(event=event, event_type='CATEGORICAL', oracle_factory=contract['factory'],
+                         oracle_creator=contract['creator'], oracle_creation_date_time=now,
+                         oracle_creation_block=index, oracle_owner=contract['creator'],
+                         title='Market {}'.format(index), description='Benchmark market', resolution_date=now,
+                         ipfs_hash='Qm{:044d}'.format(index), outcomes=['Yes', 'No'])
+            markets.append(Market(address='{:040x}'.format(10 ** 6 + index), event=event,
+                                  market_maker='{:040d}'.format(4), fee=0, funding=10 ** 18,
+                                  net_outcome_tokens_sold=[10 ** 18, 0], revenue=0, collected_fees=0,
+                                  marginal_prices=['0.7311', '0.2689'], trading_volume=10 ** 18, **contract))
+        return markets
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        markets = self.get_markets(options['markets'])
+        page = {'count': len(markets), 'next': None, 'previous': None}
+
+        def serialize():
+            page['results'] = MarketSerializer(markets, many=True).data
+
+        serialize_time = self.time_it(serialize, repeat)
+        render_time = self.time_it(lambda: JSONRenderer().render(page), repeat)
+        # The camelCase pass every response went through before serializers emitted camelCase keys
+        camel_case_time = self.time_it(lambda: CamelCaseJSONRenderer().render(page), repeat)
+
+        self.stdout.write('{:>8} {:>14} {:>14} {:>20}'.format(
+            'markets', 'serialize (s)', 'render (s)', 'camelCase render (s)'
+        ))
+        self.stdout.write('{:>8} {:>14.6f} {:>14.6f} {:>20.6f}'.format(
+            len(markets), serialize_time, render_time, camel_case_time
+        ))
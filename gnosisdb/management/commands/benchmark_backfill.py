@@ -0,0 +1,135 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from chainevents.bulk import BulkEventProcessor
+from chainevents.event_receivers import MarketInstanceReceiver, EventInstanceReceiver, OutcomeTokenInstanceReceiver
+from relationaldb.bulk import deferred_indexes
+from relationaldb.models import CentralizedOracle, CategoricalEvent, Market, Order, OutcomeTokenBalance
+from timeit import default_timer
+import random
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Backfills a synthetic chain of trades with INSERT and with COPY, everything is rolled back. Both modes ' \
+           'write the rollback journal with --journal, neither does otherwise'
+    n_outcomes = 2
+    n_traders = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=1000000, help='Number of trades of the synthetic chain')
+        parser.add_argument('--trades-per-block', type=int, default=100)
+        parser.add_argument('--batch', type=int, default=100, help='Blocks saved per BulkEventProcessor call')
+        parser.add_argument('--mode', choices=('insert', 'copy', 'both'), default='both')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes applying the trades, partitioned by market, see BULK_WORKERS')
+        parser.add_argument('--markets', type=int, default=1, help='Markets the trades are spread over')
+        parser.add_argument('--journal', action='store_true', default=False,
+                            help='Write the rollback journal in both modes, it needs ROLLBACK_JOURNAL')
+        parser.add_argument('--defer-indexes', action='store_true', default=False,
+                            help='Drop the non unique order and balance indexes during the COPY backfill')
+
+    def create_market(self, market_index):
+        now = timezone.now()
+        contract = {'factory': '{:040d}'.format(1), 'creator': '{:040d}'.format(2), 'creation_date_time': now,
+                    'creation_block': 0}
+        oracle = CentralizedOracle.objects.create(address='{:040d}'.format(100000 + market_index),
+                                                  owner=contract['creator'], **contract)
+        event = CategoricalEvent.objects.create(address='{:040d}'.format(200000 + market_index), oracle=oracle,
+                                                collateral_token='{:040d}'.format(5), **contract)
+        return Market.objects.create(address='{:040d}'.format(300000 + market_index), event=event,
+                                     market_maker='{:040d}'.format(7), fee=0, funding=10 ** 22,
+                                     net_outcome_tokens_sold=[0] * self.n_outcomes, revenue=0, collected_fees=0,
+                                     marginal_prices=['0.5000'] * self.n_outcomes, trading_volume=0, **contract)
+
+    def get_token_address(self, market_index, index):
+        return '{:040d}'.format(1000 + market_index * self.n_outcomes + index)
+
+    def get_block_events(self, markets, block_number, n_trades):
+        """
+        Returns the decoded events of a block, every purchase issues the bought outcome tokens to the buyer
+        """
+        block = {'number': block_number, 'timestamp': 1500000000 + block_number * 15}
+        events = []
+        if block_number == 1:
+            for market_index, market in enumerate(markets):
+                for index in range(0, self.n_outcomes):
+                    events.append((EventInstanceReceiver(), {
+                        'name': 'OutcomeTokenCreation',
+                        'address': market.event_id,
+                        'params': [
+                            {'name': 'outcomeToken', 'value': self.get_token_address(market_index, index)},
+                            {'name': 'index', 'value': index}
+                        ]
+                    }, block))
+
+        for _ in range(0, n_trades):
+            market_index = random.randint(0, len(markets) - 1)
+            market = markets[market_index]
+            buyer = '{:040d}'.format(10000 + random.randint(0, self.n_traders - 1))
+            index = random.randint(0, self.n_outcomes - 1)
+            count = random.randint(1, 10) * 10 ** 15
+            events.append((MarketInstanceReceiver(), {
+                'name': 'OutcomeTokenPurchase',
+                'address': market.address,
+                'params': [
+                    {'name': 'buyer', 'value': buyer},
+                    {'name': 'outcomeTokenIndex', 'value': index},
+                    {'name': 'outcomeTokenCount', 'value': count},
+                    {'name': 'outcomeTokenCost', 'value': count // 2},
+                    {'name': 'marketFees', 'value': 0}
+                ]
+            }, block))
+            events.append((OutcomeTokenInstanceReceiver(), {
+                'name': 'Issuance',
+                'address': self.get_token_address(market_index, index),
+                'params': [
+                    {'name': 'owner', 'value': buyer},
+                    {'name': 'amount', 'value': count}
+                ]
+            }, block))
+        return events
+
+    def save_blocks(self, processor, markets, n_blocks, options):
+        for first_block in range(1, n_blocks + 1, options['batch']):
+            events = []
+            for block_number in range(first_block, min(first_block + options['batch'], n_blocks + 1)):
+                events.extend(self.get_block_events(markets, block_number, options['trades_per_block']))
+            processor.save(events)
+
+    def backfill(self, backfill, defer_indexes, options):
+        """
+        :return: (number of trades, seconds), including the index rebuild if defer_indexes is set
+        """
+        random.seed(0)
+        n_blocks = max(options['trades'] // options['trades_per_block'], 1)
+        processor = BulkEventProcessor(backfill=backfill, workers=options['workers'], journaled=options['journal'])
+        # Workers are started outside of the transaction
+        processor.start()
+        try:
+            with transaction.atomic():
+                markets = [self.create_market(market_index) for market_index in range(0, options['markets'])]
+                start = default_timer()
+                if defer_indexes:
+                    with deferred_indexes(Order, OutcomeTokenBalance):
+                        self.save_blocks(processor, markets, n_blocks, options)
+                else:
+                    self.save_blocks(processor, markets, n_blocks, options)
+                elapsed = default_timer() - start
+                raise Rollback()
+        except Rollback:
+            pass
+        finally:
+            processor.close()
+        return n_blocks * options['trades_per_block'], elapsed
+
+    def handle(self, *args, **options):
+        modes = ('insert', 'copy') if options['mode'] == 'both' else (options['mode'],)
+        self.stdout.write('{:>8} {:>10} {:>12} {:>12}'.format('mode', 'trades', 'time (s)', 'trades/s'))
+        for mode in modes:
+            backfill = mode == 'copy'
+            trades, elapsed = self.backfill(backfill, backfill and options['defer_indexes'], options)
+            self.stdout.write('{:>8} {:>10} {:>12.2f} {:>12.0f}'.format(mode, trades, elapsed, trades / elapsed))
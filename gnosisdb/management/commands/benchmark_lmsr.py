@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from gnosisdb.utils import calc_lmsr_marginal_price, calc_lmsr_marginal_prices
+from timeit import default_timer
+import random
+
+
+class Command(BaseCommand):
+    help = 'Compares the per-index LMSR marginal price calculation against the batch one'
+    outcome_counts = (2, 4, 8, 16, 32, 64, 128, 256)
+    funding = 10 ** 18
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per outcome count')
+        parser.add_argument('--precision', type=int, default=100, help='mpmath decimal places for the exact path')
+
+    def time_it(self, func, repeat):
+        best = None
+        for _ in range(0, repeat):
+            start = default_timer()
+            func()
+            elapsed = default_timer() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        precision = options['precision']
+        random.seed(0)
+
+        self.stdout.write('{:>8} {:>14} {:>14} {:>14} {:>10}'.format(
+            'outcomes', 'per-index (s)', 'exact (s)', 'float (s)', 'speedup'
+        ))
+        for n_outcomes in self.outcome_counts:
+            net_outcome_tokens_sold = [random.randint(-10 ** 18, 10 ** 19) for _ in range(0, n_outcomes)]
+
+            per_index = self.time_it(
+                lambda: [
+                    calc_lmsr_marginal_price(index, net_outcome_tokens_sold, self.funding)
+                    for index in range(0, n_outcomes)
+                ],
+                repeat
+            )
+            exact = self.time_it(
+                lambda: calc_lmsr_marginal_prices(net_outcome_tokens_sold, self.funding, exact=True,
+                                                  precision=precision),
+                repeat
+            )
+            fast = self.time_it(
+                lambda: calc_lmsr_marginal_prices(net_outcome_tokens_sold, self.funding),
+                repeat
+            )
+
+            self.stdout.write('{:>8} {:>14.6f} {:>14.6f} {:>14.6f} {:>9.1f}x'.format(
+                n_outcomes, per_index, exact, fast, per_index / fast
+            ))
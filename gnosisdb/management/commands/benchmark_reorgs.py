@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from chainevents.simulation import ChainGenerator, get_state, replay, simulate
+import json
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Indexes a synthetic chain with reorganizations through the event receivers, everything is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blocks', type=int, default=1000, help='Length of the final chain')
+        parser.add_argument('--events-per-block', type=int, default=10, help='Mean actions per block')
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--reorgs', type=int, default=50)
+        parser.add_argument('--max-depth', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--check', action='store_true', default=False,
+                            help='Compare the final state with a replay of the final chain from scratch')
+        parser.add_argument('--output', help='Also write the results as JSON, to track them across releases')
+
+    def run(self, callback):
+        """
+        Runs callback in a transaction that is rolled back
+        """
+        try:
+            with transaction.atomic():
+                result = callback()
+                raise Rollback()
+        except Rollback:
+            pass
+        return result
+
+    def handle(self, *args, **options):
+        generator = ChainGenerator(seed=options['seed'], events_per_block=options['events_per_block'],
+                                   n_accounts=options['accounts'], max_depth=options['max_depth'])
+
+        def index():
+            generator.create_genesis()
+            stats = simulate(generator, options['blocks'], options['reorgs'], seed=options['seed'])
+            return stats, get_state() if options['check'] else None
+
+        stats, state = self.run(index)
+        self.stdout.write('{:>8} {:>10} {:>12} {:>12} {:>12}'.format('blocks', 'events', 'time (s)', 'blocks/s',
+                                                                     'events/s'))
+        self.stdout.write('{:>8} {:>10} {:>12.2f} {:>12.1f} {:>12.1f}'.format(
+            stats['blocks'], stats['events'], stats['seconds'], stats['blocks'] / stats['seconds'],
+            stats['events'] / stats['seconds']))
+
+        results = {
+            'options': dict((key, options[key]) for key in ('blocks', 'events_per_block', 'accounts', 'reorgs',
+                                                            'max_depth', 'seed')),
+            'blocks': stats['blocks'],
+            'events': stats['events'],
+            'seconds': stats['seconds'],
+            'blocks_per_second': stats['blocks'] / stats['seconds'],
+            'events_per_second': stats['events'] / stats['seconds'],
+            'rollbacks': {},
+        }
+        self.stdout.write('')
+        self.stdout.write('{:>8} {:>8} {:>12} {:>12}'.format('depth', 'reorgs', 'mean (ms)', 'max (ms)'))
+        for depth, times in sorted(stats['rollbacks'].items()):
+            results['rollbacks'][depth] = {'reorgs': len(times), 'mean': sum(times) / len(times), 'max': max(times)}
+            self.stdout.write('{:>8} {:>8} {:>12.1f} {:>12.1f}'.format(
+                depth, len(times), 1000 * sum(times) / len(times), 1000 * max(times)))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options['check']:
+            def replay_final_chain():
+                generator.create_genesis()
+                replay(generator.blocks)
+                return get_state()
+
+            replayed_state = self.run(replay_final_chain)
+            different = sorted(table for table in replayed_state if replayed_state[table] != state[table])
+            if different:
+                raise CommandError('The reorganized state differs from the replayed one in {}'.format(
+                    ', '.join(different)))
+            self.stdout.write('The reorganized state equals the replayed one')
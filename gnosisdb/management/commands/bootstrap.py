@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from restapi.cache import ResponseCache
+from snapshots.restore import restore_snapshot, SnapshotError
+from snapshots.sinks import get_sink, DirectorySink
+from .setup import create_event_listener_task
+
+
+class Command(BaseCommand):
+    help = 'Replaces the database content with a snapshot and resumes indexing from the snapshot block'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', default=None, help='Snapshot name, the last one by default')
+        parser.add_argument('--path', default=None, help='Local directory, overrides the configured sink')
+
+    def handle(self, *args, **options):
+        sink = DirectorySink(options['path']) if options['path'] else get_sink()
+        try:
+            manifest = restore_snapshot(sink, options['snapshot'])
+        except SnapshotError as e:
+            raise CommandError(str(e))
+        ResponseCache().clear()
+        self.stdout.write(self.style.SUCCESS('Snapshot {} restored, indexing resumes after block {}'.format(
+            manifest['name'], manifest['block_number']
+        )))
+
+        if create_event_listener_task():
+            self.stdout.write(self.style.SUCCESS('Created Periodic Task for Event Listener every 5s.'))
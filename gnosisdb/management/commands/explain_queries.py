@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from relationaldb.bulk import copy_create
+from relationaldb.models import (
+    CentralizedOracle, CategoricalEvent, Market, Order, BuyOrder, OutcomeToken, OutcomeTokenBalance
+)
+from relationaldb.plans import explain, get_plan_nodes, get_scans
+from restapi.filters import MarketTradesFilter
+from restapi.views import AccountSharesView, AccountTradesView, MarketParticipantTradesView, MarketTradesView
+import json
+import random
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Checks the PostgreSQL plans of the trade and share lookups of the API, on seeded or existing data'
+    page_size = 100
+
+    def add_arguments(self, parser):
+        parser.add_argument('--markets', type=int, default=20)
+        parser.add_argument('--orders', type=int, default=200000, help='Number of seeded orders')
+        parser.add_argument('--accounts', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=180, help='Orders are spread over the last days')
+        parser.add_argument('--no-seed', action='store_false', dest='seed', default=True,
+                            help='Explain the queries on the existing data')
+        parser.add_argument('--keep', action='store_true', default=False, help='Commit the seeded data')
+        parser.add_argument('--show-plans', action='store_true', default=False)
+
+    def get_account(self, index):
+        return '{:040x}'.format(10 ** 8 + index)
+
+    def seed(self, options):
+        random.seed(0)
+        now = datetime.now()
+        contract = {'factory': '{:040d}'.format(1), 'creator': '{:040d}'.format(2), 'creation_date_time': now,
+                    'creation_block': 0}
+        markets = []
+        outcome_tokens = []
+        for index in range(0, options['markets']):
+            oracle = CentralizedOracle.objects.create(address='{:040x}'.format(10 ** 6 + index),
+                                                      owner=contract['creator'], **contract)
+            event = CategoricalEvent.objects.create(address='{:040x}'.format(2 * 10 ** 6 + index), oracle=oracle,
+                                                    collateral_token='{:040d}'.format(3), **contract)
+            markets.append(Market.objects.create(address='{:040x}'.format(3 * 10 ** 6 + index), event=event,
+                                                 market_maker='{:040d}'.format(4), fee=0, funding=10 ** 18,
+                                                 net_outcome_tokens_sold=[0, 0], revenue=0, collected_fees=0,
+                                                 marginal_prices=['0.5000', '0.5000'], trading_volume=0, **contract))
+            outcome_tokens.append([
+                OutcomeToken.objects.create(address='{:040x}'.format(4 * 10 ** 6 + 2 * index + outcome),
+                                            event=event, index=outcome)
+                for outcome in range(0, 2)
+            ])
+
+        # Orders are appended in block order, as the event listener does
+        n_orders = options['orders']
+        seconds = options['days'] * 86400
+        orders = []
+        for index in range(0, n_orders):
+            market_index = random.randint(0, len(markets) - 1)
+            outcome = random.randint(0, 1)
+            orders.append(BuyOrder(
+                market=markets[market_index], outcome_token=outcome_tokens[market_index][outcome],
+                sender=self.get_account(random.randint(0, options['accounts'] - 1)),
+                creation_date_time=now - timedelta(seconds=seconds * (n_orders - index) // n_orders),
+                creation_block=index // 10 + 1, outcome_token_count=10 ** 18, net_outcome_tokens_sold=[0, 0],
+                marginal_prices=['0.5000', '0.5000'], order_type=BuyOrder.ORDER_TYPE, cost=10 ** 18,
+                outcome_token_cost=10 ** 18, fees=0
+            ))
+        copy_create(BuyOrder, orders)
+
+        copy_create(OutcomeTokenBalance, [
+            OutcomeTokenBalance(owner=owner, outcome_token_id=outcome_token_id, balance=10 ** 18)
+            for owner, outcome_token_id in set((order.sender, order.outcome_token_id) for order in orders)
+        ])
+        with connection.cursor() as cursor:
+            for model in (Order, BuyOrder, OutcomeTokenBalance, Market, OutcomeToken):
+                cursor.execute('ANALYZE {}'.format(connection.ops.quote_name(model._meta.db_table)))
+
+    def get_trades_page(self, view_class, **kwargs):
+        """
+        The first page of a trades view, with the default date range of its filter and in cursor order
+        """
+        view = view_class(kwargs=kwargs)
+        queryset = view.get_queryset()
+        if getattr(view, 'filter_class', None):
+            queryset = MarketTradesFilter(data={}, queryset=queryset).qs
+        return queryset.order_by(*view.cursor_ordering)[:self.page_size]
+
+    def get_cases(self):
+        """
+        Returns the checked queries: (name, queryset, table, accepted index names, whether sorting is a regression)
+        """
+        order = Order.objects.order_by('-creation_block', '-id').first()
+        if order is None:
+            raise CommandError('There are no orders to explain queries on')
+        table = Order._meta.db_table
+        return [
+            ('market trades', self.get_trades_page(MarketTradesView, market_address=order.market_id),
+             table, ('order_market_date_idx',), True),
+            ('account trades', self.get_trades_page(AccountTradesView, account_address=order.sender),
+             table, ('order_sender_date_idx',), True),
+            ('market participant trades',
+             self.get_trades_page(MarketParticipantTradesView, market_address=order.market_id,
+                                  owner_address=order.sender),
+             table, ('order_market_date_idx', 'order_sender_date_idx'), False),
+            # rollbacks and incremental snapshots
+            ('orders since block', Order.objects.filter(creation_block__gt=order.creation_block - 10),
+             table, ('order_block_brin',), False),
+            ('account shares',
+             AccountSharesView(kwargs={'account_address': order.sender}).get_queryset()[:self.page_size],
+             OutcomeTokenBalance._meta.db_table, None, False),
+        ]
+
+    def check_plans(self, options):
+        failures = []
+        for name, queryset, table, index_names, no_sort in self.get_cases():
+            plan = explain(queryset)
+            scans = get_scans(plan, table)
+            errors = []
+            if not scans:
+                errors.append('{} is not scanned'.format(table))
+            for node_type, index_name in scans:
+                if index_name is None:
+                    errors.append('{} on {}'.format(node_type, table))
+                elif index_names and index_name not in index_names:
+                    errors.append('{} of {} instead of {}'.format(node_type, index_name, ' or '.join(index_names)))
+            if no_sort and any(node['Node Type'] == 'Sort' for node in get_plan_nodes(plan)):
+                errors.append('rows are sorted')
+
+            self.stdout.write('{:<28} {:>12.2f} {:<5} {}'.format(
+                name, plan['Total Cost'], 'FAIL' if errors else 'OK',
+                ', '.join(errors) or ', '.join('{} {}'.format(*scan) for scan in scans)
+            ))
+            if options['show_plans']:
+                self.stdout.write(json.dumps(plan, indent=2))
+            if errors:
+                failures.append(name)
+        return failures
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:<28} {:>12} {:<5} {}'.format('query', 'total cost', '', 'scans'))
+        failures = []
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options)
+                failures = self.check_plans(options)
+                if options['seed'] and not options['keep']:
+                    raise Rollback()
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError('Query plan regressions: {}'.format(', '.join(failures)))
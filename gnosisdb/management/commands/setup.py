@@ -6,6 +6,23 @@ from django_eth_events.models import Daemon, Block
 from django_celery_beat.models  import PeriodicTask, IntervalSchedule
 
 
+def create_event_listener_task():
+    """
+    Schedules the event listener every 5 seconds
+    :return: True if the periodic task was created, False if it already existed
+    """
+    interval=IntervalSchedule(every=5, period='seconds')
+    interval.save()
+    if not PeriodicTask.objects.filter(task='django_eth_events.tasks.event_listener').count():
+        PeriodicTask.objects.create(
+            name='Event Listener',
+            task='django_eth_events.tasks.event_listener',
+            interval=interval
+        )
+        return True
+    return False
+
+
 class Command(BaseCommand):
     help = 'Cleans the Relational Database and sets up all required configuration'
 
@@ -19,12 +36,5 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('DB Successfully cleaned.'))
 
         # auto-create celery task
-        interval=IntervalSchedule(every=5, period='seconds')
-        interval.save()
-        if not PeriodicTask.objects.filter(task='django_eth_events.tasks.event_listener').count():
-            PeriodicTask.objects.create(
-                name='Event Listener',
-                task='django_eth_events.tasks.event_listener',
-                interval=interval
-            )
+        if create_event_listener_task():
             self.stdout.write(self.style.SUCCESS('Created Periodic Task for Event Listener every 5s.'))
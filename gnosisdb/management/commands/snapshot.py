@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from snapshots.sinks import get_sink, DirectorySink
+from snapshots.snapshot import create_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Creates a snapshot of the database, incremental to the previous one unless --full is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', default=False, help='Dump every table in full')
+        parser.add_argument('--path', default=None, help='Local directory, overrides the configured sink')
+
+    def handle(self, *args, **options):
+        sink = DirectorySink(options['path']) if options['path'] else get_sink()
+        manifest = create_snapshot(sink, full=options['full'])
+        self.stdout.write(self.style.SUCCESS('Snapshot {} of block {} created{}'.format(
+            manifest['name'],
+            manifest['block_number'],
+            ', incremental from block {}'.format(manifest['from_block']) if manifest['from_block'] is not None else ''
+        )))
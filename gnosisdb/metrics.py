@@ -0,0 +1,218 @@
+"""
+Event receiver instrumentation.
+
+Every event saved by a receiver is measured: wall time, SQL queries, time spent requesting IPFS and outcome (saved,
+invalid or error). Runs saved at once by the bulk event processor are measured as a whole and split evenly between
+their events. Measurements go to the METRICS_BACKEND, NoopBackend by default: nothing is measured then.
+PrometheusBackend exposes them on /metrics if METRICS_URL_ENABLED is set, it needs the prometheus_client package.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.backends.utils import CursorWrapper, CursorDebugWrapper
+from django.http import Http404, HttpResponse
+from django.utils.module_loading import import_string
+from timeit import default_timer
+import os
+import threading
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+_backends = {}  # dotted path -> backend, metrics can only be registered once per process
+_local = threading.local()
+
+
+class NoopBackend(object):
+    """
+    Discards everything, receivers don't measure events for a disabled backend
+    """
+    enabled = False
+
+    def observe_event(self, receiver, event, status, seconds, queries, ipfs_seconds):
+        """
+        :param receiver: receiver class name
+        :param event: event name
+        :param status: 'saved', 'invalid' (validation failed), 'ignored' (no serializer) or 'error' (exception)
+        """
+        pass
+
+    def render(self):
+        """
+        :return: (content type, body) of the /metrics response, None if the backend has no endpoint
+        """
+        return None
+
+
+class PrometheusBackend(NoopBackend):
+    """
+    Prometheus counters and histograms. Receivers and web server run in different processes, the /metrics endpoint
+    of the web server only sees their metrics in the prometheus_client multiprocess mode: the prometheus_multiproc_dir
+    environment variable must point every process to the same directory.
+    """
+    enabled = True
+    query_buckets = (1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+
+    def __init__(self):
+        if prometheus_client is None:
+            raise ImportError('PrometheusBackend requires the prometheus_client package')
+        labels = ['receiver', 'event']
+        self.events = prometheus_client.Counter('gnosisdb_receiver_events_total', 'Events handled by the receivers',
+                                                labels + ['status'])
+        self.seconds = prometheus_client.Histogram('gnosisdb_receiver_event_seconds',
+                                                   'Wall time of saving an event', labels)
+        self.queries = prometheus_client.Histogram('gnosisdb_receiver_event_queries',
+                                                   'SQL queries run to save an event', labels,
+                                                   buckets=self.query_buckets)
+        self.ipfs_seconds = prometheus_client.Histogram('gnosisdb_receiver_event_ipfs_seconds',
+                                                        'Time spent requesting IPFS to save an event', labels)
+
+    def observe_event(self, receiver, event, status, seconds, queries, ipfs_seconds):
+        self.events.labels(receiver, event, status).inc()
+        self.seconds.labels(receiver, event).observe(seconds)
+        self.queries.labels(receiver, event).observe(queries)
+        self.ipfs_seconds.labels(receiver, event).observe(ipfs_seconds)
+
+    def render(self):
+        if os.environ.get('prometheus_multiproc_dir'):
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        return prometheus_client.CONTENT_TYPE_LATEST, prometheus_client.generate_latest(registry)
+
+
+def get_backend():
+    path = getattr(settings, 'METRICS_BACKEND', 'gnosisdb.metrics.NoopBackend')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+class CountingCursorMixin(object):
+
+    def __init__(self, cursor, db, counter):
+        super(CountingCursorMixin, self).__init__(cursor, db)
+        self.counter = counter
+
+    def execute(self, sql, params=None):
+        self.counter.queries += 1
+        return super(CountingCursorMixin, self).execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.counter.queries += 1
+        return super(CountingCursorMixin, self).executemany(sql, param_list)
+
+
+class CountingCursorWrapper(CountingCursorMixin, CursorWrapper):
+    pass
+
+
+class CountingCursorDebugWrapper(CountingCursorMixin, CursorDebugWrapper):
+    pass
+
+
+class QueryCounter(object):
+    """
+    Counts the queries run by the connection meanwhile, as an execute wrapper. Before Django 2.0 connections have no
+    execute_wrapper(), the cursors they create meanwhile count them instead.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.queries = 0
+        self.wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        if hasattr(self.db, 'execute_wrapper'):
+            self.wrapper = self.db.execute_wrapper(self)
+            self.wrapper.__enter__()
+        else:
+            self.db.make_cursor = lambda cursor: CountingCursorWrapper(cursor, self.db, self)
+            self.db.make_debug_cursor = lambda cursor: CountingCursorDebugWrapper(cursor, self.db, self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.wrapper is not None:
+            self.wrapper.__exit__(exc_type, exc_value, traceback)
+        else:
+            del self.db.make_cursor
+            del self.db.make_debug_cursor
+        return False
+
+
+class EventMeasurement(object):
+    """
+    Measures saving an event, the status is set by the receiver, exceptions are measured as errors
+    """
+
+    def __init__(self, backend, receiver, event):
+        self.backend = backend
+        self.receiver = receiver
+        self.event = event
+        self.status = 'saved'
+        self.ipfs_seconds = 0.0
+
+    def __enter__(self):
+        self.query_counter = QueryCounter(connection)
+        self.query_counter.__enter__()
+        _local.measurement = self
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = default_timer() - self.start
+        _local.measurement = None
+        self.query_counter.__exit__(exc_type, exc_value, traceback)
+        self.observe(seconds, self.query_counter.queries, exc_type is not None)
+        return False
+
+    def observe(self, seconds, queries, error):
+        self.backend.observe_event(self.receiver, self.event, 'error' if error else self.status, seconds, queries,
+                                   self.ipfs_seconds)
+
+
+class RunMeasurement(EventMeasurement):
+    """
+    Measures saving a run of events at once, see chainevents.bulk. Every event is observed with an equal share of the
+    wall time, queries and IPFS time of the run. The statuses are set by the processor, exceptions fail the whole run.
+    """
+
+    def __init__(self, backend, events):
+        """
+        :param events: list of (receiver class name, event name)
+        """
+        super(RunMeasurement, self).__init__(backend, None, None)
+        self.events = events
+        self.statuses = ['saved'] * len(events)
+
+    def observe(self, seconds, queries, error):
+        if not self.events:
+            return
+        n_events = float(len(self.events))
+        for (receiver, event), status in zip(self.events, self.statuses):
+            self.backend.observe_event(receiver, event, 'error' if error else status, seconds / n_events,
+                                       queries / n_events, self.ipfs_seconds / n_events)
+
+
+def add_ipfs_time(seconds):
+    """
+    Adds the time of an IPFS request to the event being measured by this thread, if any
+    """
+    measurement = getattr(_local, 'measurement', None)
+    if measurement is not None:
+        measurement.ipfs_seconds += seconds
+
+
+def metrics_view(request):
+    response = get_backend().render()
+    if response is None:
+        raise Http404('Metrics are disabled')
+    content_type, body = response
+    return HttpResponse(body, content_type=content_type)
@@ -1,6 +1,11 @@
 from __future__ import unicode_literals
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class RelationaldbConfig(AppConfig):
-    name = 'relationaldb'
\ No newline at end of file
+    name = 'relationaldb'
+
+    def ready(self):
+        from relationaldb.summaries import update_event_summaries
+        post_save.connect(update_event_summaries, dispatch_uid='relationaldb.summaries.update_event_summaries')
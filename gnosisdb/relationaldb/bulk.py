@@ -0,0 +1,217 @@
+from contextlib import contextmanager
+from datetime import datetime
+from django.db import connections, router
+from django.db.models import AutoField
+import io
+import six
+
+
+def _cast_type(field, connection):
+    """
+    Returns the type a VALUES placeholder has to be casted to in order to match the column type
+    """
+    if field.is_relation:
+        return field.db_type(connection)
+    # rel_db_type strips CHECK constraints and maps serial to integer
+    return field.rel_db_type(connection)
+
+
+def bulk_update(model, objs, fields, batch_size=500):
+    """
+    Updates the given fields of every object with one UPDATE ... FROM (VALUES ...) statement per batch.
+    Django 1.11 doesn't ship QuerySet.bulk_update, PostgreSQL only.
+    :param model: model class, fields must be stored on its own table
+    :param objs: list of model instances with a primary key
+    :param fields: list of field names
+    :param batch_size: max number of rows per statement
+    :return: number of updated rows
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    opts = model._meta
+    pk_field = opts.pk
+    update_fields = [opts.get_field(name) for name in fields]
+    for field in update_fields:
+        if field.model._meta.db_table != opts.db_table:
+            raise ValueError('Field {} is not stored on table {}'.format(field.name, opts.db_table))
+
+    columns = [pk_field] + update_fields
+    placeholder = '({})'.format(', '.join('%s::{}'.format(_cast_type(field, connection)) for field in columns))
+    set_sql = ', '.join('{0} = v.{0}'.format(quote_name(field.column)) for field in update_fields)
+    alias_sql = ', '.join(quote_name(field.column) for field in columns)
+
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            params = []
+            for obj in batch:
+                params.append(pk_field.get_db_prep_save(obj.pk, connection))
+                for field in update_fields:
+                    params.append(field.get_db_prep_save(getattr(obj, field.attname), connection))
+
+            sql = 'UPDATE {table} SET {set_sql} FROM (VALUES {values}) AS v ({alias_sql}) ' \
+                  'WHERE {table}.{pk} = v.{pk}'.format(
+                      table=quote_name(opts.db_table),
+                      set_sql=set_sql,
+                      values=', '.join([placeholder] * len(batch)),
+                      alias_sql=alias_sql,
+                      pk=quote_name(pk_field.column)
+                  )
+            cursor.execute(sql, params)
+            updated += cursor.rowcount
+
+    return updated
+
+
+def bulk_create_inherited(model, objs):
+    """
+    Inserts multi-table inherited instances (e.g. BuyOrder) with one INSERT for the parent table and one for the
+    child table. QuerySet.bulk_create refuses inherited models.
+    :param model: child model class with a single concrete parent
+    :param objs: list of unsaved model instances
+    :return: objs, with their primary keys set
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+
+    parents = model._meta.get_parent_list()
+    if len(parents) != 1:
+        raise ValueError('{} must have exactly one concrete parent'.format(model.__name__))
+    parent = parents[0]
+    using = router.db_for_write(model)
+
+    # The parent manager inserts the parent columns and returns the ids (PostgreSQL)
+    parent._base_manager.db_manager(using).bulk_create(objs)
+    for obj in objs:
+        setattr(obj, parent._meta.pk.attname, obj.pk)
+
+    model._base_manager.db_manager(using)._insert(objs, fields=model._meta.local_concrete_fields, using=using)
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+
+    return objs
+
+
+def _copy_literal(value):
+    """
+    Returns the PostgreSQL text representation of value, arrays as '{...}' literals
+    """
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (list, tuple)):
+        return '{' + ','.join(
+            'NULL' if item is None else '"{}"'.format(_copy_literal(item).replace('\\', '\\\\').replace('"', '\\"'))
+            for item in value
+        ) + '}'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return six.text_type(value)
+
+
+def _copy_field(value):
+    """
+    Returns value as a COPY text format field
+    """
+    if value is None:
+        return '\\N'
+    return _copy_literal(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def reserve_ids(model, count, using):
+    """
+    Returns count new values of the model primary key sequence
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                       [model._meta.db_table, model._meta.pk.column, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_create(model, objs):
+    """
+    Inserts the instances with one COPY ... FROM STDIN per table, several times faster than INSERT for big batches.
+    Auto primary keys are reserved from their sequence first, so instances get their primary keys as with
+    bulk_create. Supports multi-table inherited models with a single concrete parent (e.g. BuyOrder).
+    Signals aren't sent. PostgreSQL only.
+    :param model: model class
+    :param objs: list of unsaved model instances
+    :return: objs, with their primary keys set
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+
+    parents = model._meta.get_parent_list()
+    if len(parents) > 1:
+        raise ValueError('{} must have at most one concrete parent'.format(model.__name__))
+    root = parents[0] if parents else model
+    using = router.db_for_write(model)
+    connection = connections[using]
+
+    root_pk = root._meta.pk
+    if isinstance(root_pk, AutoField):
+        missing = [obj for obj in objs if getattr(obj, root_pk.attname) is None]
+        if missing:
+            for obj, pk in zip(missing, reserve_ids(root, len(missing), using)):
+                setattr(obj, root_pk.attname, pk)
+    if parents:
+        for obj in objs:
+            setattr(obj, model._meta.pk.attname, getattr(obj, root_pk.attname))
+
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for table_model in parents + [model]:
+            fields = table_model._meta.local_concrete_fields
+            lines = []
+            for obj in objs:
+                lines.append('\t'.join(
+                    _copy_field(field.get_db_prep_save(field.pre_save(obj, True), connection))
+                    for field in fields
+                ))
+            data = io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+            cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(
+                quote_name(table_model._meta.db_table),
+                ', '.join(quote_name(field.column) for field in fields)
+            ), data)
+
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
+
+
+@contextmanager
+def deferred_indexes(*models):
+    """
+    Drops the non unique indexes of the models tables and builds them again on exit, so bulk loads don't maintain
+    them row by row. Only meant for loads nobody reads concurrently, e.g. a backfill from genesis; primary keys and
+    unique indexes are kept, inserts rely on them.
+    PostgreSQL only.
+    """
+    using = router.db_for_write(models[0])
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT index_class.relname, pg_get_indexdef(index_class.oid) '
+            'FROM pg_index JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid '
+            'JOIN pg_class table_class ON table_class.oid = pg_index.indrelid '
+            'WHERE table_class.relname IN %s AND NOT pg_index.indisunique AND NOT pg_index.indisprimary',
+            [tuple(model._meta.db_table for model in models)]
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute('DROP INDEX {}'.format(connection.ops.quote_name(name)))
+    try:
+        yield [name for name, _ in indexes]
+    finally:
+        with connection.cursor() as cursor:
+            for _, definition in indexes:
+                cursor.execute(definition)
@@ -0,0 +1,160 @@
+"""
+Rollback journal: every row inserted, updated or deleted in the relationaldb tables while a block is indexed is
+recorded by an AFTER ROW trigger (see migration 0018) into JournalEntry, in the same transaction as the change.
+Inserted rows are journaled by primary key, updated and deleted rows as they were before the change.
+
+Rolling a block back replays its entries backwards, consecutive changes of the same table and kind in one statement,
+instead of re-deriving the previous state from the decoded events.
+"""
+from contextlib import contextmanager
+from itertools import groupby
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router, transaction
+from relationaldb.models import JournalEntry
+
+# Transaction local PostgreSQL setting read by the triggers, changes are only journaled while it holds a block number
+BLOCK_SETTING = 'gnosisdb.journal_block'
+
+_pruned_block = None  # last block the journal was pruned for by this process
+
+
+def is_enabled():
+    return getattr(settings, 'ROLLBACK_JOURNAL', True)
+
+
+def get_journaled_models():
+    """
+    Returns {table name: model} of the journaled tables
+    """
+    return dict(
+        (model._meta.db_table, model) for model in apps.get_app_config('relationaldb').get_models()
+        if model is not JournalEntry
+    )
+
+
+def set_block(cursor, block_number):
+    """
+    Sets the block the triggers journal the changes of the current transaction for, None stops journaling
+    """
+    value = '' if block_number is None else str(block_number)
+    cursor.execute('SELECT set_config(%s, %s, true)', [BLOCK_SETTING, value])
+
+
+def prune(block_number):
+    """
+    Deletes the entries of the blocks older than ROLLBACK_JOURNAL_DEPTH blocks before block_number, they can't be
+    reorganized anymore
+    """
+    global _pruned_block
+    if block_number != _pruned_block:
+        depth = getattr(settings, 'ROLLBACK_JOURNAL_DEPTH', 100)
+        JournalEntry.objects.filter(block_number__lt=block_number - depth).delete()
+        _pruned_block = block_number
+
+
+@contextmanager
+def journal_block(block_number):
+    """
+    Journals the changes made inside the block as changes of block_number, in one transaction with them.
+    Nothing is journaled if block_number is None or ROLLBACK_JOURNAL is disabled.
+    """
+    if block_number is None or not is_enabled():
+        yield
+        return
+
+    using = router.db_for_write(JournalEntry)
+    with transaction.atomic(using=using):
+        prune(block_number)
+        with connections[using].cursor() as cursor:
+            set_block(cursor, block_number)
+        yield
+        # An outer transaction may keep running, e.g. the event listener, the setting would outlive this block
+        with connections[using].cursor() as cursor:
+            set_block(cursor, None)
+
+
+def is_journaled(block_number):
+    """
+    Returns True if changes of block_number were journaled, even if they were undone already
+    """
+    return is_enabled() and JournalEntry.objects.filter(block_number=block_number).exists()
+
+
+def get_journal_rows_sql(model):
+    """
+    Returns the FROM items typing the journaled rows of the entries %s (ids) as rows of model, aliased r
+    """
+    return '{journal} AS j, jsonb_populate_record(NULL::{table}, j.data) AS r WHERE j.id = ANY(%s)'.format(
+        journal=JournalEntry._meta.db_table,
+        table=connections[router.db_for_write(model)].ops.quote_name(model._meta.db_table)
+    )
+
+
+def undo_inserts(cursor, model, ids):
+    quote_name = connections[router.db_for_write(model)].ops.quote_name
+    cursor.execute('DELETE FROM {table} USING {rows} AND {table}.{pk} = r.{pk}'.format(
+        table=quote_name(model._meta.db_table),
+        rows=get_journal_rows_sql(model),
+        pk=quote_name(model._meta.pk.column)
+    ), [ids])
+
+
+def undo_updates(cursor, model, ids):
+    quote_name = connections[router.db_for_write(model)].ops.quote_name
+    pk_column = quote_name(model._meta.pk.column)
+    columns = [quote_name(field.column) for field in model._meta.local_concrete_fields if not field.primary_key]
+    # A row updated several times gets back the values it had before the first update
+    cursor.execute(
+        'UPDATE {table} SET {updates} FROM ('
+        'SELECT DISTINCT ON (r.{pk}) r.* FROM {rows} ORDER BY r.{pk}, j.id'
+        ') AS r WHERE {table}.{pk} = r.{pk}'.format(
+            table=quote_name(model._meta.db_table),
+            updates=', '.join('{0} = r.{0}'.format(column) for column in columns),
+            rows=get_journal_rows_sql(model),
+            pk=pk_column
+        ),
+        [ids]
+    )
+
+
+def undo_deletes(cursor, model, ids):
+    cursor.execute('INSERT INTO {} SELECT r.* FROM {}'.format(
+        connections[router.db_for_write(model)].ops.quote_name(model._meta.db_table),
+        get_journal_rows_sql(model)
+    ), [ids])
+
+
+UNDO = {
+    'I': undo_inserts,
+    'U': undo_updates,
+    'D': undo_deletes,
+}
+
+
+def undo_block(block_number):
+    """
+    Reverts the journaled changes of block_number not undone yet, last change first, and marks them as undone.
+    :return: {model: set of primary keys} of the reverted rows
+    """
+    models = get_journaled_models()
+    using = router.db_for_write(JournalEntry)
+    changes = {}
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            # Reverting doesn't journal itself
+            set_block(cursor, None)
+            cursor.execute(
+                'SELECT id, table_name, operation, data FROM {} WHERE block_number = %s AND NOT undone '
+                'ORDER BY id DESC'.format(JournalEntry._meta.db_table),
+                [block_number]
+            )
+            entries = cursor.fetchall()
+            # Consecutive changes of a table and kind are independent of each other, they are reverted at once
+            for (table_name, operation), group in groupby(entries, lambda entry: (entry[1], entry[2])):
+                model = models[table_name]
+                group = list(group)
+                UNDO[operation](cursor, model, [entry[0] for entry in group])
+                changes.setdefault(model, set()).update(entry[3][model._meta.pk.column] for entry in group)
+            JournalEntry.objects.filter(block_number=block_number, undone=False).update(undone=True)
+    return changes
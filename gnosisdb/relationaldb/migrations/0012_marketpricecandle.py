@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2017-12-14 10:12
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0011_auto_20171206_1551'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketPriceCandle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(60, '1m'), (3600, '1h'), (86400, '1d')])),
+                ('start_date_time', models.DateTimeField()),
+                ('open_prices', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=4, max_digits=5), size=None)),
+                ('high_prices', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=4, max_digits=5), size=None)),
+                ('low_prices', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=4, max_digits=5), size=None)),
+                ('close_prices', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=4, max_digits=5), size=None)),
+                ('volumes', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=0, max_digits=80), size=None)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('market', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_candles', to='relationaldb.Market')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='marketpricecandle',
+            unique_together=set([('market', 'resolution', 'start_date_time')]),
+        ),
+    ]
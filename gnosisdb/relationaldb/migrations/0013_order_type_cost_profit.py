@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# Copies the child table columns to the order table, and back when unapplying
+FORWARD_SQL = [
+    """UPDATE relationaldb_order o SET order_type = 'BUY', cost = c.cost_old
+       FROM relationaldb_buyorder c WHERE c.order_ptr_id = o.id""",
+    """UPDATE relationaldb_order o SET order_type = 'SELL', profit = c.profit_old
+       FROM relationaldb_sellorder c WHERE c.order_ptr_id = o.id""",
+    """UPDATE relationaldb_order o SET order_type = 'SHORT SELL', cost = c.cost_old
+       FROM relationaldb_shortsellorder c WHERE c.order_ptr_id = o.id""",
+]
+
+REVERSE_SQL = [
+    """UPDATE relationaldb_buyorder c SET cost_old = o.cost
+       FROM relationaldb_order o WHERE c.order_ptr_id = o.id""",
+    """UPDATE relationaldb_sellorder c SET profit_old = o.profit
+       FROM relationaldb_order o WHERE c.order_ptr_id = o.id""",
+    """UPDATE relationaldb_shortsellorder c SET cost_old = o.cost
+       FROM relationaldb_order o WHERE c.order_ptr_id = o.id""",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0012_marketpricecandle'),
+    ]
+
+    operations = [
+        # The child fields would clash with the new parent fields
+        migrations.RenameField(
+            model_name='buyorder',
+            old_name='cost',
+            new_name='cost_old',
+        ),
+        migrations.RenameField(
+            model_name='sellorder',
+            old_name='profit',
+            new_name='profit_old',
+        ),
+        migrations.RenameField(
+            model_name='shortsellorder',
+            old_name='cost',
+            new_name='cost_old',
+        ),
+        # Nullable, so that unapplying can add the columns back before filling them
+        migrations.AlterField(
+            model_name='buyorder',
+            name='cost_old',
+            field=models.DecimalField(decimal_places=0, max_digits=80, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sellorder',
+            name='profit_old',
+            field=models.DecimalField(decimal_places=0, max_digits=80, null=True),
+        ),
+        migrations.AlterField(
+            model_name='shortsellorder',
+            name='cost_old',
+            field=models.DecimalField(decimal_places=0, max_digits=80, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='order_type',
+            field=models.CharField(choices=[('BUY', 'BUY'), ('SELL', 'SELL'), ('SHORT SELL', 'SHORT SELL')], default='', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='cost',
+            field=models.DecimalField(decimal_places=0, max_digits=80, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='profit',
+            field=models.DecimalField(decimal_places=0, max_digits=80, null=True),
+        ),
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+        migrations.RemoveField(
+            model_name='buyorder',
+            name='cost_old',
+        ),
+        migrations.RemoveField(
+            model_name='sellorder',
+            name='profit_old',
+        ),
+        migrations.RemoveField(
+            model_name='shortsellorder',
+            name='cost_old',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0013_order_type_cost_profit'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='oracle',
+            index=models.Index(fields=['creation_block', 'address'], name='oracle_block_address_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['creation_block', 'address'], name='event_block_address_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='market',
+            index=models.Index(fields=['creation_block', 'address'], name='market_block_address_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['creation_date_time', 'id'], name='order_date_id_idx'),
+        ),
+    ]
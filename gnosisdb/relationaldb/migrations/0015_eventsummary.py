@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copy of relationaldb.summaries.REFRESH_SQL at the time of this migration
+CREATE_SUMMARIES_SQL = """
+INSERT INTO relationaldb_eventsummary (event_id, event_type, lower_bound, upper_bound, oracle_factory, oracle_creator,
+    oracle_creation_date_time, oracle_creation_block, oracle_is_outcome_set, oracle_outcome, oracle_owner,
+    title, description, resolution_date, ipfs_hash, outcomes, unit, decimals)
+SELECT e.address,
+       CASE WHEN s.event_ptr_id IS NOT NULL THEN 'SCALAR' ELSE 'CATEGORICAL' END,
+       s.lower_bound, s.upper_bound,
+       o.factory, o.creator, o.creation_date_time, o.creation_block, o.is_outcome_set, o.outcome, co.owner,
+       d.title, d.description, d.resolution_date, d.ipfs_hash, cd.outcomes, sd.unit, sd.decimals
+FROM relationaldb_event e
+JOIN relationaldb_oracle o ON o.address = e.oracle_id
+LEFT JOIN relationaldb_scalarevent s ON s.event_ptr_id = e.address
+LEFT JOIN relationaldb_centralizedoracle co ON co.oracle_ptr_id = o.address
+LEFT JOIN relationaldb_eventdescription d ON d.id = co.event_description_id
+LEFT JOIN relationaldb_categoricaleventdescription cd ON cd.eventdescription_ptr_id = d.id
+LEFT JOIN relationaldb_scalareventdescription sd ON sd.eventdescription_ptr_id = d.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0014_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSummary',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='relationaldb.Event')),
+                ('event_type', models.CharField(max_length=11)),
+                ('lower_bound', models.DecimalField(decimal_places=0, max_digits=80, null=True)),
+                ('upper_bound', models.DecimalField(decimal_places=0, max_digits=80, null=True)),
+                ('oracle_factory', models.CharField(max_length=40)),
+                ('oracle_creator', models.CharField(max_length=40)),
+                ('oracle_creation_date_time', models.DateTimeField()),
+                ('oracle_creation_block', models.PositiveIntegerField()),
+                ('oracle_is_outcome_set', models.BooleanField(default=False)),
+                ('oracle_outcome', models.DecimalField(decimal_places=0, max_digits=80, null=True)),
+                ('oracle_owner', models.CharField(max_length=40, null=True)),
+                ('title', models.TextField(null=True)),
+                ('description', models.TextField(null=True)),
+                ('resolution_date', models.DateTimeField(db_index=True, null=True)),
+                ('ipfs_hash', models.CharField(max_length=46, null=True)),
+                ('outcomes', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), null=True, size=None)),
+                ('unit', models.TextField(null=True)),
+                ('decimals', models.PositiveIntegerField(null=True)),
+            ],
+        ),
+        migrations.RunSQL(CREATE_SUMMARIES_SQL, migrations.RunSQL.noop),
+    ]
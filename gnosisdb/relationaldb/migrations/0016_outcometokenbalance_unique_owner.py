@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Sums duplicated balances of the same owner and outcome token into the row with the lowest id
+MERGE_BALANCES_SQL = """
+UPDATE relationaldb_outcometokenbalance b
+SET balance = d.balance
+FROM (
+    SELECT MIN(id) AS id, SUM(balance) AS balance
+    FROM relationaldb_outcometokenbalance
+    GROUP BY owner, outcome_token_id
+    HAVING COUNT(*) > 1
+) d
+WHERE b.id = d.id;
+
+DELETE FROM relationaldb_outcometokenbalance b
+USING relationaldb_outcometokenbalance k
+WHERE b.owner = k.owner AND b.outcome_token_id = k.outcome_token_id AND b.id > k.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0015_eventsummary'),
+    ]
+
+    operations = [
+        migrations.RunSQL(MERGE_BALANCES_SQL, migrations.RunSQL.noop),
+        migrations.AlterUniqueTogether(
+            name='outcometokenbalance',
+            unique_together=set([('owner', 'outcome_token')]),
+        ),
+    ]
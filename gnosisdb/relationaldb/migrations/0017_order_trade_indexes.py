@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0016_outcometokenbalance_unique_owner'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['market', 'creation_date_time', 'id'], name='order_market_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['sender', 'creation_date_time', 'id'], name='order_sender_date_idx'),
+        ),
+        # Replaced by order_sender_date_idx
+        migrations.AlterField(
+            model_name='order',
+            name='sender',
+            field=models.CharField(max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['creation_block'], name='order_block_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='oracle',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['creation_block'], name='oracle_block_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['creation_block'], name='event_block_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='market',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['creation_block'], name='market_block_brin'),
+        ),
+    ]
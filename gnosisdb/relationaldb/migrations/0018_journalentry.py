@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+# Journaled tables and their primary key column at the time of this migration
+JOURNALED_TABLES = (
+    ('relationaldb_oracle', 'address'),
+    ('relationaldb_centralizedoracle', 'oracle_ptr_id'),
+    ('relationaldb_event', 'address'),
+    ('relationaldb_scalarevent', 'event_ptr_id'),
+    ('relationaldb_categoricalevent', 'event_ptr_id'),
+    ('relationaldb_outcometoken', 'address'),
+    ('relationaldb_outcometokenbalance', 'id'),
+    ('relationaldb_eventdescription', 'id'),
+    ('relationaldb_scalareventdescription', 'eventdescription_ptr_id'),
+    ('relationaldb_categoricaleventdescription', 'eventdescription_ptr_id'),
+    ('relationaldb_market', 'address'),
+    ('relationaldb_eventsummary', 'event_id'),
+    ('relationaldb_order', 'id'),
+    ('relationaldb_buyorder', 'order_ptr_id'),
+    ('relationaldb_sellorder', 'order_ptr_id'),
+    ('relationaldb_shortsellorder', 'order_ptr_id'),
+    ('relationaldb_marketpricecandle', 'id'),
+)
+
+# Journals the changes made while the transaction local gnosisdb.journal_block setting holds a block number.
+# The primary key column is the trigger argument: inserted rows are journaled by primary key only.
+CREATE_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION relationaldb_journal() RETURNS trigger AS $$
+DECLARE
+    block_number text := current_setting('gnosisdb.journal_block', true);
+    data jsonb;
+BEGIN
+    IF block_number IS NULL OR block_number = '' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        data := jsonb_build_object(TG_ARGV[0], to_jsonb(NEW) -> TG_ARGV[0]);
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF OLD IS NOT DISTINCT FROM NEW THEN
+            RETURN NULL;
+        END IF;
+        data := to_jsonb(OLD);
+    ELSE
+        data := to_jsonb(OLD);
+    END IF;
+    INSERT INTO relationaldb_journalentry (block_number, table_name, operation, data, undone)
+    VALUES (block_number::integer, TG_TABLE_NAME, left(TG_OP, 1), data, false);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_TRIGGER_SQL = """
+CREATE TRIGGER journal AFTER INSERT OR UPDATE OR DELETE ON {table}
+FOR EACH ROW EXECUTE PROCEDURE relationaldb_journal('{pk}');
+"""
+
+DROP_TRIGGER_SQL = 'DROP TRIGGER IF EXISTS journal ON {table};'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0017_order_trade_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('block_number', models.PositiveIntegerField()),
+                ('table_name', models.CharField(max_length=63)),
+                ('operation', models.CharField(choices=[('I', 'INSERT'), ('U', 'UPDATE'), ('D', 'DELETE')], max_length=1)),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('undone', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['block_number', 'id'], name='journal_block_id_idx'),
+        ),
+        migrations.RunSQL(
+            CREATE_FUNCTION_SQL + ''.join(CREATE_TRIGGER_SQL.format(table=table, pk=pk)
+                                          for table, pk in JOURNALED_TABLES),
+            ''.join(DROP_TRIGGER_SQL.format(table=table) for table, _ in JOURNALED_TABLES) +
+            'DROP FUNCTION IF EXISTS relationaldb_journal();'
+        ),
+    ]
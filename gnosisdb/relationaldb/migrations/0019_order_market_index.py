@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationaldb', '0018_journalentry'),
+    ]
+
+    operations = [
+        # Replaced by order_market_date_idx
+        migrations.AlterField(
+            model_name='order',
+            name='market',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='relationaldb.Market'),
+        ),
+    ]
@@ -1,7 +1,13 @@
 from __future__ import unicode_literals
 
-from django.db import models
-from django.contrib.postgres.fields import ArrayField
+from django.db import connections, models, router
+from django.contrib.postgres.fields import ArrayField, JSONField
+from django.contrib.postgres.indexes import BrinIndex
+from django.conf import settings
+from django.utils import timezone
+from relationaldb.bulk import bulk_update
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 # ==================================
 #       Abstract classes
@@ -44,6 +50,13 @@ class Oracle(ContractCreatedByFactory):
     is_outcome_set = models.BooleanField(default=False)
     outcome = models.DecimalField(max_digits=80, decimal_places=0, blank=True, null=True)
 
+    class Meta:
+        # keyset pagination
+        indexes = [
+            models.Index(fields=['creation_block', 'address'], name='oracle_block_address_idx'),
+            BrinIndex(fields=['creation_block'], name='oracle_block_brin'),
+        ]
+
 
 # Events
 class Event(ContractCreatedByFactory):
@@ -54,6 +67,13 @@ class Event(ContractCreatedByFactory):
     outcome = models.DecimalField(max_digits=80, decimal_places=0, null=True)
     redeemed_winnings = models.DecimalField(max_digits=80, decimal_places=0, default=0) # Amount (in collateral token) of redeemed winnings once the event gets resolved
 
+    class Meta:
+        # keyset pagination
+        indexes = [
+            models.Index(fields=['creation_block', 'address'], name='event_block_address_idx'),
+            BrinIndex(fields=['creation_block'], name='event_block_brin'),
+        ]
+
 
 class ScalarEvent(Event):
     """Events with continuous domain of possible outcomes between two boundaries: lower and upper bound"""
@@ -79,12 +99,63 @@ class OutcomeToken(Contract):
     total_supply = models.DecimalField(max_digits=80, decimal_places=0, default=0)
 
 
+class OutcomeTokenBalanceManager(models.Manager):
+    def add(self, owner, outcome_token_id, amount, total_supply=False):
+        """Adds amount, negative to subtract, to the balance of owner, creating the balance if it doesn't exist, with
+        a single INSERT ... ON CONFLICT DO UPDATE statement. If total_supply is set, the same statement adds amount to
+        the total supply of the outcome token.
+        Returns the updated balance, with its outcome token, or None if the outcome token doesn't exist"""
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        token_meta = OutcomeToken._meta
+        token_table = connection.ops.quote_name(token_meta.db_table)
+        balance_table = connection.ops.quote_name(self.model._meta.db_table)
+        token_columns = [field.column for field in token_meta.concrete_fields]
+        returning = ', '.join(connection.ops.quote_name(column) for column in token_columns)
+        if total_supply:
+            token_sql = 'UPDATE {} SET total_supply = total_supply + %s WHERE address = %s RETURNING {}'.format(
+                token_table, returning)
+            params = [amount, outcome_token_id]
+        else:
+            token_sql = 'SELECT {} FROM {} WHERE address = %s'.format(returning, token_table)
+            params = [outcome_token_id]
+
+        sql = 'WITH token AS ({token_sql}), ' \
+              'balance AS (' \
+              'INSERT INTO {balance_table} (owner, outcome_token_id, balance) SELECT %s, address, %s FROM token ' \
+              'ON CONFLICT (owner, outcome_token_id) DO UPDATE SET balance = {balance_table}.balance + EXCLUDED.balance ' \
+              'RETURNING id, balance) ' \
+              'SELECT balance.id, balance.balance, {token_columns} FROM balance, token'.format(
+                  token_sql=token_sql,
+                  balance_table=balance_table,
+                  token_columns=', '.join('token.{}'.format(connection.ops.quote_name(column))
+                                          for column in token_columns))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [owner, amount])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+
+        outcome_token = OutcomeToken.from_db(using, [field.attname for field in token_meta.concrete_fields],
+                                             row[2:])
+        balance = self.model.from_db(using, ['id', 'owner', 'outcome_token_id', 'balance'],
+                                     [row[0], owner, outcome_token.address, row[1]])
+        balance.outcome_token = outcome_token
+        return balance
+
+
 class OutcomeTokenBalance(models.Model):
     """Outcome token balance owned by an ethereum address owner"""
     owner = models.CharField(max_length=40)
     outcome_token = models.ForeignKey(OutcomeToken)
     balance = models.DecimalField(max_digits=80, decimal_places=0, default=0)
 
+    objects = OutcomeTokenBalanceManager()
+
+    class Meta:
+        # Balances are updated in place with ON CONFLICT upserts
+        unique_together = (('owner', 'outcome_token'),)
+
 
 # Event Descriptions
 class EventDescription(models.Model):
@@ -135,28 +206,220 @@ class Market(ContractCreatedByFactory):
     marginal_prices = ArrayField(models.DecimalField(max_digits=5, decimal_places=4))
     trading_volume = models.DecimalField(max_digits=80, decimal_places=0)
 
+    class Meta:
+        # keyset pagination
+        indexes = [
+            models.Index(fields=['creation_block', 'address'], name='market_block_address_idx'),
+            BrinIndex(fields=['creation_block'], name='market_block_brin'),
+        ]
+
+
+class EventSummary(models.Model):
+    """Event type, centralized oracle and event description of an event flattened in one row, so events and markets
+    can be listed without joining every polymorphic table. Maintained by relationaldb.summaries"""
+    event = models.OneToOneField(Event, primary_key=True, related_name='summary')
+    event_type = models.CharField(max_length=11) # CATEGORICAL or SCALAR
+    lower_bound = models.DecimalField(max_digits=80, decimal_places=0, null=True)
+    upper_bound = models.DecimalField(max_digits=80, decimal_places=0, null=True)
+    oracle_factory = models.CharField(max_length=40)
+    oracle_creator = models.CharField(max_length=40)
+    oracle_creation_date_time = models.DateTimeField()
+    oracle_creation_block = models.PositiveIntegerField()
+    oracle_is_outcome_set = models.BooleanField(default=False)
+    oracle_outcome = models.DecimalField(max_digits=80, decimal_places=0, null=True)
+    oracle_owner = models.CharField(max_length=40, null=True) # null if the oracle isn't centralized
+    title = models.TextField(null=True)
+    description = models.TextField(null=True)
+    resolution_date = models.DateTimeField(null=True, db_index=True)
+    ipfs_hash = models.CharField(max_length=46, null=True)
+    outcomes = ArrayField(models.TextField(), null=True) # categorical descriptions
+    unit = models.TextField(null=True) # scalar descriptions
+    decimals = models.PositiveIntegerField(null=True)
+
 
 class Order(BlockTimeStamped):
     """Parent class defining a market related order"""
-    market = models.ForeignKey(Market, related_name='orders')
-    sender = models.CharField(max_length=40, db_index=True)
+    order_types = (
+        ('BUY', 'BUY'),
+        ('SELL', 'SELL'),
+        ('SHORT SELL', 'SHORT SELL'),
+    )
+    ORDER_TYPE = None  # set by the child classes
+
+    market = models.ForeignKey(Market, related_name='orders', db_index=False) # indexed by order_market_date_idx
+    sender = models.CharField(max_length=40) # indexed by order_sender_date_idx
     outcome_token = models.ForeignKey(OutcomeToken, to_field='address', null=True)
     outcome_token_count = models.DecimalField(max_digits=80, decimal_places=0) # the amount of outcome tokens bought or sold
     net_outcome_tokens_sold = ArrayField(models.DecimalField(max_digits=80, decimal_places=0)) # represents the outcome tokens distrubition at the buy/sell order moment
     marginal_prices = ArrayField(models.DecimalField(max_digits=5, decimal_places=4)) # represent the marginal price of each outcome at the time of the market order
+    # Stored on the parent table so orders can be listed without joining every child table
+    order_type = models.CharField(max_length=10, choices=order_types)
+    cost = models.DecimalField(max_digits=80, decimal_places=0, null=True) # buy and short sell orders
+    profit = models.DecimalField(max_digits=80, decimal_places=0, null=True) # sell orders
+
+    class Meta:
+        indexes = [
+            # keyset pagination
+            models.Index(fields=['creation_date_time', 'id'], name='order_date_id_idx'),
+            # trades of a market or of an account over a date range, in keyset pagination order, without sorting
+            models.Index(fields=['market', 'creation_date_time', 'id'], name='order_market_date_idx'),
+            models.Index(fields=['sender', 'creation_date_time', 'id'], name='order_sender_date_idx'),
+            # rows are appended in block order: tiny BRIN indexes serve the block range scans of rollbacks and
+            # incremental snapshots
+            BrinIndex(fields=['creation_block'], name='order_block_brin'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.set_order_type()
+        super(Order, self).save(*args, **kwargs)
+
+    def set_order_type(self):
+        if self.ORDER_TYPE:
+            self.order_type = self.ORDER_TYPE
 
 
 class BuyOrder(Order):
-    cost = models.DecimalField(max_digits=80, decimal_places=0)
+    ORDER_TYPE = 'BUY'
+
     outcome_token_cost = models.DecimalField(max_digits=80, decimal_places=0)
     fees = models.DecimalField(max_digits=80, decimal_places=0)
 
 
 class SellOrder(Order):
-    profit = models.DecimalField(max_digits=80, decimal_places=0)
+    ORDER_TYPE = 'SELL'
+
     outcome_token_profit = models.DecimalField(max_digits=80, decimal_places=0)
     fees = models.DecimalField(max_digits=80, decimal_places=0)
 
 
 class ShortSellOrder(Order):
-    cost = models.DecimalField(max_digits=80, decimal_places=0)
+    ORDER_TYPE = 'SHORT SELL'
+
+
+# Price history
+def get_bucket_start(date_time, resolution):
+    """Returns the start of the resolution seconds long time bucket containing date_time"""
+    if timezone.is_aware(date_time) and not settings.USE_TZ:
+        # Compare as stored, naive UTC
+        date_time = timezone.make_naive(date_time, timezone.utc)
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc if timezone.is_aware(date_time) else None)
+    seconds = int((date_time - epoch).total_seconds())
+    return epoch + timedelta(seconds=seconds - seconds % resolution)
+
+
+class MarketPriceCandleManager(models.Manager):
+    def add_orders(self, orders, resolutions=None):
+        """Adds the given Buy/Sell orders, in chain order, to the candles of their markets.
+        Loads the affected candles with one query and writes them back with one insert and one update"""
+        orders = list(orders)
+        resolutions = resolutions or [resolution for resolution, _ in self.model.resolutions]
+        keys = set(
+            (order.market_id, resolution, get_bucket_start(order.creation_date_time, resolution))
+            for order in orders
+            for resolution in resolutions
+        )
+        if not keys:
+            return
+
+        candles = {}
+        existing = self.select_for_update().filter(
+            market_id__in=set(key[0] for key in keys),
+            resolution__in=resolutions,
+            start_date_time__in=set(key[2] for key in keys)
+        )
+        for candle in existing:
+            key = (candle.market_id, candle.resolution, candle.start_date_time)
+            if key in keys:
+                candles[key] = candle
+
+        new_candles = []
+        for order in orders:
+            for resolution in resolutions:
+                key = (order.market_id, resolution, get_bucket_start(order.creation_date_time, resolution))
+                candle = candles.get(key)
+                if candle is None:
+                    candle = self.model(market_id=key[0], resolution=key[1], start_date_time=key[2])
+                    candles[key] = candle
+                    new_candles.append(candle)
+                candle.add_order(order)
+
+        self.bulk_create(new_candles)
+        bulk_update(self.model, [candle for candle in candles.values() if candle.pk is not None],
+                    ['open_prices', 'high_prices', 'low_prices', 'close_prices', 'volumes', 'orders'])
+
+    def remove_orders(self, orders):
+        """Rebuilds the candles the given (already deleted) orders belonged to from the remaining orders.
+        High and low can't be reverted, but only the buckets of the orders have to be read again"""
+        for order in orders:
+            for resolution, _ in self.model.resolutions:
+                start_date_time = get_bucket_start(order.creation_date_time, resolution)
+                self.filter(market_id=order.market_id, resolution=resolution, start_date_time=start_date_time).delete()
+                remaining_orders = Order.objects.filter(
+                    market_id=order.market_id,
+                    creation_date_time__gte=start_date_time,
+                    creation_date_time__lt=start_date_time + timedelta(seconds=resolution),
+                    order_type__in=[BuyOrder.ORDER_TYPE, SellOrder.ORDER_TYPE]
+                ).select_related('outcome_token').order_by('creation_date_time', 'pk')
+                self.add_orders(remaining_orders, resolutions=[resolution])
+
+
+class MarketPriceCandle(models.Model):
+    """Open, high, low and close marginal prices and traded outcome tokens of each market outcome over a time bucket.
+    Arrays are indexed by outcome, like Market.marginal_prices"""
+    resolutions = (
+        (60, '1m'),
+        (3600, '1h'),
+        (86400, '1d'),
+    )
+
+    market = models.ForeignKey(Market, related_name='price_candles')
+    resolution = models.PositiveIntegerField(choices=resolutions) # bucket length in seconds
+    start_date_time = models.DateTimeField()
+    open_prices = ArrayField(models.DecimalField(max_digits=5, decimal_places=4)) # marginal prices after the first order
+    high_prices = ArrayField(models.DecimalField(max_digits=5, decimal_places=4))
+    low_prices = ArrayField(models.DecimalField(max_digits=5, decimal_places=4))
+    close_prices = ArrayField(models.DecimalField(max_digits=5, decimal_places=4)) # marginal prices after the last order
+    volumes = ArrayField(models.DecimalField(max_digits=80, decimal_places=0)) # outcome tokens bought and sold
+    orders = models.PositiveIntegerField(default=0)
+
+    objects = MarketPriceCandleManager()
+
+    class Meta:
+        # Also the index serving the history of a market: one range scan per resolution
+        unique_together = (('market', 'resolution', 'start_date_time'),)
+
+    def add_order(self, order):
+        prices = [Decimal(price) for price in order.marginal_prices]
+        if not self.orders:
+            self.open_prices = list(prices)
+            self.high_prices = list(prices)
+            self.low_prices = list(prices)
+            self.volumes = [Decimal(0)] * len(prices)
+        else:
+            self.high_prices = [max(high, price) for high, price in zip(self.high_prices, prices)]
+            self.low_prices = [min(low, price) for low, price in zip(self.low_prices, prices)]
+        self.close_prices = list(prices)
+        self.volumes[order.outcome_token.index] += Decimal(order.outcome_token_count)
+        self.orders += 1
+
+
+# Rollback journal
+class JournalEntry(models.Model):
+    """Undo record of a row change made while indexing a block, written by the journal triggers of the other tables,
+    see relationaldb.journal"""
+    operations = (
+        ('I', 'INSERT'),
+        ('U', 'UPDATE'),
+        ('D', 'DELETE'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    block_number = models.PositiveIntegerField()
+    table_name = models.CharField(max_length=63)
+    operation = models.CharField(max_length=1, choices=operations)
+    data = JSONField() # primary key of the inserted row, whole row before the update or delete
+    undone = models.BooleanField(default=False)
+
+    class Meta:
+        # reverse replay of a block
+        indexes = [models.Index(fields=['block_number', 'id'], name='journal_block_id_idx')]
@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from django.db import connections, router, transaction
+import json
+import six
+
+
+@contextmanager
+def planner_settings(cursor, **options):
+    """
+    Sets PostgreSQL planner options, e.g. enable_seqscan='off', for the statements run inside the block.
+    Must run inside a transaction: SET LOCAL ends with it
+    """
+    for name, value in options.items():
+        cursor.execute('SET LOCAL {} = %s'.format(name), [value])
+    try:
+        yield cursor
+    finally:
+        for name in options:
+            cursor.execute('RESET {}'.format(name))
+
+
+def explain(queryset, analyze=False, **options):
+    """
+    Returns the PostgreSQL plan of the queryset SQL, the root node of EXPLAIN (FORMAT JSON)
+    :param analyze: runs the query, the plan nodes include their actual rows and times
+    :param options: planner settings, e.g. enable_seqscan='off' shows whether an index can serve the query on tables
+    small enough to be read sequentially
+    """
+    using = router.db_for_read(queryset.model)
+    connection = connections[using]
+    sql, params = queryset.query.sql_with_params()
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            with planner_settings(cursor, **options):
+                cursor.execute('EXPLAIN ({}FORMAT JSON) {}'.format('ANALYZE, ' if analyze else '', sql), params)
+                plan = cursor.fetchone()[0]
+    if isinstance(plan, six.string_types):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def get_plan_nodes(plan):
+    """
+    Returns every node of the plan tree, depth first
+    """
+    nodes = [plan]
+    for child in plan.get('Plans', []):
+        nodes.extend(get_plan_nodes(child))
+    return nodes
+
+
+def get_scans(plan, table):
+    """
+    Returns the (node type, index name) of every scan of table in the plan. Index name is None for sequential scans,
+    bitmap heap scans are returned as their bitmap index scans.
+    """
+    scans = []
+    for node in get_plan_nodes(plan):
+        if node.get('Relation Name') != table:
+            continue
+        if node['Node Type'] == 'Bitmap Heap Scan':
+            scans.extend((child['Node Type'], child['Index Name']) for child in get_plan_nodes(node)
+                         if child['Node Type'] == 'Bitmap Index Scan')
+        else:
+            scans.append((node['Node Type'], node.get('Index Name')))
+    return scans
@@ -7,7 +7,8 @@ from ipfsapi.exceptions import ErrorResponse
 from time import mktime
 from celery.utils.log import get_task_logger
 from django.conf import settings
-from gnosisdb.utils import calc_lmsr_marginal_price
+from django.db.models import F
+from gnosisdb.utils import calc_lmsr_marginal_prices
 from mpmath import mp
 from decimal import Decimal
 
@@ -491,43 +492,26 @@ class OutcomeTokenIssuanceSerializer(ContractNotTimestampted, serializers.ModelS
     address = serializers.CharField(max_length=40, source='outcome_token')
 
     def create(self, validated_data):
-        # Creates or updates an outcome token balance for the given outcome_token.
+        # Creates or updates the outcome token balance of owner and the total supply with a single upsert.
         # Returns the outcome_token
-        outcome_token = None
-        outcome_token_balance = None
-        try:
-            outcome_token_balance = models.OutcomeTokenBalance.objects.get(owner=validated_data.get('owner'),
-                                                                           outcome_token__address=validated_data.get('outcome_token'))
-            outcome_token_balance.balance += validated_data.get('amount')
-            outcome_token_balance.outcome_token.total_supply += validated_data.get('amount')
-            outcome_token_balance.outcome_token.save()
-            outcome_token_balance.save()
-            return outcome_token_balance.outcome_token
-        except models.OutcomeTokenBalance.DoesNotExist:
-            outcome_token = models.OutcomeToken.objects.get(address=validated_data.get('outcome_token'))
-            outcome_token.total_supply += validated_data.get('amount')
-            outcome_token.save()
-
-            outcome_token_balance = models.OutcomeTokenBalance()
-            outcome_token_balance.balance = validated_data.get('amount')
-            outcome_token_balance.owner = validated_data.get('owner')
-            outcome_token_balance.outcome_token = outcome_token
-            outcome_token_balance.save()
-            return outcome_token
+        outcome_token_balance = models.OutcomeTokenBalance.objects.add(
+            validated_data.get('owner'),
+            validated_data.get('outcome_token'),
+            validated_data.get('amount'),
+            total_supply=True
+        )
+        if outcome_token_balance is None:
+            raise models.OutcomeToken.DoesNotExist(
+                'OutcomeToken {} doesn\'t exist'.format(validated_data.get('outcome_token')))
+        return outcome_token_balance.outcome_token
 
     def rollback(self):
-        try:
-            outcome_token_balance = models.OutcomeTokenBalance.objects.get(
-                owner=self.validated_data.get('owner'),
-                outcome_token__address=self.validated_data.get('outcome_token')
-            )
-            outcome_token_balance.balance -= self.validated_data.get('amount')
-            outcome_token_balance.save()
-            self.instance.total_supply -= self.validated_data.get('amount')
-            self.instance.save()
-        except models.OutcomeTokenBalance.DoesNotExist:
-            self.instance.total_supply -= self.validated_data.get('amount')
-            self.instance.save()
+        models.OutcomeTokenBalance.objects.filter(
+            owner=self.validated_data.get('owner'),
+            outcome_token_id=self.validated_data.get('outcome_token')
+        ).update(balance=F('balance') - self.validated_data.get('amount'))
+        models.OutcomeToken.objects.filter(address=self.instance.address).update(
+            total_supply=F('total_supply') - self.validated_data.get('amount'))
 
 
 class OutcomeTokenRevocationSerializer(ContractNotTimestampted, serializers.ModelSerializer):
@@ -543,36 +527,31 @@ class OutcomeTokenRevocationSerializer(ContractNotTimestampted, serializers.Mode
     address = serializers.CharField(max_length=40, source='outcome_token')
 
     def validate(self, attrs):
-        try:
-            outcome_token_balance = models.OutcomeTokenBalance.objects.get(owner=attrs.get('owner'),
-                                                                           outcome_token__address=attrs.get('outcome_token'))
-            return attrs
-        except models.OutcomeTokenBalance.DoesNotExist:
+        if not models.OutcomeTokenBalance.objects.filter(owner=attrs.get('owner'),
+                                                         outcome_token_id=attrs.get('outcome_token')).exists():
             raise serializers.ValidationError('OutcomeTokenBalance {} for owner {} doesn\'t exist'.format(
                 attrs.get('outcome_token'),
                 attrs.get('owner')
             ))
+        return attrs
 
     def create(self, validated_data):
-        outcome_token_balance = models.OutcomeTokenBalance.objects.get(owner=validated_data.get('owner'),
-                                                                       outcome_token__address=validated_data.get('outcome_token'))
-        outcome_token_balance.balance -= validated_data.get('amount')
-        outcome_token_balance.outcome_token.total_supply -= validated_data.get('amount')
-        # save the outcome_token
-        outcome_token_balance.outcome_token.save()
-        # save the outcome_token_balance
-        outcome_token_balance.save()
+        # The balance exists (validate), subtracts from it and from the total supply with a single statement
+        outcome_token_balance = models.OutcomeTokenBalance.objects.add(
+            validated_data.get('owner'),
+            validated_data.get('outcome_token'),
+            -validated_data.get('amount'),
+            total_supply=True
+        )
         return outcome_token_balance.outcome_token
 
     def rollback(self):
-        outcome_token_balance = models.OutcomeTokenBalance.objects.get(
+        models.OutcomeTokenBalance.objects.filter(
             owner=self.validated_data.get('owner'),
-            outcome_token__address=self.validated_data.get('outcome_token')
-        )
-        outcome_token_balance.balance += self.validated_data.get('amount')
-        outcome_token_balance.save()
-        self.instance.total_supply += self.validated_data.get('amount')
-        self.instance.save()
+            outcome_token_id=self.validated_data.get('outcome_token')
+        ).update(balance=F('balance') + self.validated_data.get('amount'))
+        models.OutcomeToken.objects.filter(address=self.instance.address).update(
+            total_supply=F('total_supply') + self.validated_data.get('amount'))
 
 
 class OutcomeAssignmentEventSerializer(ContractNotTimestampted, serializers.ModelSerializer):
@@ -623,47 +602,36 @@ class OutcomeTokenTransferSerializer(ContractNotTimestampted, serializers.ModelS
 
     def create(self, validated_data):
         # Substract balance from Outcome Token Balance
-        from_balance = models.OutcomeTokenBalance.objects.get(owner=validated_data.get('from_address'),
-                                                              outcome_token__address=validated_data.get('outcome_token'))
-        from_balance.balance -= validated_data.get('value')
-        from_balance.save()
-
-        # Add balance to receiver
-        to_balance = None
-        try:
-            to_balance = models.OutcomeTokenBalance.objects.get(owner=validated_data.get('to'),
-                                                                outcome_token__address=validated_data.get('outcome_token'))
-        except models.OutcomeTokenBalance.DoesNotExist:
-            to_balance = models.OutcomeTokenBalance.objects.create(owner=validated_data.get('to'),
-                                                                   outcome_token=from_balance.outcome_token)
-        to_balance.balance += validated_data.get('value')
-        to_balance.save()
+        updated = models.OutcomeTokenBalance.objects.filter(
+            owner=validated_data.get('from_address'),
+            outcome_token_id=validated_data.get('outcome_token')
+        ).update(balance=F('balance') - validated_data.get('value'))
+        if not updated:
+            raise models.OutcomeTokenBalance.DoesNotExist('OutcomeTokenBalance {} for owner {} doesn\'t exist'.format(
+                validated_data.get('outcome_token'),
+                validated_data.get('from_address')
+            ))
 
-        return to_balance
+        # Add balance to receiver, creating it if needed
+        return models.OutcomeTokenBalance.objects.add(
+            validated_data.get('to'),
+            validated_data.get('outcome_token'),
+            validated_data.get('value')
+        )
 
     def rollback(self):
         # got OutcomeTokenBalance by using 'From' property
-        self.instance.balance += self.validated_data.get('value')
-        self.instance.save()
-
-        # Add balance to receiver
-        to_balance = None
-        try:
-            to_balance = models.OutcomeTokenBalance.objects.get(
-                owner=self.validated_data.get('to'),
-                outcome_token__address=self.validated_data.get('outcome_token')
-            )
-        except models.OutcomeTokenBalance.DoesNotExist:
-            to_balance = models.OutcomeTokenBalance.objects.create(
-                owner=self.validated_data.get('to'),
-                outcome_token=self.from_balance.outcome_token
-            )
-
-        if to_balance.balance - self.validated_data.get('value') == 0:
+        models.OutcomeTokenBalance.objects.filter(pk=self.instance.pk).update(
+            balance=F('balance') + self.validated_data.get('value'))
+
+        # Subtract balance from receiver, balances emptied by the rollback are deleted
+        to_balance = models.OutcomeTokenBalance.objects.add(
+            self.validated_data.get('to'),
+            self.validated_data.get('outcome_token'),
+            -self.validated_data.get('value')
+        )
+        if to_balance.balance == 0:
             to_balance.delete()
-        else:
-            to_balance.balance -= self.validated_data.get('value')
-            to_balance.save()
 
 
 class WinningsRedemptionSerializer(ContractNotTimestampted, serializers.ModelSerializer):
@@ -796,13 +764,12 @@ class OutcomeTokenPurchaseSerializer(ContractEventTimestamped, serializers.Model
             order.fees = validated_data.get('marketFees')
             order.net_outcome_tokens_sold = market.net_outcome_tokens_sold
             # calculate current marginal price
-            order.marginal_prices = map(
-                lambda (index, _): Decimal(calc_lmsr_marginal_price(int(index), [int(x) for x in market.net_outcome_tokens_sold],
-                                                            int(market.funding))),
-                enumerate(market.net_outcome_tokens_sold)
-            )
+            order.marginal_prices = [
+                Decimal(price) for price in calc_lmsr_marginal_prices(market.net_outcome_tokens_sold, market.funding)
+            ]
             # Save order successfully, save market changes, then save the share entry
             order.save()
+            models.MarketPriceCandle.objects.add_orders([order])
             market.trading_volume += order.cost
             market.marginal_prices = order.marginal_prices
             market.save()
@@ -817,14 +784,13 @@ class OutcomeTokenPurchaseSerializer(ContractEventTimestamped, serializers.Model
         market.net_outcome_tokens_sold[token_index] -= token_count
         market.collected_fees -= self.validated_data.get('marketFees')
         market.trading_volume -= self.instance.cost
-        market.marginal_prices = map(
-            lambda (index, _): Decimal(calc_lmsr_marginal_price(int(index), [int(x) for x in market.net_outcome_tokens_sold],
-                                                        int(market.funding))),
-            enumerate(market.net_outcome_tokens_sold)
-        )
+        market.marginal_prices = [
+            Decimal(price) for price in calc_lmsr_marginal_prices(market.net_outcome_tokens_sold, market.funding)
+        ]
 
-        # Remove order
+        # Remove order, then rebuild its price candles without it
         self.instance.delete()
+        models.MarketPriceCandle.objects.remove_orders([self.instance])
         market.save()
 
 
@@ -866,13 +832,12 @@ class OutcomeTokenSaleSerializer(ContractEventTimestamped, serializers.ModelSeri
             order.outcome_token_profit = validated_data.get('outcomeTokenProfit')
             order.fees = validated_data.get('marketFees')
             order.net_outcome_tokens_sold = market.net_outcome_tokens_sold
-            order.marginal_prices = map(
-                lambda (index, _): Decimal(calc_lmsr_marginal_price(int(index), [int(x) for x in market.net_outcome_tokens_sold],
-                                                            int(market.funding))),
-                enumerate(market.net_outcome_tokens_sold)
-            )
+            order.marginal_prices = [
+                Decimal(price) for price in calc_lmsr_marginal_prices(market.net_outcome_tokens_sold, market.funding)
+            ]
             # Save order successfully, save market changes, then save the share entry
             order.save()
+            models.MarketPriceCandle.objects.add_orders([order])
             market.marginal_prices = order.marginal_prices
             market.save()
             return order
@@ -887,15 +852,13 @@ class OutcomeTokenSaleSerializer(ContractEventTimestamped, serializers.ModelSeri
         market.net_outcome_tokens_sold[token_index] += token_count
         market.collected_fees -= self.validated_data.get('marketFees')
 
-        market.marginal_prices = map(
-            lambda (index, _): Decimal(
-                calc_lmsr_marginal_price(int(index), [int(x) for x in market.net_outcome_tokens_sold],
-                                         int(market.funding))),
-            enumerate(market.net_outcome_tokens_sold)
-        )
+        market.marginal_prices = [
+            Decimal(price) for price in calc_lmsr_marginal_prices(market.net_outcome_tokens_sold, market.funding)
+        ]
 
-        # Remove order
+        # Remove order, then rebuild its price candles without it
         self.instance.delete()
+        models.MarketPriceCandle.objects.remove_orders([self.instance])
         market.save()
 
 
@@ -0,0 +1,65 @@
+from django.db import connections, router
+from relationaldb.models import Event, Oracle, EventDescription, EventSummary
+
+# Every column of EventSummary, in the order of the SELECT below
+COLUMNS = (
+    'event_id', 'event_type', 'lower_bound', 'upper_bound',
+    'oracle_factory', 'oracle_creator', 'oracle_creation_date_time', 'oracle_creation_block',
+    'oracle_is_outcome_set', 'oracle_outcome', 'oracle_owner',
+    'title', 'description', 'resolution_date', 'ipfs_hash', 'outcomes', 'unit', 'decimals',
+)
+
+REFRESH_SQL = """
+INSERT INTO relationaldb_eventsummary ({columns})
+SELECT e.address,
+       CASE WHEN s.event_ptr_id IS NOT NULL THEN 'SCALAR' ELSE 'CATEGORICAL' END,
+       s.lower_bound, s.upper_bound,
+       o.factory, o.creator, o.creation_date_time, o.creation_block, o.is_outcome_set, o.outcome, co.owner,
+       d.title, d.description, d.resolution_date, d.ipfs_hash, cd.outcomes, sd.unit, sd.decimals
+FROM relationaldb_event e
+JOIN relationaldb_oracle o ON o.address = e.oracle_id
+LEFT JOIN relationaldb_scalarevent s ON s.event_ptr_id = e.address
+LEFT JOIN relationaldb_centralizedoracle co ON co.oracle_ptr_id = o.address
+LEFT JOIN relationaldb_eventdescription d ON d.id = co.event_description_id
+LEFT JOIN relationaldb_categoricaleventdescription cd ON cd.eventdescription_ptr_id = d.id
+LEFT JOIN relationaldb_scalareventdescription sd ON sd.eventdescription_ptr_id = d.id
+WHERE {where}
+ON CONFLICT (event_id) DO UPDATE SET {updates}
+"""
+
+
+def refresh_event_summaries(event_addresses=None, oracle_addresses=None, event_description_ids=None):
+    """
+    Rebuilds the EventSummary rows of the given events, of the events resolved by the given oracles or of the
+    events whose oracle uses the given descriptions, with one INSERT ... ON CONFLICT statement.
+    Every summary is rebuilt if no filter is given.
+    """
+    conditions = []
+    params = []
+    for column, values in (('e.address', event_addresses), ('o.address', oracle_addresses),
+                           ('co.event_description_id', event_description_ids)):
+        if values is not None:
+            conditions.append('{} = ANY(%s)'.format(column))
+            params.append(list(values))
+
+    sql = REFRESH_SQL.format(
+        columns=', '.join(COLUMNS),
+        where=' OR '.join(conditions) or 'TRUE',
+        updates=', '.join('{0} = EXCLUDED.{0}'.format(column) for column in COLUMNS[1:])
+    )
+    with connections[router.db_for_write(EventSummary)].cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def update_event_summaries(sender, instance, **kwargs):
+    """
+    post_save receiver, keeps the summaries in sync with the events, oracles and descriptions
+    """
+    if kwargs.get('raw'):
+        return
+    if isinstance(instance, Event):
+        refresh_event_summaries(event_addresses=[instance.address])
+    elif isinstance(instance, Oracle):
+        refresh_event_summaries(oracle_addresses=[instance.address])
+    elif isinstance(instance, EventDescription):
+        refresh_event_summaries(event_description_ids=[instance.pk])
@@ -16,10 +16,10 @@ def send_email(message):
 @shared_task
 def db_dump():
     """
-    The task creates a dump of the database
+    The task creates an incremental snapshot of the database
     """
     try:
-        call_command('db_dump')
+        call_command('snapshot')
     except Exception as err:
         logger.error(str(err))
         send_email(traceback.format_exc())
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase
+from relationaldb.journal import get_journaled_models, journal_block, undo_block, is_journaled
+from relationaldb.models import BuyOrder, JournalEntry, Market, OutcomeTokenBalance
+from relationaldb.tests.factories import MarketFactory, OutcomeTokenFactory, OutcomeTokenBalanceFactory, BuyOrderFactory
+
+
+class TestJournal(TestCase):
+
+    def test_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tgrelid::regclass::text FROM pg_trigger WHERE tgname = 'journal'")
+            tables = set(row[0] for row in cursor.fetchall())
+        self.assertSetEqual(set(get_journaled_models().keys()) - tables, set())
+
+    def test_undo_block(self):
+        market = MarketFactory()
+        outcome_token = OutcomeTokenFactory(event=market.event)
+        balance = OutcomeTokenBalanceFactory(outcome_token=outcome_token, balance=10)
+        deleted_balance = OutcomeTokenBalanceFactory(outcome_token=outcome_token, balance=20)
+        self.assertFalse(JournalEntry.objects.exists())
+
+        with journal_block(5):
+            order = BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=5)
+            market.net_outcome_tokens_sold = [10, 0]
+            market.marginal_prices = ['0.6000', '0.4000']
+            market.save()
+            market.net_outcome_tokens_sold = [30, 0]
+            market.save()
+            OutcomeTokenBalance.objects.filter(pk=balance.pk).update(balance=15)
+            # delete() clears the pk of the instance
+            deleted_balance_pk = deleted_balance.pk
+            deleted_balance.delete()
+        # Only changes made inside the block are journaled
+        OutcomeTokenBalanceFactory(outcome_token=outcome_token)
+        self.assertTrue(is_journaled(5))
+        self.assertFalse(is_journaled(6))
+        # Two rows for the order, market saved twice, balance updated and deleted
+        self.assertEquals(JournalEntry.objects.filter(block_number=5).count(), 6)
+
+        changes = undo_block(5)
+        self.assertSetEqual(changes[Market], set([market.address]))
+        self.assertFalse(BuyOrder.objects.filter(pk=order.pk).exists())
+        market = Market.objects.get(address=market.address)
+        self.assertEquals(market.net_outcome_tokens_sold, [0, 0])
+        self.assertEquals(market.marginal_prices, [Decimal('0.5000'), Decimal('0.5000')])
+        self.assertEquals(OutcomeTokenBalance.objects.get(pk=balance.pk).balance, 10)
+        self.assertEquals(OutcomeTokenBalance.objects.get(pk=deleted_balance_pk).balance, 20)
+        # Undoing does nothing the second time
+        self.assertEquals(undo_block(5), {})
+        self.assertFalse(JournalEntry.objects.filter(undone=False).exists())
+
+    def test_prune(self):
+        market = MarketFactory()
+        with self.settings(ROLLBACK_JOURNAL_DEPTH=1000):
+            for block_number, stage in ((1, 1), (50, 2), (200, 0)):
+                with journal_block(block_number):
+                    Market.objects.filter(address=market.address).update(stage=stage)
+        self.assertEquals(JournalEntry.objects.count(), 3)
+
+        # Entries deeper than ROLLBACK_JOURNAL_DEPTH are deleted when a new block starts
+        with self.settings(ROLLBACK_JOURNAL_DEPTH=100):
+            with journal_block(201):
+                pass
+        self.assertListEqual(list(JournalEntry.objects.values_list('block_number', flat=True)), [200])
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from datetime import datetime, timedelta
+from django.db import connection
+from django.test import TestCase
+from relationaldb.models import Order, OutcomeTokenBalance
+from relationaldb.plans import explain, get_plan_nodes, get_scans
+from relationaldb.tests.factories import (
+    MarketFactory, OutcomeTokenFactory, OutcomeTokenBalanceFactory, BuyOrderFactory
+)
+from restapi.views import AccountSharesView, AllMarketSharesView, MarketSharesView, MarketSharesExportView
+
+INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+class TestBalanceQueryPlans(TestCase):
+    """
+    Sequential scans are disabled, test tables are small enough to be read sequentially whatever the indexes.
+    The planner still falls back to a sequential scan if no index can serve the query.
+    """
+    table = OutcomeTokenBalance._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.market = MarketFactory()
+        cls.owner = '{:040d}'.format(13)
+        cls.outcome_tokens = [OutcomeTokenFactory(event=cls.market.event, index=index) for index in range(0, 2)]
+        for outcome_token in cls.outcome_tokens:
+            OutcomeTokenBalanceFactory(owner=cls.owner, outcome_token=outcome_token)
+            for owner in range(100, 120):
+                OutcomeTokenBalanceFactory(owner='{:040d}'.format(owner), outcome_token=outcome_token)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE {}'.format(connection.ops.quote_name(cls.table)))
+
+    def get_owner_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, self.table)
+        return [
+            name for name, constraint in constraints.items()
+            if constraint['unique'] and constraint['columns'] == ['owner', 'outcome_token_id']
+        ][0]
+
+    def assertIndexScans(self, queryset, index_name=None):
+        scans = get_scans(explain(queryset, enable_seqscan='off'), self.table)
+        self.assertTrue(scans)
+        for node_type, scan_index_name in scans:
+            self.assertIn(node_type, INDEX_SCANS, scans)
+            if index_name:
+                self.assertEquals(scan_index_name, index_name)
+
+    def test_serializer_lookups(self):
+        owner_index = self.get_owner_index()
+        outcome_token = self.outcome_tokens[0]
+        # Issuance, Revocation and Transfer balance updates and Revocation validation
+        self.assertIndexScans(
+            OutcomeTokenBalance.objects.filter(owner=self.owner, outcome_token_id=outcome_token.address),
+            owner_index
+        )
+        # Transfer rollback lookup of OutcomeTokenInstanceReceiver
+        self.assertIndexScans(
+            OutcomeTokenBalance.objects.filter(owner=self.owner, outcome_token=outcome_token.address),
+            owner_index
+        )
+
+    def test_view_lookups(self):
+        owner_index = self.get_owner_index()
+        view = AccountSharesView(kwargs={'account_address': self.owner})
+        self.assertIndexScans(view.get_queryset().order_by('id'), owner_index)
+
+        view = MarketSharesView(kwargs={'market_address': self.market.address, 'owner_address': self.owner})
+        self.assertIndexScans(view.get_queryset().order_by('id'), owner_index)
+
+        view = AllMarketSharesView(kwargs={'market_address': self.market.address})
+        self.assertIndexScans(view.get_queryset().order_by('id'))
+
+        view = MarketSharesExportView(kwargs={'market_address': self.market.address})
+        self.assertIndexScans(view.get_queryset())
+
+
+class TestOrderQueryPlans(TestCase):
+    table = Order._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        # Selective market and sender filters, as on a production table
+        markets = [MarketFactory() for _ in range(0, 5)]
+        cls.market = markets[0]
+        cls.sender = '{:040d}'.format(13)
+        for market in markets:
+            outcome_token = OutcomeTokenFactory(event=market.event)
+            for index in range(0, 10):
+                BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=index,
+                                sender=cls.sender if index == 0 else '{:040d}'.format(100 + index))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE {}'.format(connection.ops.quote_name(cls.table)))
+
+    def assertIndexScans(self, queryset, index_names, sorted=False):
+        plan = explain(queryset, enable_seqscan='off')
+        scans = get_scans(plan, self.table)
+        self.assertTrue(scans)
+        for node_type, index_name in scans:
+            self.assertIn(index_name, index_names, scans)
+        if not sorted:
+            # Rows come in keyset pagination order from the index
+            self.assertNotIn('Sort', [node['Node Type'] for node in get_plan_nodes(plan)])
+
+    def test_trades_lookups(self):
+        since = datetime.now() - timedelta(days=14)
+        trades = Order.objects.filter(creation_date_time__gte=since).order_by('creation_date_time', 'id')
+        self.assertIndexScans(trades.filter(market=self.market.address)[:100], ('order_market_date_idx',))
+        self.assertIndexScans(trades.filter(sender=self.sender)[:100], ('order_sender_date_idx',))
+        # Either index, or both combined in a bitmap
+        self.assertIndexScans(trades.filter(market=self.market.address, sender=self.sender)[:100],
+                              ('order_market_date_idx', 'order_sender_date_idx'), sorted=True)
@@ -11,6 +11,8 @@ from relationaldb.serializers import (
 
 from relationaldb.models import OutcomeTokenBalance, OutcomeToken, ScalarEventDescription
 from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.test.utils import CaptureQueriesContext
 from ipfs.ipfs import Ipfs
 from time import mktime
 
@@ -568,3 +570,50 @@ class TestSerializers(TestCase):
         self.assertIsNotNone(instance)
         self.assertEqual(instance.owner, event.address)
         self.assertEqual(instance.balance, 20)
+
+    def test_outcome_token_balance_upserts(self):
+        outcome_token = OutcomeTokenFactory()
+        owner = outcome_token.address[0:-5] + 'owner'
+        receiver = outcome_token.address[0:-8] + 'receiver'
+
+        def token_event(name, params):
+            return {
+                'name': name,
+                'address': outcome_token.address,
+                'params': [{'name': key, 'value': value} for key, value in params]
+            }
+
+        # Balance and total supply are updated by one statement
+        for _ in range(0, 2):
+            s = OutcomeTokenIssuanceSerializer(data=token_event('Issuance', [('owner', owner), ('amount', 20)]))
+            self.assertTrue(s.is_valid(), s.errors)
+            with CaptureQueriesContext(connection) as context:
+                instance = s.save()
+            self.assertEqual(len(context.captured_queries), 1)
+            self.assertEqual(instance.address, outcome_token.address)
+        self.assertEqual(OutcomeTokenBalance.objects.get(owner=owner).balance, 40)
+        self.assertEqual(OutcomeToken.objects.get(address=outcome_token.address).total_supply,
+                         outcome_token.total_supply + 40)
+
+        s = OutcomeTokenTransferSerializer(data=token_event('Transfer', [('from', owner), ('to', receiver),
+                                                                          ('value', 15)]))
+        self.assertTrue(s.is_valid(), s.errors)
+        with CaptureQueriesContext(connection) as context:
+            s.save()
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(OutcomeTokenBalance.objects.get(owner=owner).balance, 25)
+        self.assertEqual(OutcomeTokenBalance.objects.get(owner=receiver).balance, 15)
+
+        s = OutcomeTokenRevocationSerializer(data=token_event('Revocation', [('owner', receiver), ('amount', 5)]))
+        self.assertTrue(s.is_valid(), s.errors)
+        with CaptureQueriesContext(connection) as context:
+            s.save()
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(OutcomeTokenBalance.objects.filter(owner=receiver).count(), 1)
+        self.assertEqual(OutcomeTokenBalance.objects.get(owner=receiver).balance, 10)
+        self.assertEqual(OutcomeToken.objects.get(address=outcome_token.address).total_supply,
+                         outcome_token.total_supply + 35)
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                OutcomeTokenBalance.objects.create(owner=owner, outcome_token=outcome_token)
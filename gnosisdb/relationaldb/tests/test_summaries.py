@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.test import TestCase
+from relationaldb.models import CentralizedOracle, EventDescription, EventSummary
+from relationaldb.tests.factories import (
+    CategoricalEventFactory, ScalarEventFactory, CentralizedOracleFactory, ScalarEventDescriptionFactory
+)
+from relationaldb.summaries import refresh_event_summaries
+
+
+class TestEventSummaries(TestCase):
+
+    def test_categorical_event_summary(self):
+        event = CategoricalEventFactory()
+        oracle = CentralizedOracle.objects.get(address=event.oracle_id)
+        summary = EventSummary.objects.get(event=event)
+        self.assertEquals(summary.event_type, 'CATEGORICAL')
+        self.assertEquals(summary.oracle_owner, oracle.owner)
+        self.assertEquals(summary.title, oracle.event_description.title)
+        self.assertEquals(summary.outcomes, oracle.event_description.categoricaleventdescription.outcomes)
+        self.assertIsNone(summary.unit)
+
+        # Oracle changes
+        oracle.owner = '{:040d}'.format(1000)
+        oracle.is_outcome_set = True
+        oracle.save()
+        summary = EventSummary.objects.get(event=event)
+        self.assertEquals(summary.oracle_owner, oracle.owner)
+        self.assertTrue(summary.oracle_is_outcome_set)
+
+        # Description changes
+        event_description = EventDescription.objects.get(pk=oracle.event_description_id)
+        event_description.title = 'New title'
+        event_description.save()
+        self.assertEquals(EventSummary.objects.get(event=event).title, 'New title')
+
+        # Rollbacks delete the event
+        event.delete()
+        self.assertFalse(EventSummary.objects.filter(event=event.address).exists())
+
+    def test_scalar_event_summary(self):
+        oracle = CentralizedOracleFactory(event_description=ScalarEventDescriptionFactory())
+        event = ScalarEventFactory(oracle=oracle, lower_bound=-10, upper_bound=10)
+        summary = EventSummary.objects.get(event=event)
+        self.assertEquals(summary.event_type, 'SCALAR')
+        self.assertEquals(summary.lower_bound, -10)
+        self.assertEquals(summary.upper_bound, 10)
+        self.assertEquals(summary.unit, oracle.event_description.unit)
+        self.assertIsNone(summary.outcomes)
+
+    def test_refresh_event_summaries(self):
+        events = [CategoricalEventFactory() for x in range(0, 3)]
+        EventSummary.objects.all().delete()
+        refresh_event_summaries(event_addresses=[events[0].address])
+        self.assertEquals(EventSummary.objects.count(), 1)
+        refresh_event_summaries()
+        self.assertEquals(EventSummary.objects.count(), 3)
@@ -1,7 +1,20 @@
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class RestapiConfig(AppConfig):
     name = 'restapi'
+
+    def ready(self):
+        from restapi.cache import invalidate_contract
+        from relationaldb import models
+        # Only the models embedded in cached responses, receivers without sender prevent fast deletes of any model
+        for model in (models.Market, models.Event, models.ScalarEvent, models.CategoricalEvent, models.Oracle,
+                      models.CentralizedOracle, models.EventDescription, models.ScalarEventDescription,
+                      models.CategoricalEventDescription):
+            post_save.connect(invalidate_contract, sender=model,
+                              dispatch_uid='restapi.cache.invalidate_contract.{}'.format(model.__name__))
+            post_delete.connect(invalidate_contract, sender=model,
+                                dispatch_uid='restapi.cache.invalidate_contract_delete.{}'.format(model.__name__))
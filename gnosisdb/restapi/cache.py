@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django_eth_events.models import Block, Daemon
+from relationaldb.models import Market, Event, Oracle, CentralizedOracle, EventDescription
+from ipfs.cache import LRUCache
+from gnosisdb.utils import singleton
+from functools import wraps
+import calendar
+
+
+def get_daemon(request):
+    """
+    Returns the event listener daemon, read once per request along with the hash of its block as current_block_hash
+    """
+    if not hasattr(request, '_daemon'):
+        block_hash = Block.objects.filter(block_number=OuterRef('block_number')).values('block_hash')[:1]
+        daemon = Daemon.objects.annotate(current_block_hash=Subquery(block_hash)).first()
+        if daemon is None:
+            daemon = Daemon.get_solo()
+            daemon.current_block_hash = None
+        request._daemon = daemon
+    return request._daemon
+
+
+def get_block_tag(request):
+    """
+    Returns the number and the hash of the last processed block: a reorganization replaces the blocks after the fork
+    with blocks of the same numbers
+    """
+    daemon = get_daemon(request)
+    return '{}-{}'.format(daemon.block_number, daemon.current_block_hash or '')
+
+
+def get_block_validators(request):
+    """
+    Returns the weak ETag and Last-Modified timestamp of request's response: the data only changes when the daemon
+    processes a block, or rolls blocks back
+    :return: (etag, timestamp)
+    """
+    daemon = get_daemon(request)
+    renderer = getattr(request, 'accepted_renderer', None)
+    etag = 'W/"{}-{}"'.format(get_block_tag(request), renderer.format if renderer else '')
+    # Daemon is a TimeStampedModel, saved along with every processed or rolled back block
+    last_modified = calendar.timegm(daemon.modified.utctimetuple())
+    return etag, last_modified
+
+
+def conditional_get(request, get_response):
+    """
+    Answers conditional GET requests whose validators match with a 304, before get_response runs any query
+    :param get_response: callable returning the full response
+    """
+    etag, last_modified = get_block_validators(request)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_response()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def block_conditional(view_func):
+    """
+    conditional_get decorator for function views, goes under @api_view
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+        return conditional_get(request, lambda: view_func(request, *args, **kwargs))
+    return wrapper
+
+
+class ConditionalGetMixin(object):
+    """
+    Adds the block validators to the GET responses of a view and answers matching conditional requests with a 304
+    """
+    def get(self, request, *args, **kwargs):
+        return conditional_get(request, lambda: super(ConditionalGetMixin, self).get(request, *args, **kwargs))
+
+
+@singleton
+class ResponseCache(object):
+    """
+    Serialized detail responses keyed by model name and contract address.
+
+    Entries are kept in an in-process LRU and, if API_CACHE_BACKEND names one of settings.CACHES, in that shared
+    cache. Saving or deleting a market, event, oracle or event description deletes the keys of every response
+    embedding it once the transaction commits, see invalidate_contract: a request running meanwhile could cache the
+    previous data again otherwise. Entries also remember the block the daemon was at when they were cached, see
+    get_block_tag, and are only served for that block: the changes made by the worker processes can't reach this process memory, and a
+    request that read the previous block may still cache its data after the invalidation, but every change happens
+    while processing a block.
+    """
+
+    def __init__(self):
+        self.memory_cache = LRUCache(getattr(settings, 'API_CACHE_SIZE', 1000))
+        alias = getattr(settings, 'API_CACHE_BACKEND', None)
+        self.shared_cache = caches[alias] if alias else None
+        self.timeout = getattr(settings, 'API_CACHE_TIMEOUT', 3600)
+
+    def get_key(self, name, address):
+        return 'restapi:{}:{}'.format(name, address)
+
+    def get(self, name, address, block_tag):
+        key = self.get_key(name, address)
+        entry = self.memory_cache.get(key)
+        if entry is not None and entry[0] == block_tag:
+            return entry[1]
+
+        if self.shared_cache is not None:
+            entry = self.shared_cache.get(key)
+            if entry is not None and entry[0] == block_tag:
+                self.memory_cache.set(key, entry)
+                return entry[1]
+        return None
+
+    def set(self, name, address, block_tag, data):
+        key = self.get_key(name, address)
+        self.memory_cache.set(key, (block_tag, data))
+        if self.shared_cache is not None:
+            self.shared_cache.set(key, (block_tag, data), self.timeout)
+
+    def delete(self, name, addresses):
+        """
+        Deletes the entries once the current transaction commits, right away outside of transactions
+        """
+        keys = [self.get_key(name, address) for address in addresses]
+        if keys:
+            transaction.on_commit(lambda: self.delete_keys(keys))
+
+    def delete_keys(self, keys):
+        for key in keys:
+            self.memory_cache.delete(key)
+        if self.shared_cache is not None:
+            self.shared_cache.delete_many(keys)
+
+    def clear(self):
+        self.memory_cache.clear()
+        if self.shared_cache is not None:
+            self.shared_cache.clear()
+
+
+def invalidate_markets(addresses):
+    ResponseCache().delete('market', addresses)
+
+
+def invalidate_events(addresses):
+    addresses = list(addresses)
+    ResponseCache().delete('event', addresses)
+    if addresses:
+        invalidate_markets(Market.objects.filter(event__in=addresses).values_list('address', flat=True))
+
+
+def invalidate_oracles(addresses):
+    addresses = list(addresses)
+    ResponseCache().delete('oracle', addresses)
+    if addresses:
+        invalidate_events(Event.objects.filter(oracle__in=addresses).values_list('address', flat=True))
+
+
+def invalidate_contract(sender, instance, **kwargs):
+    """
+    post_save and post_delete receiver, drops the cached responses showing instance
+    """
+    if isinstance(instance, Market):
+        invalidate_markets([instance.address])
+    elif isinstance(instance, Event):
+        invalidate_events([instance.address])
+    elif isinstance(instance, Oracle):
+        invalidate_oracles([instance.address])
+    elif isinstance(instance, EventDescription):
+        invalidate_oracles(
+            CentralizedOracle.objects.filter(event_description=instance.pk).values_list('address', flat=True)
+        )
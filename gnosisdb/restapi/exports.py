@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from itertools import islice
+import csv
+import json
+import six
+
+
+def get_chunks(queryset, chunk_size):
+    """
+    Iterates the queryset with a server side cursor, yielding lists of at most chunk_size instances
+    """
+    iterator = queryset.iterator()
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_column(row, column):
+    """
+    :param row: serialized row
+    :param column: dotted path, e.g. outcomeToken.address
+    :return: the csv value, lists are json encoded
+    """
+    value = row
+    for key in column.split('.'):
+        if not isinstance(value, dict):
+            return ''
+        value = value.get(key)
+    if value is None:
+        return ''
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, cls=JSONEncoder)
+    if isinstance(value, six.text_type):
+        return value.encode('utf-8') if six.PY2 else value
+    return value
+
+
+class Echo(object):
+    """Pseudo buffer, csv writers return the written line"""
+    def write(self, value):
+        return value
+
+
+class ExportMixin(object):
+    """
+    Streams every row of the filtered queryset, without pagination, as newline delimited JSON or, with ?output=csv,
+    as CSV with the csv_columns. Rows are read in chunks of API_EXPORT_CHUNK_SIZE and serialized chunk by chunk, so
+    memory use doesn't grow with the number of rows.
+    """
+    export_name = None
+    export_ordering = ()
+    csv_columns = ()
+
+    def get_rows(self, queryset):
+        chunk_size = getattr(settings, 'API_EXPORT_CHUNK_SIZE', 1000)
+        for chunk in get_chunks(queryset.order_by(*self.export_ordering), chunk_size):
+            for row in self.get_serializer(chunk, many=True).data:
+                yield row
+
+    def get_ndjson_lines(self, queryset):
+        for row in self.get_rows(queryset):
+            yield json.dumps(row, cls=JSONEncoder) + '\n'
+
+    def get_csv_lines(self, queryset):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.csv_columns)
+        for row in self.get_rows(queryset):
+            yield writer.writerow([get_column(row, column) for column in self.csv_columns])
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        output = request.query_params.get('output', 'ndjson')
+        if output == 'ndjson':
+            response = StreamingHttpResponse(self.get_ndjson_lines(queryset), content_type='application/x-ndjson')
+        elif output == 'csv':
+            response = StreamingHttpResponse(self.get_csv_lines(queryset), content_type='text/csv')
+        else:
+            raise ValidationError({'output': 'Must be one of csv, ndjson'})
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(self.export_name, output)
+        return response
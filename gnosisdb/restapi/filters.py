@@ -1,19 +1,107 @@
+from django import forms
+from django.db import connections, router
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import LimitOffsetPagination
-from relationaldb.models import CentralizedOracle, Event, Market, Order
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from relationaldb.models import CentralizedOracle, Event, Market, Order, MarketPriceCandle
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import base64
+import json
 
 
 class DefaultPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination.
+    Views with a cursor_ordering (unique tuple of indexed fields) can also be paginated by keyset, passing ?cursor=
+    (empty for the first page) and then following the next links: no count query and no offset, every page costs
+    the same however deep it is.
+    """
     max_limit = 200
     default_limit = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        self.use_cursor = bool(ordering) and self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super(DefaultPagination, self).paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        fields = [queryset.model._meta.get_field(name) for name in ordering]
+        cursor = self.decode_cursor(request, len(fields))
+        if cursor:
+            # Row comparison, lets PostgreSQL start the scan of the (a, b) index right after the cursor
+            quote_name = connections[router.db_for_read(queryset.model)].ops.quote_name
+            columns = ', '.join(
+                '{}.{}'.format(quote_name(field.model._meta.db_table), quote_name(field.column)) for field in fields
+            )
+            queryset = queryset.extra(
+                where=['({}) > ({})'.format(columns, ', '.join(['%s'] * len(fields)))],
+                params=cursor
+            )
+
+        results = list(queryset.order_by(*ordering)[:self.limit + 1])
+        self.next_cursor = None
+        if len(results) > self.limit:
+            results = results[:self.limit]
+            self.next_cursor = [getattr(results[-1], field.attname) for field in fields]
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super(DefaultPagination, self).get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data)
+        ]))
+
+    def get_next_cursor_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(self.next_cursor))
+
+    def encode_cursor(self, values):
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, length):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != length:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+
+class AnyValueMultipleChoiceField(forms.MultipleChoiceField):
+
+    def valid_value(self, value):
+        return True
+
+
+class AnyValuesMultipleFilter(filters.MultipleChoiceFilter):
+    """
+    AllValuesMultipleFilter without its choices, which are the distinct values of the column and were queried on every
+    request. Any value is accepted, unknown ones just match nothing.
+    """
+    field_class = AnyValueMultipleChoiceField
 
 
 class CentralizedOracleFilter(filters.FilterSet):
-    creator = filters.AllValuesMultipleFilter()
+    creator = AnyValuesMultipleFilter()
     creation_date_time = filters.DateTimeFromToRangeFilter()
     is_outcome_set = filters.BooleanFilter()
-    owner = filters.AllValuesMultipleFilter()
+    owner = AnyValuesMultipleFilter()
     title = filters.CharFilter(name='event_description__title', lookup_expr='contains')
     description = filters.CharFilter(name='event_description__description', lookup_expr='contains')
     resolution_date = filters.DateTimeFromToRangeFilter(name='event_description__resolution_date')
@@ -31,11 +119,11 @@ class CentralizedOracleFilter(filters.FilterSet):
 
 
 class EventFilter(filters.FilterSet):
-    creator = filters.AllValuesMultipleFilter()
+    creator = AnyValuesMultipleFilter()
     creation_date_time = filters.DateTimeFromToRangeFilter()
     is_winning_outcome_set = filters.BooleanFilter()
-    oracle_factory = filters.AllValuesMultipleFilter(name='oracle__factory')
-    oracle_creator = filters.AllValuesMultipleFilter(name='oracle__creator')
+    oracle_factory = AnyValuesMultipleFilter(name='oracle__factory')
+    oracle_creator = AnyValuesMultipleFilter(name='oracle__creator')
     oracle_creation_date_time = filters.DateTimeFromToRangeFilter(name='oracle__creation_date_time')
     oracle_is_outcome_set = filters.BooleanFilter(name='oracle__is_outcome_set')
 
@@ -59,12 +147,11 @@ class AddressInFilter(filters.BaseInFilter, filters.CharFilter):
 class MarketFilter(filters.FilterSet):
     creator = AddressInFilter(lookup_expr='in')
     creation_date_time = filters.DateTimeFromToRangeFilter()
-    market_maker = filters.AllValuesMultipleFilter()
-    event_oracle_factory = filters.AllValuesMultipleFilter(name='event__oracle__factory')
-    event_oracle_creator = filters.AllValuesMultipleFilter(name='event__oracle__creator')
+    market_maker = AnyValuesMultipleFilter()
+    event_oracle_factory = AnyValuesMultipleFilter(name='event__oracle__factory')
+    event_oracle_creator = AnyValuesMultipleFilter(name='event__oracle__creator')
     event_oracle_creation_date_time = filters.DateTimeFromToRangeFilter(name='event__oracle__creation_date_time')
-    # TODO refactor, maybe duplicate resolution_date from event_description to market
-    resolution_date_time = filters.DateTimeFromToRangeFilter(name='event__oracle__centralizedoracle__event_description__resolution_date')
+    resolution_date_time = filters.DateTimeFromToRangeFilter(name='event__summary__resolution_date')
     event_oracle_is_outcome_set = filters.BooleanFilter(name='event__oracle__is_outcome_set')
 
     ordering = filters.OrderingFilter(
@@ -117,3 +204,11 @@ class MarketTradesFilter(filters.FilterSet):
             data['creation_date_time_1'] = datetime.now()
 
         super(MarketTradesFilter, self).__init__(data, *args, **kwargs)
+
+
+class MarketHistoryFilter(filters.FilterSet):
+    date = filters.DateTimeFromToRangeFilter(name='start_date_time')
+
+    class Meta:
+        model = MarketPriceCandle
+        fields = ('date',)
@@ -0,0 +1,15 @@
+from rest_framework import renderers
+from djangorestframework_camel_case.util import camelize
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    The restapi serializers emit camelCase keys already, only error details (e.g. filter validation errors keyed by
+    field name) are camelized
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.exception:
+            data = camelize(data)
+        return super(JSONRenderer, self).render(data, accepted_media_type, renderer_context)
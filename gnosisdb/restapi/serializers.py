@@ -1,52 +1,96 @@
+from collections import OrderedDict
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from djangorestframework_camel_case.util import underscoreToCamel
 from relationaldb.models import (
     ScalarEventDescription, CategoricalEventDescription, OutcomeTokenBalance, OutcomeToken,
-    CentralizedOracle, Market, Order, ScalarEvent, CategoricalEvent, BuyOrder
+    CentralizedOracle, Market, Order, ScalarEvent, CategoricalEvent, BuyOrder, MarketPriceCandle, Event, EventSummary
 )
-from gnosisdb.utils import remove_null_values, add_0x_prefix, get_order_type, get_order_cost, get_order_profit
-from django.db.models import Sum
+from gnosisdb.utils import add_0x_prefix, get_order_type, get_order_cost, get_order_profit
+from django.db.models import Manager, Sum
+import re
 
+camel_case_regex = re.compile(r'[a-z]_[a-z]')  # the one djangorestframework_camel_case uses
+
+
+def camel_case(name):
+    return camel_case_regex.sub(underscoreToCamel, name)
+
+
+def without_nulls(items):
+    """
+    :param items: (key, value) pairs
+    :return: dictionary of the pairs whose value isn't None
+    """
+    return OrderedDict((key, value) for key, value in items if value is not None)
+
+
+class CompiledSerializerMixin(object):
+    """
+    Read API serialization. The readable fields are compiled once per serializer instance (once per page for list
+    serializers) into (camelCase key, field) pairs. If skip_nulls is set, None values are left out as they are
+    emitted, so the output is never walked again to drop nulls or to camelize its keys.
+    """
+    skip_nulls = True
+    _plan = None
+
+    def get_plan(self):
+        if self._plan is None:
+            self._plan = [(camel_case(field.field_name), field) for field in self._readable_fields]
+        return self._plan
 
-class ContractSerializer(serializers.BaseSerializer):
     def to_representation(self, instance):
-        response = {
-            'address': add_0x_prefix(instance.address),
-            'factory_address': add_0x_prefix(instance.factory),
-            'creator': add_0x_prefix(instance.creator),
-            'creation_date': instance.creation_date_time,
-            'creation_block': instance.creation_block
-        }
+        result = OrderedDict()
+        for key, field in self.get_plan():
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            value = None if check_for_none is None else field.to_representation(attribute)
+            if value is not None or not self.skip_nulls:
+                result[key] = value
+        return result
 
-        return remove_null_values(response)
+
+class ContractSerializer(serializers.BaseSerializer):
+    def to_representation(self, instance):
+        return without_nulls((
+            ('address', add_0x_prefix(instance.address)),
+            ('factoryAddress', add_0x_prefix(instance.factory)),
+            ('creator', add_0x_prefix(instance.creator)),
+            ('creationDate', instance.creation_date_time),
+            ('creationBlock', instance.creation_block),
+        ))
 
 
 class EventDescriptionSerializer(serializers.BaseSerializer):
     def to_representation(self, instance):
-        result = {
-            'title': instance.title,
-            'description': instance.description,
-            'resolution_date': instance.resolution_date,
-            'ipfs_hash': instance.ipfs_hash
-        }
+        items = [
+            ('title', instance.title),
+            ('description', instance.description),
+            ('resolutionDate', instance.resolution_date),
+            ('ipfsHash', instance.ipfs_hash),
+        ]
         if isinstance(instance, ScalarEventDescription):
             scalar_event = instance
-            result['unit'] = scalar_event.unit
-            result['decimals'] = scalar_event.decimals
-            return remove_null_values(result)
         elif isinstance(instance, CategoricalEventDescription):
+            scalar_event = None
             categorical_event = instance
-            result['outcomes'] = categorical_event.outcomes
-            return remove_null_values(result)
-        try:
-            scalar_event = instance.scalareventdescription
-            result['unit'] = scalar_event.unit
-            result['decimals'] = scalar_event.decimals
-        except:
-            categorical_event = instance.categoricaleventdescription
-            result['outcomes'] = categorical_event.outcomes
-
-        return remove_null_values(result)
+        else:
+            try:
+                scalar_event = instance.scalareventdescription
+            except:
+                scalar_event = None
+                categorical_event = instance.categoricaleventdescription
+
+        if scalar_event is not None:
+            items.extend((('unit', scalar_event.unit), ('decimals', scalar_event.decimals)))
+        else:
+            items.append(('outcomes', categorical_event.outcomes))
+        return without_nulls(items)
 
 
 class OracleSerializer(serializers.Serializer):
@@ -56,11 +100,13 @@ class OracleSerializer(serializers.Serializer):
             centralized_oracle = instance
         else:
             centralized_oracle = instance.centralizedoracle
-        response = CentralizedOracleSerializer(centralized_oracle).to_representation(centralized_oracle)
-        return remove_null_values(response)
+        # Reused for every row, its fields are built once
+        if not hasattr(self, '_oracle_serializer'):
+            self._oracle_serializer = CentralizedOracleSerializer()
+        return self._oracle_serializer.to_representation(centralized_oracle)
 
 
-class CentralizedOracleSerializer(serializers.ModelSerializer):
+class CentralizedOracleSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     contract = ContractSerializer(source='*', many=False, read_only=True)
     is_outcome_set = serializers.BooleanField()
     outcome = serializers.IntegerField()
@@ -78,8 +124,7 @@ class CentralizedOracleSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         # Prepend 0x prefix to owner
         instance.owner = add_0x_prefix(instance.owner)
-        response = super(CentralizedOracleSerializer, self).to_representation(instance)
-        return remove_null_values(response)
+        return super(CentralizedOracleSerializer, self).to_representation(instance)
 
     def get_owner(self, obj):
         return add_0x_prefix(obj)
@@ -88,7 +133,7 @@ class CentralizedOracleSerializer(serializers.ModelSerializer):
         return 'CENTRALIZED'
 
 
-class CategoricalEventSerializer(serializers.ModelSerializer):
+class CategoricalEventSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     contract = ContractSerializer(source='*', many=False, read_only=True)
     oracle = OracleSerializer()
     type = serializers.SerializerMethodField()
@@ -100,7 +145,7 @@ class CategoricalEventSerializer(serializers.ModelSerializer):
         return 'CATEGORICAL'
 
 
-class ScalarEventSerializer(serializers.ModelSerializer):
+class ScalarEventSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     contract = ContractSerializer(source='*', many=False, read_only=True)
     oracle = OracleSerializer()
     type = serializers.SerializerMethodField()
@@ -114,20 +159,72 @@ class ScalarEventSerializer(serializers.ModelSerializer):
         return 'SCALAR'
 
 
+def get_summary_event(event):
+    """
+    Builds the Categorical/ScalarEvent of event, with its oracle and description, from its EventSummary.
+    The instances aren't saved, they let the serializers render events loaded without the polymorphic joins.
+    :raise EventSummary.DoesNotExist
+    """
+    summary = event.summary
+    if summary.title is None:
+        event_description = None
+    elif summary.unit is not None:
+        event_description = ScalarEventDescription(unit=summary.unit, decimals=summary.decimals)
+    else:
+        event_description = CategoricalEventDescription(outcomes=summary.outcomes)
+    if event_description:
+        event_description.title = summary.title
+        event_description.description = summary.description
+        event_description.resolution_date = summary.resolution_date
+        event_description.ipfs_hash = summary.ipfs_hash
+
+    oracle = CentralizedOracle(
+        address=event.oracle_id,
+        factory=summary.oracle_factory,
+        creator=summary.oracle_creator,
+        creation_date_time=summary.oracle_creation_date_time,
+        creation_block=summary.oracle_creation_block,
+        is_outcome_set=summary.oracle_is_outcome_set,
+        outcome=summary.oracle_outcome,
+        owner=summary.oracle_owner,
+        event_description=event_description
+    )
+
+    fields = dict((field.attname, getattr(event, field.attname)) for field in Event._meta.concrete_fields)
+    if summary.event_type == 'SCALAR':
+        summary_event = ScalarEvent(lower_bound=summary.lower_bound, upper_bound=summary.upper_bound, **fields)
+    else:
+        summary_event = CategoricalEvent(**fields)
+    summary_event.oracle = oracle
+    return summary_event
+
+
 class EventSerializer(serializers.Serializer):
 
+    def get_event_serializer(self, serializer_class):
+        # Reused for every row, their fields are built once
+        if not hasattr(self, '_event_serializers'):
+            self._event_serializers = {}
+        if serializer_class not in self._event_serializers:
+            self._event_serializers[serializer_class] = serializer_class()
+        return self._event_serializers[serializer_class]
+
     def to_representation(self, instance):
         try:
-            categorical_event = instance.categoricalevent
-            result = CategoricalEventSerializer(categorical_event).to_representation(categorical_event)
-            return remove_null_values(result)
-        except:
-            scalar_event = instance.scalarevent
-            result = ScalarEventSerializer(scalar_event).to_representation(scalar_event)
-            return remove_null_values(result)
+            # Views select the summary along with the event
+            event = get_summary_event(instance)
+        except EventSummary.DoesNotExist:
+            try:
+                event = instance.categoricalevent
+            except:
+                event = instance.scalarevent
 
+        if isinstance(event, ScalarEvent):
+            return self.get_event_serializer(ScalarEventSerializer).to_representation(event)
+        return self.get_event_serializer(CategoricalEventSerializer).to_representation(event)
 
-class MarketSerializer(serializers.ModelSerializer):
+
+class MarketSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     contract = ContractSerializer(source='*', many=False, read_only=True)
     event = EventSerializer(many=False, read_only=True)
     market_maker = serializers.CharField()
@@ -145,22 +242,19 @@ class MarketSerializer(serializers.ModelSerializer):
         fields = ('contract', 'event', 'market_maker', 'fee', 'funding', 'net_outcome_tokens_sold',
                   'stage', 'trading_volume', 'withdrawn_fees', 'collected_fees', 'marginal_prices',)
 
-    def to_representation(self, instance):
-        response = super(MarketSerializer, self).to_representation(instance)
-        return remove_null_values(response)
-
     def get_market_maker(self, obj):
         return add_0x_prefix(obj)
 
 
-class OutcomeTokenSerializer(serializers.ModelSerializer):
+class OutcomeTokenSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
+    skip_nulls = False
     totalSupply = serializers.DecimalField(source="total_supply", max_digits=80, decimal_places=0)
     class Meta:
         model = OutcomeToken
         fields = ('event', 'index', 'totalSupply', 'address')
 
 
-class MarketTradesSerializer(serializers.ModelSerializer):
+class MarketTradesSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     """Serializes the list of orders (trades) for the given market"""
     date = serializers.DateTimeField(source="creation_date_time", read_only=True)
     net_outcome_tokens_sold = serializers.ListField(
@@ -197,12 +291,8 @@ class MarketTradesSerializer(serializers.ModelSerializer):
         except CentralizedOracle.DoesNotExist:
             return {}
 
-    def to_representation(self, instance):
-        response = super(MarketTradesSerializer, self).to_representation(instance)
-        return remove_null_values(response)
-
 
-class MarketParticipantTradesSerializer(serializers.ModelSerializer):
+class MarketParticipantTradesSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     """Serializes the list of orders (trades) for the given sender address and market"""
     date = serializers.DateTimeField(source="creation_date_time", read_only=True)
     # net_outcome_tokens_sold = serializers.ListField(
@@ -221,7 +311,7 @@ class MarketParticipantTradesSerializer(serializers.ModelSerializer):
         fields = ('date', 'outcome_token', 'outcome_token_count', 'market', 'owner', 'order_type', 'profit', 'cost', 'marginal_prices', )
 
     def get_market(self, obj):
-        return add_0x_prefix(obj.market.address)
+        return add_0x_prefix(obj.market_id)
 
     def get_owner(self, obj):
         return add_0x_prefix(obj.sender)
@@ -235,12 +325,41 @@ class MarketParticipantTradesSerializer(serializers.ModelSerializer):
     def get_profit(self, obj):
         return str(get_order_profit(obj))
 
-    def to_representation(self, instance):
-        response = super(MarketParticipantTradesSerializer, self).to_representation(instance)
-        return remove_null_values(response)
 
+class MarketPriceCandleSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
+    """Serializes the price candles of a market, prices and volumes are indexed by outcome"""
+    skip_nulls = False
+    date = serializers.DateTimeField(source="start_date_time", read_only=True)
+    resolution = serializers.CharField(source="get_resolution_display", read_only=True)
+    open_prices = serializers.ListField(child=serializers.DecimalField(max_digits=5, decimal_places=4))
+    high_prices = serializers.ListField(child=serializers.DecimalField(max_digits=5, decimal_places=4))
+    low_prices = serializers.ListField(child=serializers.DecimalField(max_digits=5, decimal_places=4))
+    close_prices = serializers.ListField(child=serializers.DecimalField(max_digits=5, decimal_places=4))
+    volumes = serializers.ListField(child=serializers.DecimalField(max_digits=80, decimal_places=0))
 
-class OutcomeTokenBalanceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MarketPriceCandle
+        fields = ('date', 'resolution', 'open_prices', 'high_prices', 'low_prices', 'close_prices', 'volumes',
+                  'orders',)
+
+
+class OutcomeTokenBalanceListSerializer(serializers.ListSerializer):
+    """Loads the markets of every balance in the page with one query, instead of one query per balance"""
+
+    def to_representation(self, data):
+        balances = list(data.all() if isinstance(data, Manager) else data)
+        event_addresses = set(balance.outcome_token.event_id for balance in balances)
+        markets = {}
+        # The first market created for the event prices its outcome tokens
+        for market in Market.objects.filter(event__in=event_addresses).only(
+                'event', 'marginal_prices').order_by('creation_date_time', 'address'):
+            markets.setdefault(market.event_id, market)
+        self.child.markets = markets
+        return super(OutcomeTokenBalanceListSerializer, self).to_representation(balances)
+
+
+class OutcomeTokenBalanceSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
+    skip_nulls = False
 
     outcome_token = OutcomeTokenSerializer()
     event_description = serializers.SerializerMethodField()
@@ -249,6 +368,9 @@ class OutcomeTokenBalanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = OutcomeTokenBalance
         fields = ('outcome_token', 'owner', 'balance', 'event_description', 'marginal_price', )
+        list_serializer_class = OutcomeTokenBalanceListSerializer
+
+    markets = None  # event address -> Market, set by OutcomeTokenBalanceListSerializer
 
     def get_event_description(self, obj):
         try:
@@ -259,4 +381,10 @@ class OutcomeTokenBalanceSerializer(serializers.ModelSerializer):
             return {}
 
     def get_marginal_price(self, obj):
-        return obj.outcome_token.event.markets.all()[0].marginal_prices[obj.outcome_token.index]
+        if self.markets is None:
+            market = obj.outcome_token.event.markets.order_by('creation_date_time', 'address').first()
+        else:
+            market = self.markets.get(obj.outcome_token.event_id)
+        if market is None:
+            return None
+        return market.marginal_prices[obj.outcome_token.index]
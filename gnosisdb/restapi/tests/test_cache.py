@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django_eth_events.models import Daemon
+from relationaldb.tests.factories import MarketFactory
+from relationaldb.models import CentralizedOracle, Market
+from restapi.cache import ResponseCache
+from gnosisdb.utils import add_0x_prefix
+import json
+
+
+def run_commit_hooks():
+    """
+    Runs the on_commit callbacks registered so far, tests never commit their transaction
+    """
+    callbacks = connection.run_on_commit
+    connection.run_on_commit = []
+    for _, callback in callbacks:
+        callback()
+
+
+class TestResponseCache(APITestCase):
+
+    def setUp(self):
+        ResponseCache().clear()
+
+    def get_market(self, market):
+        url = reverse('api:markets-by-name', kwargs={'market_address': market.address})
+        response = self.client.get(url, content_type='application/json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)
+
+    def test_market_detail_cache(self):
+        market = MarketFactory(stage=0)
+        self.assertEquals(self.get_market(market).get('stage'), 0)
+
+        # Only the daemon and the hash of its block are read, in one query
+        with self.assertNumQueries(1):
+            self.assertEquals(self.get_market(market).get('stage'), 0)
+
+        # Receivers save the market, the response is only invalidated on commit
+        market.stage = 1
+        market.save()
+        self.assertEquals(self.get_market(market).get('stage'), 0)
+        run_commit_hooks()
+        self.assertEquals(self.get_market(market).get('stage'), 1)
+
+        # Changes made by another process reach this process memory with the next block
+        Market.objects.filter(address=market.address).update(stage=2)
+        self.assertEquals(self.get_market(market).get('stage'), 1)
+        daemon = Daemon.get_solo()
+        daemon.block_number += 1
+        daemon.save()
+        self.assertEquals(self.get_market(market).get('stage'), 2)
+
+    def test_oracle_invalidates_market(self):
+        market = MarketFactory()
+        self.get_market(market)
+
+        oracle = CentralizedOracle.objects.get(address=market.event.oracle_id)
+        oracle.owner = '{:040d}'.format(1000)
+        oracle.save()
+        run_commit_hooks()
+        self.assertEquals(self.get_market(market).get('event').get('oracle').get('owner'), add_0x_prefix(oracle.owner))
+
+        url = reverse('api:centralized-oracles-by-address', kwargs={'oracle_address': oracle.address})
+        self.client.get(url, content_type='application/json')
+        oracle.delete()
+        run_commit_hooks()
+        response = self.client.get(url, content_type='application/json')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_shared_cache_block(self):
+        cache = ResponseCache()
+        shared_cache = cache.shared_cache
+        cache.shared_cache = LocMemCache('restapi-test', {})
+        self.addCleanup(setattr, cache, 'shared_cache', shared_cache)
+        address = '{:040d}'.format(1)
+
+        cache.set('market', address, 1, {'stage': 0})
+        cache.memory_cache.clear()
+        self.assertDictEqual(cache.get('market', address, 1), {'stage': 0})
+        # Cached by another process while the previous block was current
+        cache.memory_cache.clear()
+        self.assertIsNone(cache.get('market', address, 2))
@@ -1,20 +1,30 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, absolute_import
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.response import Response
 from relationaldb.tests.factories import (
-    CentralizedOracleFactory, BuyOrderFactory, MarketFactory,
-    CategoricalEventFactory, OutcomeTokenFactory, OutcomeTokenBalanceFactory
+    CentralizedOracleFactory, BuyOrderFactory, SellOrderFactory, MarketFactory,
+    CategoricalEventFactory, OutcomeTokenFactory, OutcomeTokenBalanceFactory, ScalarEventFactory,
+    ScalarEventDescriptionFactory
 )
-from relationaldb.models import CentralizedOracle, Market, ShortSellOrder
+from django_eth_events.models import Block, Daemon
+from relationaldb.models import CentralizedOracle, Market, ShortSellOrder, MarketPriceCandle, EventSummary
 from datetime import datetime, timedelta
 from gnosisdb.utils import add_0x_prefix
+from restapi.renderers import JSONRenderer
 import json
 
 
 class TestViews(APITestCase):
 
+    def setUp(self):
+        # Every response reads the daemon block number
+        self.daemon = Daemon.get_solo()
+
     def test_centralized_oracle(self):
         # test empty centralized-oracles response
         empty_centralized_response = self.client.get(reverse('api:centralized-oracles'), content_type='application/json')
@@ -82,6 +92,81 @@ class TestViews(APITestCase):
         self.assertEquals(market_search_response.status_code, status.HTTP_200_OK)
         self.assertEquals(json.loads(market_search_response.content).get('contract').get('address'), add_0x_prefix(markets[0].address))
 
+    def test_markets_representation(self):
+        market = MarketFactory(funding=None)
+        response = self.client.get(reverse('api:markets-by-name', kwargs={'market_address': market.address}),
+                                   content_type='application/json')
+        result = json.loads(response.content)
+        # Serializers emit camelCase keys and skip null values
+        self.assertNotIn('funding', result)
+        self.assertEquals(result.get('contract').get('factoryAddress'), add_0x_prefix(market.factory))
+        self.assertEquals(result.get('event').get('oracle').get('isOutcomeSet'), False)
+        self.assertIn('resolutionDate', result.get('event').get('oracle').get('eventDescription'))
+
+        # Error details are camelized by the renderer
+        error = JSONRenderer().render({'creation_date_time': ['Enter a valid date/time.']},
+                                      renderer_context={'response': Response(exception=True)})
+        self.assertIn('creationDateTime', json.loads(error))
+
+    def test_markets_cursor_pagination(self):
+        markets = [MarketFactory() for x in range(0, 5)]
+        url = reverse('api:markets') + '?cursor=&limit=2'
+        addresses = []
+        pages = 0
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, content_type='application/json')
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            # no count query
+            self.assertFalse([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+            data = json.loads(response.content)
+            self.assertNotIn('count', data)
+            addresses.extend(result.get('contract').get('address') for result in data.get('results'))
+            url = data.get('next')
+            pages += 1
+
+        self.assertEquals(pages, 3)
+        sorted_markets = sorted(markets, key=lambda market: (market.creation_block, market.address))
+        self.assertListEqual(addresses, [add_0x_prefix(market.address) for market in sorted_markets])
+
+        response = self.client.get(reverse('api:markets') + '?cursor=invalid', content_type='application/json')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Limit/offset stays the default
+        response = self.client.get(reverse('api:markets'), content_type='application/json')
+        self.assertEquals(json.loads(response.content).get('count'), 5)
+
+    def test_markets_event_summary(self):
+        MarketFactory()
+        scalar_oracle = CentralizedOracleFactory(event_description=ScalarEventDescriptionFactory())
+        MarketFactory(event=ScalarEventFactory(oracle=scalar_oracle))
+
+        def get_results(url):
+            response = self.client.get(url, content_type='application/json')
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            return sorted(json.loads(response.content).get('results'), key=lambda result: result.get('contract').get('address'))
+
+        # daemon, count, markets with their event summary
+        with self.assertNumQueries(3):
+            markets = get_results(reverse('api:markets'))
+        # daemon, count, events with their summary
+        with self.assertNumQueries(3):
+            events = get_results(reverse('api:events'))
+        self.assertEquals(len(markets), 2)
+        self.assertEquals(set(market.get('event').get('type') for market in markets), {'CATEGORICAL', 'SCALAR'})
+
+        # Same output as going through the oracle and description tables
+        EventSummary.objects.all().delete()
+        self.assertEquals(markets, get_results(reverse('api:markets')))
+        self.assertEquals(events, get_results(reverse('api:events')))
+
+        # Multiple value filters don't query the distinct values of their columns
+        market_maker = Market.objects.first().market_maker
+        with self.assertNumQueries(3):
+            filtered_markets = get_results(reverse('api:markets') + '?market_maker=' + market_maker)
+        self.assertEquals(len(filtered_markets), 1)
+        self.assertEquals(get_results(reverse('api:markets') + '?market_maker=' + '{:040d}'.format(999)), [])
+
     def test_markets_by_resolution_date(self):
         # test empty events response
         empty_markets_response = self.client.get(reverse('api:markets'), content_type='application/json')
@@ -197,6 +282,37 @@ class TestViews(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_200_OK)
         self.assertEquals(len(json.loads(response.content).get('results')), 1)
 
+    def test_shares_queries(self):
+        account = '{:040d}'.format(13)
+        markets = [MarketFactory(marginal_prices=['0.2500', '0.7500']) for x in range(0, 5)]
+        for market in markets:
+            for index in range(0, 2):
+                outcome_token = OutcomeTokenFactory(event=market.event, index=index)
+                OutcomeTokenBalanceFactory(owner=account, outcome_token=outcome_token)
+                OutcomeTokenBalanceFactory(owner='{:040d}'.format(14), outcome_token=outcome_token)
+
+        # The marginal prices come from one markets query, whatever the page size
+        # daemon, count, balances, markets
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('api:shares-by-account', kwargs={'account_address': account}),
+                                       content_type='application/json')
+        results = json.loads(response.content).get('results')
+        self.assertEquals(len(results), 10)
+        for result in results:
+            self.assertEquals(float(result.get('marginalPrice')), [0.25, 0.75][result.get('outcomeToken').get('index')])
+
+        # daemon, count, balances, markets
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('api:all-shares', kwargs={'market_address': markets[0].address}),
+                                       content_type='application/json')
+        self.assertEquals(len(json.loads(response.content).get('results')), 4)
+
+        with self.assertNumQueries(6):
+            response = self.client.get(
+                reverse('api:shares-by-owner', kwargs={'market_address': markets[0].address, 'owner_address': account}),
+                content_type='application/json')
+        self.assertEquals(len(json.loads(response.content).get('results')), 2)
+
     def test_market_trades(self):
         url = reverse('api:trades-by-market', kwargs={'market_address': '{:040d}'.format(1000)})
         trades_response = self.client.get(url, content_type='application/json')
@@ -258,6 +374,106 @@ class TestViews(APITestCase):
         self.assertEquals(trades_response.status_code, status.HTTP_200_OK)
         self.assertEquals(len(json.loads(trades_response.content).get('results')), 1)
 
+    def test_market_trades_queries(self):
+        market = MarketFactory()
+        outcome_token = OutcomeTokenFactory(event=market.event)
+        sender = '{:040d}'.format(100)
+        for x in range(0, 5):
+            BuyOrderFactory(market=market, outcome_token=outcome_token, sender=sender, cost=10)
+            SellOrderFactory(market=market, outcome_token=outcome_token, sender=sender, profit=5)
+
+        # Order type, cost and profit are read from the order table, no child table lookups
+        # daemon, market, count, orders
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('api:trades-by-market', kwargs={'market_address': market.address}),
+                                       content_type='application/json')
+        results = json.loads(response.content).get('results')
+        self.assertEquals(len(results), 10)
+        for result in results:
+            if result.get('orderType') == 'BUY':
+                self.assertEquals(result.get('cost'), '10')
+            else:
+                self.assertEquals(result.get('orderType'), 'SELL')
+                self.assertEquals(result.get('profit'), '5')
+
+        # daemon, count, orders
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse('api:trades-by-owner', kwargs={'market_address': market.address, 'owner_address': sender}),
+                content_type='application/json')
+        self.assertEquals(len(json.loads(response.content).get('results')), 10)
+
+    def test_conditional_get(self):
+        market = MarketFactory()
+        url = reverse('api:markets-by-name', kwargs={'market_address': market.address})
+        response = self.client.get(url, content_type='application/json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"{}-'.format(self.daemon.block_number)))
+
+        # Only the daemon and the hash of its block are read, in one query
+        with self.assertNumQueries(1):
+            response = self.client.get(url, content_type='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEquals(response['ETag'], etag)
+        self.assertEquals(response.content, b'')
+
+        # List views and factories share the validators
+        for list_url in [reverse('api:markets'), reverse('api:factories')]:
+            response = self.client.get(list_url, content_type='application/json', HTTP_IF_NONE_MATCH=etag)
+            self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A new block changes the ETag
+        self.daemon.block_number += 1
+        self.daemon.save()
+        response = self.client.get(url, content_type='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(response['ETag'], etag)
+
+        # So does a reorganization replacing the block with another one of the same number
+        Block.objects.create(block_number=self.daemon.block_number, block_hash='{:064d}'.format(1), timestamp=0)
+        etag = self.client.get(url, content_type='application/json')['ETag']
+        Block.objects.filter(block_number=self.daemon.block_number).delete()
+        Block.objects.create(block_number=self.daemon.block_number, block_hash='{:064d}'.format(2), timestamp=0)
+        response = self.client.get(url, content_type='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(response['ETag'], etag)
+
+    def test_exports(self):
+        markets = [MarketFactory() for x in range(0, 3)]
+        outcome_token = OutcomeTokenFactory(event=markets[0].event)
+        for x in range(0, 3):
+            BuyOrderFactory(market=markets[0], outcome_token=outcome_token, cost=10)
+            OutcomeTokenBalanceFactory(outcome_token=outcome_token)
+        BuyOrderFactory(market=markets[1], outcome_token=OutcomeTokenFactory(event=markets[1].event))
+
+        def get_content(url):
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            return b''.join(response.streaming_content).decode('utf-8')
+
+        with self.settings(API_EXPORT_CHUNK_SIZE=2):
+            lines = get_content(reverse('api:markets-export')).splitlines()
+            self.assertListEqual(
+                [json.loads(line).get('contract').get('address') for line in lines],
+                [add_0x_prefix(market.address) for market in sorted(markets, key=lambda market: (market.creation_block, market.address))]
+            )
+
+            lines = get_content(reverse('api:trades-export-by-market', kwargs={'market_address': markets[0].address})).splitlines()
+            self.assertEquals(len(lines), 3)
+            self.assertEquals(json.loads(lines[0]).get('orderType'), 'BUY')
+            self.assertEquals(len(get_content(reverse('api:trades-export')).splitlines()), 4)
+
+            lines = get_content(reverse('api:shares-export-by-market', kwargs={'market_address': markets[0].address}) + '?output=csv').splitlines()
+            self.assertEquals(lines[0], 'owner,outcomeToken.address,outcomeToken.index,balance,marginalPrice')
+            self.assertEquals(len(lines), 4)
+
+        response = self.client.get(reverse('api:markets-export') + '?output=xml')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('api:trades-export-by-market', kwargs={'market_address': '{:040d}'.format(1000)}))
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_market_trades_unknown_market(self):
         market = MarketFactory()
         url = reverse('api:trades-by-market', kwargs={'market_address': market.address})
@@ -291,6 +507,51 @@ class TestViews(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_200_OK)
         self.assertEquals(len(json.loads(response.content).get('results')), 2)
 
+    def test_market_history(self):
+        url = reverse('api:history-by-market', kwargs={'market_address': '{:040d}'.format(1000)})
+        history_response = self.client.get(url, content_type='application/json')
+        self.assertEquals(history_response.status_code, status.HTTP_404_NOT_FOUND)
+
+        market = MarketFactory()
+        outcome_token = OutcomeTokenFactory(event=market.event, index=1)
+        creation_date_time = datetime(2017, 12, 1, 10, 30)
+        orders = [
+            BuyOrderFactory(market=market, outcome_token=outcome_token, outcome_token_count=10,
+                            creation_date_time=creation_date_time, marginal_prices=['0.4000', '0.6000']),
+            BuyOrderFactory(market=market, outcome_token=outcome_token, outcome_token_count=20,
+                            creation_date_time=creation_date_time + timedelta(minutes=1),
+                            marginal_prices=['0.3000', '0.7000']),
+            BuyOrderFactory(market=market, outcome_token=outcome_token, outcome_token_count=5,
+                            creation_date_time=creation_date_time + timedelta(minutes=2),
+                            marginal_prices=['0.3500', '0.6500']),
+        ]
+        MarketPriceCandle.objects.add_orders(orders)
+
+        url = reverse('api:history-by-market', kwargs={'market_address': market.address})
+        history_response = self.client.get(url, content_type='application/json')
+        self.assertEquals(history_response.status_code, status.HTTP_200_OK)
+        candles = json.loads(history_response.content).get('results')
+        self.assertEquals(len(candles), 1)
+        self.assertEquals(candles[0].get('resolution'), '1h')
+        self.assertEquals(candles[0].get('openPrices'), ['0.4000', '0.6000'])
+        self.assertEquals(candles[0].get('highPrices'), ['0.4000', '0.7000'])
+        self.assertEquals(candles[0].get('lowPrices'), ['0.3000', '0.6000'])
+        self.assertEquals(candles[0].get('closePrices'), ['0.3500', '0.6500'])
+        self.assertEquals(candles[0].get('volumes'), ['0', '35'])
+        self.assertEquals(candles[0].get('orders'), 3)
+
+        history_response = self.client.get(url + '?resolution=1m', content_type='application/json')
+        candles = json.loads(history_response.content).get('results')
+        self.assertEquals(len(candles), 3)
+        self.assertEquals(candles[1].get('closePrices'), ['0.3000', '0.7000'])
+
+        from_date = (creation_date_time + timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S')
+        history_response = self.client.get(url + '?resolution=1m&date_0=' + from_date, content_type='application/json')
+        self.assertEquals(len(json.loads(history_response.content).get('results')), 2)
+
+        history_response = self.client.get(url + '?resolution=1w', content_type='application/json')
+        self.assertEquals(history_response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_trades_by_account(self):
         account1 = '{:040d}'.format(13)
         account2 = '{:040d}'.format(14)
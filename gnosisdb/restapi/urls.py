@@ -10,12 +10,17 @@ urlpatterns = [
     url(r'^events/$', views.EventListView.as_view(), name='events'),
     url(r'^events/(0x)?(?P<event_address>[a-fA-F0-9]+)/$', views.EventFetchView.as_view(), name='events-by-address'),
     url(r'^markets/$', views.MarketListView.as_view(), name='markets'),
+    url(r'^markets/export/$', views.MarketExportView.as_view(), name='markets-export'),
     url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/$', views.MarketFetchView.as_view(), name='markets-by-name'),
     url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/shares/$', views.AllMarketSharesView.as_view(), name='all-shares'),
+    url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/shares/export/$', views.MarketSharesExportView.as_view(), name='shares-export-by-market'),
     url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/shares/(0x)?(?P<owner_address>[a-fA-F0-9]+)/$', views.MarketSharesView.as_view(), name='shares-by-owner'),
     url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/trades/$', views.MarketTradesView.as_view(), name='trades-by-market'),
+    url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/trades/export/$', views.MarketTradesExportView.as_view(), name='trades-export-by-market'),
     url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/trades/(0x)?(?P<owner_address>[a-fA-F0-9]+)/$', views.MarketParticipantTradesView.as_view(), name='trades-by-owner'),
+    url(r'^markets/(0x)?(?P<market_address>[a-fA-F0-9]+)/history/$', views.MarketHistoryView.as_view(), name='history-by-market'),
     url(r'^account/(0x)?(?P<account_address>[a-fA-F0-9]+)/trades/$', views.AccountTradesView.as_view(), name='trades-by-account'),
     url(r'^account/(0x)?(?P<account_address>[a-fA-F0-9]+)/shares/$', views.AccountSharesView.as_view(), name='shares-by-account'),
+    url(r'^trades/export/$', views.TradesExportView.as_view(), name='trades-export'),
     url(r'^factories/$', views.factories_view, name='factories'),
 ]
@@ -2,24 +2,30 @@ from django.conf import settings
 from django.shortcuts import get_object_or_404, get_list_or_404
 from rest_framework import generics
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from relationaldb.models import (
-    CentralizedOracle, Event, Market, Order, OutcomeTokenBalance
+    CentralizedOracle, Event, Market, Order, OutcomeTokenBalance, MarketPriceCandle
 )
 from .serializers import (
     CentralizedOracleSerializer, EventSerializer, MarketSerializer,
-    MarketTradesSerializer, OutcomeTokenBalanceSerializer, MarketParticipantTradesSerializer
+    MarketTradesSerializer, OutcomeTokenBalanceSerializer, MarketParticipantTradesSerializer,
+    MarketPriceCandleSerializer
 )
+# Imported by its top level name like the signal receivers, ResponseCache is a per module singleton
+from restapi.cache import ResponseCache, ConditionalGetMixin, block_conditional, get_block_tag
+from .exports import ExportMixin
 from .filters import (
     CentralizedOracleFilter, EventFilter, MarketFilter, DefaultPagination,
-    MarketTradesFilter
+    MarketTradesFilter, MarketHistoryFilter
 )
 
 
-class CentralizedOracleListView(generics.ListAPIView):
+class CentralizedOracleListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CentralizedOracleSerializer
     filter_class = CentralizedOracleFilter
     pagination_class = DefaultPagination
+    cursor_ordering = ('creation_block', 'address')
 
     def get_queryset(self):
         queryset = CentralizedOracle.objects.all().select_related(
@@ -30,90 +36,90 @@ class CentralizedOracleListView(generics.ListAPIView):
         return queryset
 
 
-class CentralizedOracleFetchView(generics.RetrieveAPIView):
+class CachedRetrieveMixin(object):
+    """
+    Serves the serialized object from the ResponseCache, keyed by cache_name and the address in the url
+    """
+    cache_name = None
+    cache_address_kwarg = None
+
+    def retrieve(self, request, *args, **kwargs):
+        address = self.kwargs[self.cache_address_kwarg]
+        # Read before the object, a block processed meanwhile must not be cached with the previous block
+        block_tag = get_block_tag(request)
+        data = ResponseCache().get(self.cache_name, address, block_tag)
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            ResponseCache().set(self.cache_name, address, block_tag, data)
+        return Response(data)
+
+
+class CentralizedOracleFetchView(ConditionalGetMixin, CachedRetrieveMixin, generics.RetrieveAPIView):
     queryset = CentralizedOracle.objects.all()
     serializer_class = CentralizedOracleSerializer
+    cache_name = 'oracle'
+    cache_address_kwarg = 'oracle_address'
 
     def get_object(self):
-        return get_object_or_404(CentralizedOracle, address=self.kwargs['oracle_address'])
+        return get_object_or_404(
+            CentralizedOracle.objects.select_related(
+                'event_description',
+                'event_description__categoricaleventdescription',
+                'event_description__scalareventdescription'
+            ),
+            address=self.kwargs['oracle_address']
+        )
 
 
-class EventListView(generics.ListAPIView):
+class EventListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = EventSerializer
     filter_class = EventFilter
     pagination_class = DefaultPagination
+    cursor_ordering = ('creation_block', 'address')
 
     def get_queryset(self):
-        queryset = Event.objects.all().select_related(
-            'oracle',
-            'scalarevent',
-            'scalarevent__oracle',
-            'scalarevent__oracle__centralizedoracle',
-            'scalarevent__oracle__centralizedoracle__event_description',
-            'scalarevent__oracle__centralizedoracle__event_description__categoricaleventdescription',
-            'scalarevent__oracle__centralizedoracle__event_description__scalareventdescription',
-            'categoricalevent',
-            'categoricalevent__oracle',
-            'categoricalevent__oracle__centralizedoracle',
-            'categoricalevent__oracle__centralizedoracle__event_description',
-            'categoricalevent__oracle__centralizedoracle__event_description__categoricaleventdescription',
-            'categoricalevent__oracle__centralizedoracle__event_description__scalareventdescription',
-            'oracle__centralizedoracle',
-            'oracle__centralizedoracle__event_description',
-            'oracle__centralizedoracle__event_description__categoricaleventdescription',
-            'oracle__centralizedoracle__event_description__scalareventdescription',
-        )
+        # Oracle and description come from the flattened summary, see relationaldb.models.EventSummary
+        queryset = Event.objects.all().select_related('summary')
         return queryset
 
 
-class EventFetchView(generics.RetrieveAPIView):
+class EventFetchView(ConditionalGetMixin, CachedRetrieveMixin, generics.RetrieveAPIView):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
+    cache_name = 'event'
+    cache_address_kwarg = 'event_address'
 
     def get_object(self):
-        return get_object_or_404(Event, address=self.kwargs['event_address'])
+        return get_object_or_404(Event.objects.select_related('summary'), address=self.kwargs['event_address'])
 
 
-class MarketListView(generics.ListAPIView):
+class MarketListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = MarketSerializer
     filter_class = MarketFilter
     pagination_class = DefaultPagination
+    cursor_ordering = ('creation_block', 'address')
 
     def get_queryset(self):
-        # Eager loading of related models
-        queryset = Market.objects.all()
-        queryset = queryset.select_related(
-            'event',
-            'event__oracle',
-            'event__scalarevent',
-            'event__scalarevent__oracle',
-            'event__scalarevent__oracle__centralizedoracle',
-            'event__scalarevent__oracle__centralizedoracle__event_description',
-            'event__scalarevent__oracle__centralizedoracle__event_description__categoricaleventdescription',
-            'event__scalarevent__oracle__centralizedoracle__event_description__scalareventdescription',
-            'event__categoricalevent',
-            'event__categoricalevent__oracle',
-            'event__categoricalevent__oracle__centralizedoracle',
-            'event__categoricalevent__oracle__centralizedoracle__event_description',
-            'event__categoricalevent__oracle__centralizedoracle__event_description__categoricaleventdescription',
-            'event__categoricalevent__oracle__centralizedoracle__event_description__scalareventdescription',
-            'event__oracle__centralizedoracle',
-            'event__oracle__centralizedoracle__event_description',
-            'event__oracle__centralizedoracle__event_description__categoricaleventdescription',
-            'event__oracle__centralizedoracle__event_description__scalareventdescription',
-        )
+        # Eager loading of related models, oracle and description come from the flattened event summary
+        queryset = Market.objects.all().select_related('event', 'event__summary')
         return queryset
 
 
-class MarketFetchView(generics.RetrieveAPIView):
+class MarketFetchView(ConditionalGetMixin, CachedRetrieveMixin, generics.RetrieveAPIView):
     queryset = Market.objects.all()
     serializer_class = MarketSerializer
+    cache_name = 'market'
+    cache_address_kwarg = 'market_address'
 
     def get_object(self):
-        return get_object_or_404(Market, address=self.kwargs['market_address'])
+        return get_object_or_404(
+            Market.objects.select_related('event', 'event__summary'),
+            address=self.kwargs['market_address']
+        )
 
 
 @api_view(['GET'])
+@block_conditional
 def factories_view(request):
     factories = {}
     for contract in settings.ETH_EVENTS:
@@ -133,10 +139,11 @@ def factories_view(request):
     return Response(factories)
 
 
-class MarketSharesView(generics.ListAPIView):
+class MarketSharesView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = OutcomeTokenBalanceSerializer
     # filter_class = MarketShareEntryFilter
     pagination_class = DefaultPagination
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
         market = get_object_or_404(Market, address=self.kwargs['market_address'])
@@ -155,20 +162,18 @@ class MarketSharesView(generics.ListAPIView):
         )
 
 
-class AllMarketSharesView(generics.ListAPIView):
+class AllMarketSharesView(ConditionalGetMixin, generics.ListAPIView):
     """
     Returns all outcome token balances (market shares) for all users in a market
     """
     serializer_class = OutcomeTokenBalanceSerializer
     pagination_class = DefaultPagination
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
+        # Joined in the balances query, the market and its outcome tokens aren't loaded beforehand
         return OutcomeTokenBalance.objects.filter(
-            outcome_token__address__in=list(
-                Market.objects.get(
-                    address=self.kwargs['market_address']
-                ).event.outcome_tokens.values_list('address', flat=True)
-            )
+            outcome_token__event__markets__address=self.kwargs['market_address']
         ).select_related(
             'outcome_token',
             'outcome_token__event',
@@ -177,24 +182,26 @@ class AllMarketSharesView(generics.ListAPIView):
             'outcome_token__event__oracle__centralizedoracle__event_description',
             'outcome_token__event__oracle__centralizedoracle__event_description__categoricaleventdescription',
             'outcome_token__event__oracle__centralizedoracle__event_description__scalareventdescription',
-        ).prefetch_related('outcome_token__event__markets')
+        )
 
 
-class MarketParticipantTradesView(generics.ListAPIView):
+class MarketParticipantTradesView(ConditionalGetMixin, generics.ListAPIView):
 
     serializer_class = MarketParticipantTradesSerializer
     pagination_class = DefaultPagination
+    cursor_ordering = ('creation_date_time', 'id')
 
     def get_queryset(self):
         return Order.objects.filter(
             market=self.kwargs['market_address'],
             sender=self.kwargs['owner_address']
-        )
+        ).select_related('outcome_token')
 
 
-class MarketTradesView(generics.ListAPIView):
+class MarketTradesView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = MarketTradesSerializer
     pagination_class = DefaultPagination
+    cursor_ordering = ('creation_date_time', 'id')
     filter_class = MarketTradesFilter
 
     def get_queryset(self):
@@ -211,15 +218,39 @@ class MarketTradesView(generics.ListAPIView):
             'outcome_token__event__oracle__centralizedoracle__event_description',
             'outcome_token__event__oracle__centralizedoracle__event_description__categoricaleventdescription',
             'outcome_token__event__oracle__centralizedoracle__event_description__scalareventdescription',
-        ).prefetch_related('outcome_token__event__markets')
+        )
 
 
-class AccountTradesView(generics.ListAPIView):
+class MarketHistoryView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Returns the price candles of the given market, oldest first.
+    Query params: resolution (1m, 1h or 1d, 1h by default), date_0 and date_1
+    """
+    serializer_class = MarketPriceCandleSerializer
+    pagination_class = DefaultPagination
+    cursor_ordering = ('start_date_time',)
+    filter_class = MarketHistoryFilter
+
+    def get_queryset(self):
+        resolutions = dict((label, seconds) for seconds, label in MarketPriceCandle.resolutions)
+        resolution = self.request.query_params.get('resolution', '1h')
+        if resolution not in resolutions:
+            raise ValidationError({'resolution': 'Must be one of {}'.format(', '.join(sorted(resolutions)))})
+
+        get_object_or_404(Market, address=self.kwargs['market_address'])
+        return MarketPriceCandle.objects.filter(
+            market=self.kwargs['market_address'],
+            resolution=resolutions[resolution]
+        ).order_by('start_date_time')
+
+
+class AccountTradesView(ConditionalGetMixin, generics.ListAPIView):
     """
     Returns the orders (trades) for the given account address
     """
     serializer_class = MarketTradesSerializer
     pagination_class = DefaultPagination
+    cursor_ordering = ('creation_date_time', 'id')
     filter_class = MarketTradesFilter
 
     def get_queryset(self):
@@ -233,15 +264,16 @@ class AccountTradesView(generics.ListAPIView):
             'outcome_token__event__oracle__centralizedoracle__event_description',
             'outcome_token__event__oracle__centralizedoracle__event_description__categoricaleventdescription',
             'outcome_token__event__oracle__centralizedoracle__event_description__scalareventdescription',
-        ).prefetch_related('outcome_token__event__markets')
+        )
 
 
-class AccountSharesView(generics.ListAPIView):
+class AccountSharesView(ConditionalGetMixin, generics.ListAPIView):
     """
     Returns the shares for the given account address
     """
     serializer_class = OutcomeTokenBalanceSerializer
     pagination_class = DefaultPagination
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
         return OutcomeTokenBalance.objects.filter(
@@ -254,4 +286,74 @@ class AccountSharesView(generics.ListAPIView):
             'outcome_token__event__oracle__centralizedoracle__event_description',
             'outcome_token__event__oracle__centralizedoracle__event_description__categoricaleventdescription',
             'outcome_token__event__oracle__centralizedoracle__event_description__scalareventdescription',
-        ).prefetch_related('outcome_token__event__markets')
\ No newline at end of file
+        )
+
+
+class MarketExportView(ConditionalGetMixin, ExportMixin, generics.GenericAPIView):
+    """
+    Streams every market, accepts the market list filters
+    """
+    serializer_class = MarketSerializer
+    filter_class = MarketFilter
+    export_name = 'markets'
+    export_ordering = ('creation_block', 'address')
+    csv_columns = ('contract.address', 'contract.creator', 'contract.creationDate', 'contract.creationBlock',
+                   'event.contract.address', 'event.type', 'event.oracle.eventDescription.title', 'marketMaker',
+                   'fee', 'funding', 'netOutcomeTokensSold', 'stage', 'tradingVolume', 'withdrawnFees',
+                   'collectedFees', 'marginalPrices')
+
+    def get_queryset(self):
+        return Market.objects.all().select_related('event', 'event__summary')
+
+
+class TradesExportMixin(ExportMixin):
+    serializer_class = MarketParticipantTradesSerializer
+    export_ordering = ('creation_date_time', 'id')
+    csv_columns = ('date', 'market', 'owner', 'orderType', 'outcomeToken.address', 'outcomeToken.index',
+                   'outcomeTokenCount', 'cost', 'profit', 'marginalPrices')
+
+
+class TradesExportView(ConditionalGetMixin, TradesExportMixin, generics.GenericAPIView):
+    """
+    Streams every order (trade) of every market
+    """
+    export_name = 'trades'
+
+    def get_queryset(self):
+        return Order.objects.all().select_related('outcome_token')
+
+
+class MarketTradesExportView(ConditionalGetMixin, TradesExportMixin, generics.GenericAPIView):
+    """
+    Streams the orders (trades) of the given market
+    """
+    filter_class = MarketTradesFilter
+    export_name = 'trades'
+
+    def get_queryset(self):
+        get_object_or_404(Market, address=self.kwargs['market_address'])
+        return Order.objects.filter(market=self.kwargs['market_address']).select_related('outcome_token')
+
+
+class MarketSharesExportView(ConditionalGetMixin, ExportMixin, generics.GenericAPIView):
+    """
+    Streams the outcome token balances (shares) of every user in the given market
+    """
+    serializer_class = OutcomeTokenBalanceSerializer
+    export_name = 'shares'
+    export_ordering = ('id',)
+    csv_columns = ('owner', 'outcomeToken.address', 'outcomeToken.index', 'balance', 'marginalPrice')
+
+    def get_queryset(self):
+        market = get_object_or_404(Market, address=self.kwargs['market_address'])
+        return OutcomeTokenBalance.objects.filter(
+            outcome_token__event=market.event_id
+        ).select_related(
+            'outcome_token',
+            'outcome_token__event',
+            'outcome_token__event__oracle',
+            'outcome_token__event__oracle__centralizedoracle',
+            'outcome_token__event__oracle__centralizedoracle__event_description',
+            'outcome_token__event__oracle__centralizedoracle__event_description__categoricaleventdescription',
+            'outcome_token__event__oracle__centralizedoracle__event_description__scalareventdescription',
+        )
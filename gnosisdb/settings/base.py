@@ -141,7 +141,7 @@ ROOT_URLCONF = 'gnosisdb.urls'
 REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ('django_filters.rest_framework.DjangoFilterBackend',),
     'DEFAULT_RENDERER_CLASSES': (
-        'djangorestframework_camel_case.render.CamelCaseJSONRenderer',
+        'restapi.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
     'PAGE_SIZE': 100,
@@ -194,6 +194,42 @@ CELERY_LOCK_EXPIRE = 60
 # IPFS
 IPFS_HOST = 'http://ipfs'  # 'ipfs'
 IPFS_PORT = 5001
+IPFS_RETRIES = 3
+IPFS_PREFETCH_WORKERS = 8  # concurrent requests when prefetching a block range
+IPFS_CACHE_SIZE = 1000  # event descriptions kept in memory
+IPFS_CACHE_DIR = None  # directory for the on-disk cache, disabled if None
+IPFS_NEGATIVE_CACHE_TIMEOUT = 300  # seconds an unresolvable hash is not requested again
+
+# API response cache
+API_CACHE_SIZE = 1000  # detail responses kept in memory by each process
+API_CACHE_BACKEND = None  # alias of a CACHES entry shared by every process, e.g. memcached, disabled if None
+API_CACHE_TIMEOUT = 3600  # seconds an entry lives in the shared backend
+API_EXPORT_CHUNK_SIZE = 1000  # rows read and serialized at a time by the export endpoints
+
+# Snapshots, stored in SNAPSHOT_PATH or, if SNAPSHOT_S3_BUCKET is set, in S3 (or any S3 compatible storage)
+SNAPSHOT_PATH = '/tmp/gnosisdb-snapshots'
+SNAPSHOT_S3_BUCKET = None
+SNAPSHOT_S3_PREFIX = ''
+SNAPSHOT_S3_ENDPOINT_URL = None
+SNAPSHOT_S3_ACCESS_KEY = None
+SNAPSHOT_S3_SECRET_KEY = None
+SNAPSHOT_REORG_DEPTH = 100  # blocks of orders re-exported by incremental snapshots
+
+# Rollback journal
+ROLLBACK_JOURNAL = True  # journal the changes of every indexed block, reorgs undo them instead of replaying events
+ROLLBACK_JOURNAL_DEPTH = 100  # blocks kept in the journal
+
+# Bulk event processing
+BULK_WORKERS = 1  # processes applying the trades and balance changes, partitioned by event contract
+BULK_PARALLEL_MIN_EVENTS = 1000  # shorter runs of trades and balance changes are applied by a single process
+
+# Event receiver metrics, 'gnosisdb.metrics.PrometheusBackend' exposes them on /metrics (requires prometheus_client)
+METRICS_BACKEND = 'gnosisdb.metrics.NoopBackend'
+METRICS_URL_ENABLED = False  # serve /metrics, unauthenticated: only enable it on an internal-only web server
+
+# Event receiver logs
+EVENT_LOG_SAMPLE_RATE = 1.0  # share of the saved events logged one by one, invalid events are always logged
+EVENT_LOG_BLOCK_SUMMARY = True  # log the number of events of each block per receiver, event name and status
 
 # LMSR Market Maker Address
 LMSR_MARKET_MAKER = '9561c133dd8580860b6b7e504bc5aa500f0f06a7'
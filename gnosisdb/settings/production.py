@@ -49,6 +49,7 @@ ETHEREUM_NODE_SSL = bool(int(os.environ['ETHEREUM_NODE_SSL']))
 # ------------------------------------------------------------------------------
 IPFS_HOST = os.environ['IPFS_HOST']
 IPFS_PORT = os.environ['IPFS_PORT']
+IPFS_CACHE_DIR = os.environ.get('IPFS_CACHE_DIR', None)
 
 # ------------------------------------------------------------------------------
 # RABBIT MQ
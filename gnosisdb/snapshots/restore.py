@@ -0,0 +1,107 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django_eth_events.models import Daemon
+from .snapshot import MANIFEST, get_manifest_names, read_manifest
+import gzip
+import os
+import tarfile
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def get_snapshot_chain(sink, name=None):
+    """
+    Returns the manifests needed to restore the snapshot, its last full parent first
+    :param name: snapshot name, the last snapshot if None
+    :raise SnapshotError
+    """
+    names = get_manifest_names(sink)
+    if name:
+        names = [manifest_name for manifest_name in names if manifest_name == '{}/{}'.format(name, MANIFEST)]
+    if not names:
+        raise SnapshotError('Snapshot {} not found'.format(name) if name else 'No snapshot found')
+
+    chain = [read_manifest(sink, names[-1])]
+    while chain[0]['from_block'] is not None:
+        parent = '{}/{}'.format(chain[0]['parent'], MANIFEST)
+        if parent not in sink.list(chain[0]['parent']):
+            raise SnapshotError('Snapshot {} misses its parent {}'.format(chain[0]['name'], chain[0]['parent']))
+        chain.insert(0, read_manifest(sink, parent))
+    return chain
+
+
+def load_table(cursor, sink, table):
+    """
+    Copies the gzipped CSV rows of a manifest table into the database
+    """
+    query = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv, HEADER)'.format(
+        connection.ops.quote_name(table['table']),
+        ', '.join(connection.ops.quote_name(column) for column in table['columns'])
+    )
+    fd = sink.open_read(table['path'])
+    try:
+        with gzip.GzipFile(fileobj=fd, mode='rb') as gzip_fd:
+            cursor.copy_expert(query, gzip_fd)
+    finally:
+        fd.close()
+
+
+def load_ipfs_cache(sink, path, cache_dir):
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    fd = sink.open_read(path)
+    try:
+        archive = tarfile.open(fileobj=fd, mode='r|gz')
+        for member in archive:
+            # Only plain files named after their hash, never let names escape the cache directory
+            if member.isfile() and os.path.basename(member.name) == member.name:
+                archive.extract(member, cache_dir)
+        archive.close()
+    finally:
+        fd.close()
+
+
+def restore_snapshot(sink, name=None):
+    """
+    Replaces the database content with the snapshot, applying its full parent and every incremental snapshot in
+    between, in a single transaction. Restores the IPFS disk cache if IPFS_CACHE_DIR is set.
+    The event listener resumes indexing from the snapshot block.
+    :param name: snapshot name, the last snapshot if None
+    :return: manifest of the restored snapshot
+    :raise SnapshotError
+    """
+    chain = get_snapshot_chain(sink, name)
+    with transaction.atomic():
+        cursor = connection.cursor()
+        for manifest in chain:
+            if manifest['from_block'] is None:
+                # Relations between the tables are truncated along
+                cursor.execute('TRUNCATE {}'.format(', '.join(
+                    connection.ops.quote_name(table['table']) for table in manifest['tables']
+                )))
+            else:
+                # Foreign keys are checked on commit, but the conditions of the order child tables select their rows
+                # through relationaldb_order: child tables are emptied before their parents
+                for table in reversed(manifest['tables']):
+                    cursor.execute('DELETE FROM {}{}'.format(
+                        connection.ops.quote_name(table['table']),
+                        ' WHERE {}'.format(table['where']) if table['where'] else ''
+                    ))
+            for table in manifest['tables']:
+                load_table(cursor, sink, table)
+
+        tables = set(table['table'] for table in chain[-1]['tables'])
+        models = [model for model in apps.get_models() if model._meta.db_table in tables]
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+        # The snapshot may have been taken while the listener held the lock
+        Daemon.objects.update(listener_lock=False)
+
+    cache_dir = getattr(settings, 'IPFS_CACHE_DIR', None)
+    if cache_dir and chain[-1].get('ipfs_cache'):
+        load_ipfs_cache(sink, chain[-1]['ipfs_cache'], cache_dir)
+    return chain[-1]
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from django.conf import settings
+from tempfile import SpooledTemporaryFile
+import boto3
+import os
+import shutil
+
+
+class DirectorySink(object):
+    """
+    Stores snapshot files under a local directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_path(self, name):
+        return os.path.join(self.path, *name.split('/'))
+
+    @contextmanager
+    def open_write(self, name):
+        path = self.get_path(name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as fd:
+            yield fd
+        # atomic on POSIX, a failed write never leaves a partial file behind
+        os.rename(tmp_path, path)
+
+    def open_read(self, name):
+        return open(self.get_path(name), 'rb')
+
+    def list(self, prefix=''):
+        names = []
+        for root, directories, filenames in os.walk(self.path):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(root, filename), self.path).replace(os.sep, '/')
+                if name.startswith(prefix) and not name.endswith('.tmp'):
+                    names.append(name)
+        return sorted(names)
+
+
+class S3Sink(object):
+    """
+    Stores snapshot files in an S3 bucket. endpoint_url points to any S3 compatible storage, e.g. a local MinIO.
+    Files are spooled to a temporary file, on disk once bigger than spool_size, and uploaded when closed.
+    """
+    spool_size = 64 * 1024 * 1024
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, access_key=None, secret_key=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, aws_access_key_id=access_key,
+                                   aws_secret_access_key=secret_key)
+
+    def get_key(self, name):
+        return self.prefix + name
+
+    @contextmanager
+    def open_write(self, name):
+        with SpooledTemporaryFile(max_size=self.spool_size) as fd:
+            yield fd
+            fd.seek(0)
+            self.client.upload_fileobj(fd, self.bucket, self.get_key(name))
+
+    def open_read(self, name):
+        fd = SpooledTemporaryFile(max_size=self.spool_size)
+        body = self.client.get_object(Bucket=self.bucket, Key=self.get_key(name))['Body']
+        shutil.copyfileobj(body, fd)
+        fd.seek(0)
+        return fd
+
+    def list(self, prefix=''):
+        names = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.get_key(prefix)):
+            names.extend(item['Key'][len(self.prefix):] for item in page.get('Contents', []))
+        return sorted(names)
+
+
+def get_sink():
+    """
+    Returns the S3Sink if SNAPSHOT_S3_BUCKET is set, the DirectorySink of SNAPSHOT_PATH otherwise
+    """
+    bucket = getattr(settings, 'SNAPSHOT_S3_BUCKET', None)
+    if bucket:
+        return S3Sink(
+            bucket,
+            prefix=getattr(settings, 'SNAPSHOT_S3_PREFIX', ''),
+            endpoint_url=getattr(settings, 'SNAPSHOT_S3_ENDPOINT_URL', None),
+            access_key=getattr(settings, 'SNAPSHOT_S3_ACCESS_KEY', None),
+            secret_key=getattr(settings, 'SNAPSHOT_S3_SECRET_KEY', None)
+        )
+    return DirectorySink(getattr(settings, 'SNAPSHOT_PATH', '/tmp/gnosisdb-snapshots'))
@@ -0,0 +1,148 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django_eth_events.models import Daemon, Block
+from relationaldb.models import Order
+import gzip
+import json
+import os
+import tarfile
+
+MANIFEST = 'manifest.json'
+
+
+def get_snapshot_models():
+    """
+    Returns the models stored in snapshots: every relationaldb table and the daemon and block rows of the event
+    listener, so a restored node resumes indexing where the snapshot was taken
+    """
+    return list(apps.get_app_config('relationaldb').get_models()) + [Daemon, Block]
+
+
+def get_incremental_filter(model, from_block):
+    """
+    Returns the SQL condition selecting the rows of model created after from_block, None if rows of model are updated
+    in place and so can't be exported incrementally. Orders and blocks are only ever inserted or deleted (rollbacks).
+    """
+    from_block = int(from_block)
+    if model is Order:
+        return 'creation_block > {}'.format(from_block)
+    if issubclass(model, Order):
+        return '{} IN (SELECT {} FROM {} WHERE creation_block > {})'.format(
+            connection.ops.quote_name(model._meta.pk.column),
+            connection.ops.quote_name(Order._meta.pk.column),
+            connection.ops.quote_name(Order._meta.db_table),
+            from_block
+        )
+    if model is Block:
+        return 'block_number > {}'.format(from_block)
+    return None
+
+
+def get_manifest_names(sink):
+    """
+    Returns the manifest names of the sink snapshots, oldest block first. Manifests are written last, snapshots
+    without one never completed.
+    """
+    return [name for name in sink.list('snapshot-') if name.endswith('/' + MANIFEST)]
+
+
+def read_manifest(sink, name):
+    fd = sink.open_read(name)
+    try:
+        return json.loads(fd.read().decode('utf-8'))
+    finally:
+        fd.close()
+
+
+def get_last_manifest(sink):
+    names = get_manifest_names(sink)
+    return read_manifest(sink, names[-1]) if names else None
+
+
+def dump_table(cursor, sink, path, table, columns, where):
+    """
+    Streams the table rows as gzipped CSV, with header, into the sink
+    """
+    query = 'COPY (SELECT {} FROM {}{}) TO STDOUT WITH (FORMAT csv, HEADER)'.format(
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+        connection.ops.quote_name(table),
+        ' WHERE {}'.format(where) if where else ''
+    )
+    with sink.open_write(path) as fd:
+        with gzip.GzipFile(fileobj=fd, mode='wb') as gzip_fd:
+            cursor.copy_expert(query, gzip_fd)
+
+
+def dump_ipfs_cache(sink, path, cache_dir):
+    """
+    Streams the IPFS_CACHE_DIR objects, as a gzipped tar, into the sink
+    """
+    with sink.open_write(path) as fd:
+        archive = tarfile.open(fileobj=fd, mode='w|gz')
+        try:
+            for filename in sorted(os.listdir(cache_dir)):
+                if filename.endswith('.json'):
+                    archive.add(os.path.join(cache_dir, filename), arcname=filename)
+        finally:
+            archive.close()
+
+
+def create_snapshot(sink, full=False):
+    """
+    Dumps the database into sink, table by table, as gzipped CSV files plus a manifest, and the IPFS disk cache if
+    IPFS_CACHE_DIR is set.
+    Rows are read inside a REPEATABLE READ transaction, so every table is dumped as of the same moment while the
+    event listener keeps indexing.
+    Unless full is set, snapshots following another one only include the orders and blocks created since the
+    previous snapshot block minus SNAPSHOT_REORG_DEPTH blocks, in case they were rolled back. The other tables are
+    always dumped in full.
+    :return: manifest dictionary
+    """
+    previous = None if full else get_last_manifest(sink)
+    reorg_depth = getattr(settings, 'SNAPSHOT_REORG_DEPTH', 100)
+
+    # Inside an outer transaction (e.g. tests) that transaction defines what is dumped
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        cursor = connection.cursor()
+        if outermost:
+            # Must be the first statement of the transaction
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        block_number = Daemon.objects.values_list('block_number', flat=True).first() or 0
+        if previous and previous['block_number'] > block_number:
+            # The database was reset (setup) since the previous snapshot
+            previous = None
+        from_block = max(previous['block_number'] - reorg_depth, 0) if previous else None
+        created = timezone.now()
+        name = 'snapshot-{:012d}-{}'.format(block_number, created.strftime('%Y%m%d%H%M%S%f'))
+
+        tables = []
+        for model in get_snapshot_models():
+            table = model._meta.db_table
+            columns = [field.column for field in model._meta.local_concrete_fields]
+            where = get_incremental_filter(model, from_block) if from_block is not None else None
+            path = '{}/{}.csv.gz'.format(name, table)
+            dump_table(cursor, sink, path, table, columns, where)
+            tables.append({'table': table, 'columns': columns, 'path': path, 'where': where})
+
+    # IPFS objects are immutable, a restored node reuses them instead of fetching every description again
+    cache_dir = getattr(settings, 'IPFS_CACHE_DIR', None)
+    ipfs_cache = None
+    if cache_dir and os.path.isdir(cache_dir):
+        ipfs_cache = '{}/ipfs-cache.tar.gz'.format(name)
+        dump_ipfs_cache(sink, ipfs_cache, cache_dir)
+
+    manifest = {
+        'name': name,
+        'block_number': block_number,
+        'from_block': from_block,
+        'parent': previous['name'] if previous else None,
+        'created': created.isoformat(),
+        'tables': tables,
+        'ipfs_cache': ipfs_cache
+    }
+    with sink.open_write('{}/{}'.format(name, MANIFEST)) as fd:
+        fd.write(json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.test import TransactionTestCase
+from django_eth_events.models import Daemon
+from relationaldb.models import Market, Order, BuyOrder, SellOrder
+from relationaldb.tests.factories import MarketFactory, OutcomeTokenFactory, BuyOrderFactory, SellOrderFactory
+from snapshots.sinks import DirectorySink
+from snapshots.snapshot import create_snapshot, get_last_manifest
+from snapshots.restore import restore_snapshot, SnapshotError
+import csv
+import gzip
+import shutil
+import tempfile
+
+
+class TestSnapshots(TransactionTestCase):
+    # Restoring truncates the tables, which fails with pending trigger events inside the transaction of a TestCase
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.sink = DirectorySink(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def read_rows(self, manifest, model):
+        table = [table for table in manifest['tables'] if table['table'] == model._meta.db_table][0]
+        with gzip.GzipFile(fileobj=self.sink.open_read(table['path']), mode='rb') as fd:
+            return list(csv.DictReader(fd.read().decode('utf-8').splitlines()))
+
+    def test_snapshots(self):
+        daemon = Daemon.get_solo()
+        daemon.block_number = 10
+        daemon.save()
+        market = MarketFactory()
+        outcome_token = OutcomeTokenFactory(event=market.event)
+        BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=5)
+
+        manifest = create_snapshot(self.sink)
+        self.assertEquals(manifest['block_number'], 10)
+        self.assertIsNone(manifest['from_block'])
+        self.assertIsNone(manifest['parent'])
+        self.assertEquals(len(self.read_rows(manifest, Order)), 1)
+        self.assertEquals(len(self.read_rows(manifest, BuyOrder)), 1)
+        self.assertEquals(self.read_rows(manifest, Market)[0]['address'], market.address)
+        self.assertEquals(self.read_rows(manifest, Daemon)[0]['block_number'], '10')
+
+        daemon.block_number = 200
+        daemon.save()
+        BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=150)
+
+        # Only the orders of the blocks after the previous snapshot block, minus the reorg depth, are dumped
+        with self.settings(SNAPSHOT_REORG_DEPTH=5):
+            incremental = create_snapshot(self.sink)
+        self.assertEquals(incremental['from_block'], 5)
+        self.assertEquals(incremental['parent'], manifest['name'])
+        self.assertListEqual([row['creation_block'] for row in self.read_rows(incremental, Order)], ['150'])
+        self.assertEquals(len(self.read_rows(incremental, BuyOrder)), 1)
+        self.assertEquals(len(self.read_rows(incremental, Market)), 1)
+        self.assertEquals(get_last_manifest(self.sink)['name'], incremental['name'])
+
+        full = create_snapshot(self.sink, full=True)
+        self.assertIsNone(full['from_block'])
+        self.assertEquals(len(self.read_rows(full, Order)), 2)
+
+    def test_restore(self):
+        daemon = Daemon.get_solo()
+        daemon.block_number = 10
+        daemon.save()
+        market = MarketFactory()
+        outcome_token = OutcomeTokenFactory(event=market.event)
+        BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=5)
+        create_snapshot(self.sink)
+
+        daemon.block_number = 20
+        daemon.save()
+        order = BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=15)
+        market.stage = 1
+        market.save()
+        with self.settings(SNAPSHOT_REORG_DEPTH=0):
+            incremental = create_snapshot(self.sink)
+
+        # Changes after the last snapshot are dropped
+        BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=25)
+        Market.objects.filter(address=market.address).update(stage=2)
+        daemon.block_number = 30
+        daemon.listener_lock = True
+        daemon.save()
+
+        self.assertEquals(restore_snapshot(self.sink)['name'], incremental['name'])
+        self.assertEquals(BuyOrder.objects.count(), 2)
+        self.assertEquals(BuyOrder.objects.get(pk=order.pk).cost, order.cost)
+        self.assertEquals(Market.objects.get(address=market.address).stage, 1)
+        daemon = Daemon.get_solo()
+        self.assertEquals(daemon.block_number, 20)
+        self.assertFalse(daemon.listener_lock)
+        # Sequences follow the restored ids
+        self.assertGreater(BuyOrderFactory(market=market, outcome_token=outcome_token).pk, order.pk)
+
+        with self.assertRaises(SnapshotError):
+            restore_snapshot(self.sink, 'snapshot-unknown')
+
+    def test_restore_overlap(self):
+        daemon = Daemon.get_solo()
+        daemon.block_number = 10
+        daemon.save()
+        market = MarketFactory()
+        outcome_token = OutcomeTokenFactory(event=market.event)
+        buy_order = BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=5)
+        sell_order = SellOrderFactory(market=market, outcome_token=outcome_token, creation_block=8)
+        create_snapshot(self.sink)
+
+        daemon.block_number = 20
+        daemon.save()
+        BuyOrderFactory(market=market, outcome_token=outcome_token, creation_block=15)
+        # The reorg depth overlap holds the orders of the previous snapshot, they are replaced on restore
+        with self.settings(SNAPSHOT_REORG_DEPTH=100):
+            incremental = create_snapshot(self.sink)
+        self.assertEquals(len(self.read_rows(incremental, BuyOrder)), 2)
+        self.assertEquals(len(self.read_rows(incremental, SellOrder)), 1)
+
+        restore_snapshot(self.sink)
+        self.assertEquals(Order.objects.count(), 3)
+        self.assertEquals(BuyOrder.objects.count(), 2)
+        self.assertEquals(SellOrder.objects.get(pk=sell_order.pk).profit, sell_order.profit)
+        self.assertEquals(BuyOrder.objects.get(pk=buy_order.pk).cost, buy_order.cost)
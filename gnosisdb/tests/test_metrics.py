@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from chainevents.bulk import BulkEventProcessor
+from chainevents.event_receivers import OutcomeTokenInstanceReceiver
+from gnosisdb.metrics import NoopBackend, QueryCounter, add_ipfs_time, get_backend, metrics_view
+from relationaldb.models import OutcomeToken
+from relationaldb.tests.factories import OutcomeTokenFactory
+
+
+class RecordingBackend(NoopBackend):
+    enabled = True
+
+    def __init__(self):
+        self.observations = []
+
+    def observe_event(self, receiver, event, status, seconds, queries, ipfs_seconds):
+        self.observations.append((receiver, event, status, seconds, queries, ipfs_seconds))
+
+    def render(self):
+        return 'text/plain', '\n'.join(' '.join(str(value) for value in observation[:3])
+                                       for observation in self.observations)
+
+
+class TestMetrics(TestCase):
+
+    def issuance(self, address, amount):
+        return {
+            'name': 'Issuance',
+            'address': address,
+            'params': [
+                {'name': 'owner', 'value': '{:040d}'.format(100)},
+                {'name': 'amount', 'value': amount}
+            ]
+        }
+
+    def test_noop_backend(self):
+        self.assertFalse(get_backend().enabled)
+        # Nothing is measured
+        add_ipfs_time(1)
+        # Not routed unless METRICS_URL_ENABLED is set
+        self.assertEquals(self.client.get('/metrics').status_code, 404)
+
+    def test_query_counter(self):
+        queries_logged = len(connection.queries_log)
+        with QueryCounter(connection) as counter:
+            OutcomeToken.objects.count()
+            OutcomeToken.objects.exists()
+        OutcomeToken.objects.count()
+        self.assertEquals(counter.queries, 2)
+        # Queries are counted without logging them
+        self.assertEquals(len(connection.queries_log), queries_logged)
+
+    @override_settings(METRICS_BACKEND='gnosisdb.tests.test_metrics.RecordingBackend')
+    def test_receiver_metrics(self):
+        backend = get_backend()
+        backend.observations = []
+        outcome_token = OutcomeTokenFactory()
+        receiver = OutcomeTokenInstanceReceiver()
+        block = {'number': 1, 'timestamp': 1500000000}
+
+        self.assertIsNotNone(receiver.save(self.issuance(outcome_token.address, 10), block))
+        self.assertIsNone(receiver.save(self.issuance(outcome_token.address, 'ten'), block))
+        self.assertIsNone(receiver.save({'name': 'Approval', 'address': outcome_token.address, 'params': []}, block))
+        with self.assertRaises(Exception):
+            receiver.save(self.issuance('{:040d}'.format(1), 10), block)
+
+        self.assertListEqual([observation[:3] for observation in backend.observations], [
+            ('OutcomeTokenInstanceReceiver', 'Issuance', 'saved'),
+            ('OutcomeTokenInstanceReceiver', 'Issuance', 'invalid'),
+            ('OutcomeTokenInstanceReceiver', 'Approval', 'ignored'),
+            ('OutcomeTokenInstanceReceiver', 'Issuance', 'error'),
+        ])
+        receiver_name, event_name, status, seconds, queries, ipfs_seconds = backend.observations[0]
+        self.assertGreater(seconds, 0)
+        # Journal savepoint and block, balance upsert
+        self.assertGreaterEqual(queries, 2)
+        self.assertEquals(ipfs_seconds, 0)
+
+        response = metrics_view(RequestFactory().get('/metrics'))
+        self.assertEquals(response.status_code, 200)
+        self.assertIn(b'OutcomeTokenInstanceReceiver Issuance saved', response.content)
+
+    @override_settings(METRICS_BACKEND='gnosisdb.tests.test_metrics.RecordingBackend')
+    def test_bulk_metrics(self):
+        backend = get_backend()
+        backend.observations = []
+        outcome_token = OutcomeTokenFactory()
+        receiver = OutcomeTokenInstanceReceiver()
+        block = {'number': 1, 'timestamp': 1500000000}
+
+        BulkEventProcessor(backfill=True).save([
+            (receiver, self.issuance(outcome_token.address, 10), block),
+            (receiver, self.issuance(outcome_token.address, 'ten'), block),
+            # Saved by the receiver, outside of the run
+            (receiver, {'name': 'Approval', 'address': outcome_token.address, 'params': []}, block),
+        ])
+        self.assertListEqual([observation[:3] for observation in backend.observations], [
+            ('OutcomeTokenInstanceReceiver', 'Issuance', 'saved'),
+            ('OutcomeTokenInstanceReceiver', 'Issuance', 'invalid'),
+            ('OutcomeTokenInstanceReceiver', 'Approval', 'ignored'),
+        ])
+        # The queries of the run are split between its events
+        self.assertEquals(backend.observations[0][4], backend.observations[1][4])
+        self.assertGreater(backend.observations[0][4], 0)
@@ -1,6 +1,6 @@
 from unittest import TestCase
 from relationaldb.tests.factories import OutcomeTokenFactory, MarketFactory, CategoricalEventFactory
-from gnosisdb.utils import calc_lmsr_marginal_price
+from gnosisdb.utils import calc_lmsr_marginal_price, calc_lmsr_marginal_prices
 
 
 class TestUtils(TestCase):
@@ -16,4 +16,24 @@ class TestUtils(TestCase):
         net_outcome_tokens_sold = [0, 1] # market.net_outcome_tokens_sold
         result = calc_lmsr_marginal_price(1, net_outcome_tokens_sold, market.funding)
         self.assertIsNotNone(result)
-        self.assertTrue(result > 0)
\ No newline at end of file
+        self.assertTrue(result > 0)
+
+    def test_calc_lmsr_marginal_prices(self):
+        funding = 10 ** 18
+        net_outcome_tokens_sold = [1584900000000000000, 0, -3 * 10 ** 17, 7 * 10 ** 18]
+        expected = [
+            calc_lmsr_marginal_price(index, net_outcome_tokens_sold, funding)
+            for index in range(0, len(net_outcome_tokens_sold))
+        ]
+
+        fast = calc_lmsr_marginal_prices(net_outcome_tokens_sold, funding)
+        exact = calc_lmsr_marginal_prices(net_outcome_tokens_sold, funding, exact=True, precision=50)
+        self.assertEqual(len(fast), len(expected))
+        for index in range(0, len(expected)):
+            self.assertAlmostEqual(fast[index], expected[index], places=10)
+            self.assertAlmostEqual(exact[index], expected[index], places=10)
+        self.assertAlmostEqual(sum(fast), 1.0, places=10)
+
+        # huge imbalances must not overflow
+        prices = calc_lmsr_marginal_prices([2 ** 200, 0], funding)
+        self.assertListEqual(prices, [1.0, 0.0])
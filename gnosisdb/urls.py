@@ -4,6 +4,7 @@ from django.conf.urls import url, include
 from django.conf import settings
 from django.contrib import admin
 from rest_framework_swagger.views import get_swagger_view
+from gnosisdb.metrics import metrics_view
 
 schema_view = get_swagger_view(title='GnosisDB API')
 
@@ -12,9 +13,14 @@ urlpatterns = [
     url(r'', include('django_google_authenticator.urls')),
     url(r'^admin/', include(admin.site.urls)),
     url(r'^admin/doc/', include('django.contrib.admindocs.urls')),
-    url(r'^api/', include('gnosisdb.restapi.urls', namespace='api'))
+    url(r'^api/', include('gnosisdb.restapi.urls', namespace='api')),
 ]
 
+if getattr(settings, 'METRICS_URL_ENABLED', False):
+    urlpatterns += [
+        url(r'^metrics$', metrics_view, name='metrics')
+    ]
+
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns = [
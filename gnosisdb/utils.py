@@ -1,4 +1,10 @@
 from mpmath import mp, mpf
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 def singleton(clazz):
@@ -19,26 +25,6 @@ class SingletonObject(object):
         return SingletonObject._instances[cls]
 
 
-def remove_null_values(obj):
-    """
-    Remove all null values from a dictionary
-    :param obj: dictionary
-    :return: filtered dictionary
-    """
-    if not isinstance(obj, dict):
-        return obj
-
-    keys = obj.keys()
-    for k in keys:
-        _obj = obj[k]
-        if _obj is None:
-            del obj[k]
-        elif isinstance(obj[k], dict):
-            remove_null_values(obj[k])
-
-    return obj
-
-
 def add_0x_prefix(value):
     return '0x' + value if value[:2] not in (b'0x', '0x') else value
 
@@ -48,35 +34,51 @@ def calc_lmsr_marginal_price(token_index, net_outcome_tokens_sold, funding):
     return float(mp.exp(net_outcome_tokens_sold[token_index]/b) / sum(mp.exp(share_count/b) for share_count in net_outcome_tokens_sold))
 
 
+def calc_lmsr_marginal_prices(net_outcome_tokens_sold, funding, exact=False, precision=None):
+    """
+    Returns the LMSR marginal price of every outcome in a single pass.
+    The softmax is computed as a log-sum-exp shifted by the biggest exponent, so it never overflows.
+    :param net_outcome_tokens_sold: list of net outcome tokens sold per outcome
+    :param funding: market funding
+    :param exact: use mpmath instead of floats (NumPy when installed)
+    :param precision: decimal places used by mpmath when exact, defaults to mp.dps
+    :return: list of floats
+    """
+    n_outcomes = len(net_outcome_tokens_sold)
+    if exact:
+        with mp.workdps(precision or mp.dps):
+            b = mpf(int(funding)) / mp.log(n_outcomes)
+            exponents = [mpf(int(share_count)) / b for share_count in net_outcome_tokens_sold]
+            max_exponent = max(exponents)
+            weights = [mp.exp(exponent - max_exponent) for exponent in exponents]
+            total = mp.fsum(weights)
+            return [float(weight / total) for weight in weights]
+
+    b = float(funding) / math.log(n_outcomes)
+    if np is not None:
+        exponents = np.array([float(share_count) for share_count in net_outcome_tokens_sold]) / b
+        weights = np.exp(exponents - exponents.max())
+        return (weights / weights.sum()).tolist()
+
+    exponents = [float(share_count) / b for share_count in net_outcome_tokens_sold]
+    max_exponent = max(exponents)
+    weights = [math.exp(exponent - max_exponent) for exponent in exponents]
+    total = math.fsum(weights)
+    return [weight / total for weight in weights]
+
+
 def get_order_type(order):
     """
     Returns the order type (Sell, Short Sell, Buy)
     :param order: See models.Order
     :return: String
     """
-    if hasattr(order, 'sellorder'):
-        return 'SELL'
-    elif hasattr(order, 'shortsellorder'):
-        return 'SHORT SELL'
-    elif hasattr(order, 'buyorder'):
-        return 'BUY'
-    else:
-        return 'UNKNOWN'
+    return order.order_type or 'UNKNOWN'
 
 
 def get_order_cost(order):
-    order_type = get_order_type(order)
-    if order_type == 'BUY':
-        return order.buyorder.cost
-    elif order_type == 'SHORT SELL':
-        return order.shortsellorder.cost
-    else:
-        return None
+    return order.cost
 
 
 def get_order_profit(order):
-    order_type = get_order_type(order)
-    if order_type == 'SELL':
-        return order.sellorder.profit
-    else:
-        return None
+    return order.profit